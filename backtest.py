@@ -0,0 +1,262 @@
+import typing
+
+import numpy as np
+import pandas as pd
+
+from candle_buffer import Ohlcv
+
+"""
+Vectorized backtesting of the Technical and Breakout strategies.
+
+Indicators and entry signals are computed over the whole series at once. The position loop then only jumps from one
+entry to the next: for each trade, the first bar touching the take profit or the stop loss is searched with numpy
+over growing windows, so the cost depends on the number of trades and not on the number of candles.
+
+Same rules as the live strategies (strategies.py):
+- Technical: signal computed on the last closed candle, position opened at the open of the next candle
+- Breakout: evaluated per candle (live does it per trade), volume > min_volume and close beyond the previous
+            candle's high/low, position opened at the close of that candle
+- Only one position at a time. Take profit / stop loss are percentages of the entry price. When both levels are
+  touched within the same candle, the stop loss is assumed to be hit first.
+"""
+
+_FIRST_SEARCH_WINDOW = 64
+
+
+class BacktestTrade:
+    __slots__ = ("side", "entry_index", "entry_time", "entry_price", "exit_index", "exit_time", "exit_price",
+                 "exit_reason", "pnl_pct")
+
+    def __init__(self, side: str, entry_index: int, entry_time: int, entry_price: float):
+        self.side = side
+        self.entry_index = entry_index
+        self.entry_time = entry_time
+        self.entry_price = entry_price
+
+        self.exit_index: typing.Optional[int] = None
+        self.exit_time: typing.Optional[int] = None
+        self.exit_price: typing.Optional[float] = None
+        self.exit_reason: typing.Optional[str] = None    # "Take Profit", "Stop Loss" or "End of data"
+        self.pnl_pct = 0.0
+
+
+class BacktestResult:
+    def __init__(self, trades: typing.List[BacktestTrade], equity: np.ndarray):
+        self.trades = trades
+        self.equity = equity    # one value per candle, 1.0 is the starting balance
+
+    @property
+    def total_return(self) -> float:
+        return float(self.equity[-1] - 1) * 100 if len(self.equity) > 0 else 0.0
+
+    @property
+    def max_drawdown(self) -> float:
+        if len(self.equity) == 0:
+            return 0.0
+        peaks = np.maximum.accumulate(self.equity)
+        return float(np.max((peaks - self.equity) / peaks)) * 100
+
+    @property
+    def win_rate(self) -> float:
+        if len(self.trades) == 0:
+            return 0.0
+        return sum(1 for t in self.trades if t.pnl_pct > 0) / len(self.trades) * 100
+
+    @property
+    def num_trades(self) -> int:
+        return len(self.trades)
+
+    @property
+    def sharpe(self) -> float:
+        """ Per-candle Sharpe ratio, not annualized """
+        if len(self.equity) < 2:
+            return 0.0
+        returns = np.diff(self.equity) / self.equity[:-1]
+        std = returns.std()
+        return float(returns.mean() / std) if std > 0 else 0.0
+
+    def metrics(self) -> typing.Dict[str, float]:
+        return {"total_return": self.total_return, "max_drawdown": self.max_drawdown, "win_rate": self.win_rate,
+                "num_trades": self.num_trades, "sharpe": self.sharpe}
+
+
+def macd(closes: np.ndarray, ema_fast: int, ema_slow: int, ema_signal: int) -> typing.Tuple[np.ndarray, np.ndarray]:
+    closes = pd.Series(closes)
+
+    macd_line = closes.ewm(span=ema_fast).mean() - closes.ewm(span=ema_slow).mean()
+    macd_signal = macd_line.ewm(span=ema_signal).mean()
+
+    return macd_line.to_numpy(), macd_signal.to_numpy()
+
+
+def rsi(closes: np.ndarray, rsi_length: int) -> np.ndarray:
+    """ RSI per candle, NaN for the first candle(s) like the live strategy """
+    delta = pd.Series(closes).diff()
+
+    up = delta.clip(lower=0).iloc[1:]
+    down = (-delta).clip(lower=0).iloc[1:]
+
+    avg_gain = up.ewm(com=(rsi_length - 1), min_periods=rsi_length).mean()
+    avg_loss = down.ewm(com=(rsi_length - 1), min_periods=rsi_length).mean()
+
+    rs = avg_gain / avg_loss
+    values = (100 - (100 / (1 + rs))).round(2).to_numpy()
+
+    return np.concatenate(([np.nan], values))
+
+
+def technical_signals(data: Ohlcv, other_params: typing.Dict) -> np.ndarray:
+    """ 1 / -1 / 0 per candle, computed when the candle closes """
+    macd_line, macd_signal = macd(data.close, other_params["ema_fast"], other_params["ema_slow"],
+                                  other_params["ema_signal"])
+    rsi_values = rsi(data.close, other_params["rsi_length"])
+
+    signals = np.zeros(len(data), dtype=np.int8)
+    with np.errstate(invalid="ignore"):
+        signals[(rsi_values < 30) & (macd_line > macd_signal)] = 1
+        signals[(rsi_values > 70) & (macd_line < macd_signal)] = -1
+
+    return signals
+
+
+def breakout_signals(data: Ohlcv, other_params: typing.Dict) -> np.ndarray:
+    signals = np.zeros(len(data), dtype=np.int8)
+    if len(data) < 2:
+        return signals
+
+    volume_ok = data.volume[1:] > other_params["min_volume"]
+    signals[1:][volume_ok & (data.close[1:] > data.high[:-1])] = 1
+    signals[1:][volume_ok & (data.close[1:] < data.low[:-1])] = -1
+
+    return signals
+
+
+def _find_exit(data: Ohlcv, start: int, side: int, tp_price: typing.Optional[float],
+               sl_price: typing.Optional[float]) -> typing.Tuple[int, str]:
+    n = len(data)
+    window = _FIRST_SEARCH_WINDOW
+
+    while start < n:
+        stop = min(start + window, n)
+        highs = data.high[start:stop]
+        lows = data.low[start:stop]
+
+        if side == 1:
+            sl_hits = lows <= sl_price if sl_price is not None else np.zeros(len(lows), dtype=bool)
+            tp_hits = highs >= tp_price if tp_price is not None else np.zeros(len(highs), dtype=bool)
+        else:
+            sl_hits = highs >= sl_price if sl_price is not None else np.zeros(len(highs), dtype=bool)
+            tp_hits = lows <= tp_price if tp_price is not None else np.zeros(len(lows), dtype=bool)
+
+        hits = np.flatnonzero(sl_hits | tp_hits)
+        if len(hits) > 0:
+            idx = int(hits[0])
+            return start + idx, "Stop Loss" if sl_hits[idx] else "Take Profit"
+
+        start = stop
+        window *= 2
+
+    return n - 1, "End of data"
+
+
+def simulate(data: Ohlcv, signals: np.ndarray, entry_offset: int, take_profit: typing.Optional[float],
+             stop_loss: typing.Optional[float], balance_pct: float, fee_pct: float) -> BacktestResult:
+    """
+    entry_offset: 1 when the position is opened at the open of the candle after the signal, 0 when it is opened at
+                  the close of the signal candle
+    """
+    n = len(data)
+    signal_indexes = np.flatnonzero(signals)
+    trades = []
+
+    equity = np.ones(n, dtype=np.float64)
+    balance = 1.0
+    position_size = balance_pct / 100
+    fee = fee_pct / 100
+
+    last_filled = 0     # equity[:last_filled] is already written
+
+    i = 0
+    while i < len(signal_indexes):
+        signal_index = int(signal_indexes[i])
+        entry_index = signal_index + entry_offset
+        if entry_index >= n:
+            break
+
+        side = int(signals[signal_index])
+        entry_price = data.open[entry_index] if entry_offset == 1 else data.close[entry_index]
+
+        trade = BacktestTrade("long" if side == 1 else "short", entry_index, int(data.timestamp[entry_index]),
+                              float(entry_price))
+
+        tp_price = entry_price * (1 + side * take_profit / 100) if take_profit is not None else None
+        sl_price = entry_price * (1 - side * stop_loss / 100) if stop_loss is not None else None
+
+        # a position opened at the close can only exit from the next candle on
+        exit_index, exit_reason = _find_exit(data, entry_index + (1 - entry_offset), side, tp_price, sl_price)
+        exit_index = max(exit_index, entry_index)
+
+        if exit_reason == "Stop Loss":
+            exit_price = sl_price
+        elif exit_reason == "Take Profit":
+            exit_price = tp_price
+        else:
+            exit_price = data.close[exit_index]
+
+        # a candle opening beyond the level fills at the open
+        if exit_reason != "End of data" and exit_index > entry_index:
+            gap_open = data.open[exit_index]
+            if side * (gap_open - exit_price) * (1 if exit_reason == "Take Profit" else -1) > 0:
+                exit_price = gap_open
+
+        trade.exit_index = exit_index
+        trade.exit_time = int(data.timestamp[exit_index])
+        trade.exit_price = float(exit_price)
+        trade.exit_reason = exit_reason
+        trade.pnl_pct = (side * (exit_price / entry_price - 1) - 2 * fee) * 100
+        trades.append(trade)
+
+        # equity: flat until the entry, marked to market while the position is open
+        equity[last_filled:entry_index] = balance
+        held = slice(entry_index, exit_index)
+        unrealized = side * (data.close[held] / entry_price - 1) - fee
+        equity[held] = balance * (1 + position_size * unrealized)
+
+        balance *= 1 + position_size * trade.pnl_pct / 100
+        last_filled = exit_index
+
+        # signals of candles closing before the exit were ignored live, the position was still open
+        i = int(np.searchsorted(signal_indexes, max(exit_index, signal_index + 1)))
+
+    equity[last_filled:] = balance
+
+    return BacktestResult(trades, equity)
+
+
+def compute_signals(strategy_type: str, data: Ohlcv, other_params: typing.Dict) -> typing.Tuple[np.ndarray, int]:
+    """
+    Returns the signals of a strategy type and its entry offset (see simulate())
+    """
+    if strategy_type == "Technical":
+        return technical_signals(data, other_params), 1
+    elif strategy_type == "Breakout":
+        return breakout_signals(data, other_params), 0
+    else:
+        raise ValueError(f"Unknown strategy type: {strategy_type}")
+
+
+def run_backtest(strategy_type: str, data: Ohlcv, take_profit: typing.Optional[float],
+                 stop_loss: typing.Optional[float], other_params: typing.Dict, balance_pct: float = 100,
+                 fee_pct: float = 0) -> BacktestResult:
+    """
+    Parameters:
+    strategy_type: "Technical" or "Breakout", same names as in the strategy editor
+    take_profit, stop_loss: in % of the entry price, None to disable
+    other_params: same keys as the strategies' extra parameters (ema_fast, ema_slow, ema_signal, rsi_length /
+                  min_volume)
+    balance_pct: % of the balance engaged on each trade
+    fee_pct: fee paid on entry and on exit, in % of the traded amount
+    """
+    signals, entry_offset = compute_signals(strategy_type, data, other_params)
+
+    return simulate(data, signals, entry_offset, take_profit, stop_loss, balance_pct, fee_pct)
@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+import typing
+
+from models import Balance
+from scheduler import Scheduler, ScheduledTask, default_scheduler
+
+"""
+Balances kept in memory for the trade sizing, so a signal doesn't wait for a signed REST request.
+
+The cache is refreshed from REST in the background every `ttl` seconds and updated in between by the account
+updates of the user data streams. get() refuses balances older than `max_age`: sizing a trade on them is a risk.
+"""
+
+logger = logging.getLogger()
+
+
+class BalanceCache:
+    """
+    fetch: the client's get_balances(), an empty dict means the request failed
+    ttl: seconds between two background refreshes
+    max_age: seconds after which the balances are stale
+    """
+    def __init__(self, fetch: typing.Callable[[], typing.Dict[str, Balance]], ttl: float = 60.0,
+                 max_age: float = 300.0, scheduler: typing.Optional[Scheduler] = None):
+        self._fetch = fetch
+        self.ttl = ttl
+        self.max_age = max_age
+        self._scheduler = scheduler or default_scheduler()
+        self._task: typing.Optional[ScheduledTask] = None
+
+        # the dict is swapped on refresh, never modified in place
+        self._balances: typing.Dict[str, Balance] = dict()
+        self.updated_at: typing.Optional[float] = None     # time.monotonic() of the last refresh / push update
+        self.source: typing.Optional[str] = None            # "rest" or "push"
+
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._refresh_queued = False
+        self.refreshes = 0
+        self.push_updates = 0
+        self.errors = 0
+
+    @property
+    def balances(self) -> typing.Dict[str, Balance]:
+        return self._balances
+
+    @property
+    def age(self) -> float:
+        """ Seconds since the last refresh or push update, inf if the balances were never fetched """
+        return float("inf") if self.updated_at is None else time.monotonic() - self.updated_at
+
+    @property
+    def stale(self) -> bool:
+        return self.age > self.max_age
+
+    def status(self) -> typing.Dict:
+        return {"age": self.age, "stale": self.stale, "source": self.source, "refreshes": self.refreshes,
+                "push_updates": self.push_updates, "errors": self.errors}
+
+    def start(self, first_delay: typing.Optional[float] = None):
+        """ Background refresh every ttl seconds, on the scheduler thread. first_delay=0 to fetch them now. """
+        if self._task is None:
+            self._task = self._scheduler.call_every(self.ttl, self.refresh, jitter=0.05, first_delay=first_delay)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def refresh(self) -> bool:
+        """ Fetches the balances (blocking), keeps the previous ones if the request fails """
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+
+        try:
+            balances = self._fetch()
+        except Exception as e:
+            logger.error("Error while refreshing the balances: %s", e)
+            balances = None
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+        if not balances:
+            self.errors += 1
+            return False
+
+        self._balances = balances
+        self.updated_at = time.monotonic()
+        self.source = "rest"
+        self.refreshes += 1
+        return True
+
+    def _queued_refresh(self):
+        self._refresh_queued = False
+        self.refresh()
+
+    def push(self, asset: str, update: typing.Callable[[Balance], None]):
+        """ Account update from a user data stream, applied to the cached Balance of `asset` """
+        balance = self._balances.get(asset)
+        if balance is None:
+            return
+
+        update(balance)
+        self.updated_at = time.monotonic()
+        self.source = "push"
+        self.push_updates += 1
+
+    def get(self) -> typing.Optional[typing.Dict[str, Balance]]:
+        """ The cached balances, None if they are stale. Never blocks, a late refresh runs in the background. """
+        age = self.age
+        if age > self.ttl:
+            with self._lock:
+                queue = not self._refreshing and not self._refresh_queued
+                if queue:
+                    self._refresh_queued = True
+            if queue:
+                self._scheduler.call_later(0, self._queued_refresh)
+
+        if age > self.max_age:
+            return None
+        return self._balances
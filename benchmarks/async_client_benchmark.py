@@ -0,0 +1,170 @@
+"""
+AsyncBinanceFuturesClient against a local mock of the Binance Futures REST + websocket API (aiohttp.web).
+
+- one Breakout strategy on each of SYMBOLS symbols, warmed up with get_historical_candles()
+- the mock streams TRADES aggTrade frames spread over the symbols, as fast as it can
+- one strategy has a low min_volume so it opens a position: the order is "NEW" first, the fill is found by the order
+  status poll (call_later, on the strategy thread)
+
+Prints the number of threads of the process, the dispatch throughput and the order round trip.
+
+Run from the project root:
+    python -m benchmarks.async_client_benchmark
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from aiohttp import web
+
+from connectors.binance_futures_async import AsyncBinanceFuturesClient
+from strategies import BreakoutStrategy
+
+SYMBOLS = 500
+TRADES = 100000
+
+
+class MockBinance:
+    def __init__(self):
+        with open("response_binance.json") as f:
+            exchange_info = json.load(f)
+
+        template = exchange_info['symbols'][0]
+        exchange_info['symbols'] = [dict(template, symbol=f"SYM{i}USDT") for i in range(SYMBOLS)]
+        self.exchange_info = exchange_info
+
+        self.orders = dict()
+        self.order_polls = 0
+        self.subscriptions = 0
+        self.stream_started = asyncio.Event()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/fapi/v1/exchangeInfo", self.exchange_info_handler)
+        app.router.add_get("/fapi/v1/account", self.account)
+        app.router.add_get("/fapi/v1/klines", self.klines)
+        app.router.add_post("/fapi/v1/order", self.new_order)
+        app.router.add_get("/fapi/v1/order", self.order_status)
+        app.router.add_get("/ws", self.websocket)
+        return app
+
+    async def exchange_info_handler(self, request):
+        return web.json_response(self.exchange_info)
+
+    async def account(self, request):
+        assert "signature" in request.query
+        return web.json_response({"assets": [{"asset": "USDT", "initialMargin": "0", "maintMargin": "0",
+                                              "marginBalance": "1000", "walletBalance": "1000",
+                                              "unrealizedProfit": "0"}]})
+
+    async def klines(self, request):
+        now = int(time.time() * 1000) // 60000 * 60000
+        return web.json_response([[now - (999 - i) * 60000, "100", "100.5", "99.5", "100", "10", 0, "0", 0, "0",
+                                   "0", "0"] for i in range(1000)])
+
+    async def new_order(self, request):
+        order_id = len(self.orders) + 1
+        self.orders[order_id] = time.perf_counter()
+        return web.json_response({"orderId": order_id, "status": "NEW", "avgPrice": "0"})
+
+    async def order_status(self, request):
+        self.order_polls += 1
+        return web.json_response({"orderId": int(request.query['orderId']), "status": "FILLED",
+                                  "avgPrice": "101.0"})
+
+    async def websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        async for msg in ws:
+            data = json.loads(msg.data)
+            self.subscriptions += len(data['params'])
+            if not self.stream_started.is_set():
+                self.stream_started.set()
+                await self.stream(ws)
+
+        return ws
+
+    async def stream(self, ws: web.WebSocketResponse):
+        for i in range(TRADES):
+            ts = int(time.time() * 1000)
+            symbol = f"SYM{i % SYMBOLS}USDT"
+            # SYM0USDT trades above the previous candles' high: breakout
+            price = "102" if i % SYMBOLS == 0 else "100"
+            await ws.send_str(json.dumps({"e": "aggTrade", "E": ts, "s": symbol, "a": i, "p": price, "q": "0.01",
+                                          "f": i, "l": i, "T": ts, "m": False}))
+
+
+def main():
+    # the mock sends faster than one CPU can process: no "difference with exchange time" warning per trade
+    logging.getLogger().setLevel(logging.ERROR)
+
+    mock = MockBinance()
+    server_loop = asyncio.new_event_loop()
+    runner = web.AppRunner(mock.app())
+    server_loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    server_loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    threading.Thread(target=server_loop.run_forever, daemon=True).start()
+
+    threads_before = threading.active_count()
+
+    client = AsyncBinanceFuturesClient("public", "secret", testnet=True, base_url=f"http://127.0.0.1:{port}",
+                                       wss_url=f"ws://127.0.0.1:{port}/ws", connect=False)
+    client.contracts = client.get_contracts()
+    client.balance_cache.refresh()
+
+    start = time.perf_counter()
+    parsed = [0]
+    for b_index, contract in enumerate(client.contracts.values()):
+        min_volume = 0 if contract.symbol == "SYM0USDT" else 1e9
+        strategy = BreakoutStrategy(client, contract, "Binance", "1m", 10, 5, 2, {"min_volume": min_volume})
+        strategy.candles = client.get_historical_candles(contract, "1m")
+
+        parse_trades_batch = strategy.parse_trades_batch
+
+        def counted(prints, parse_trades_batch=parse_trades_batch):
+            parsed[0] += len(prints)
+            return parse_trades_batch(prints)
+
+        strategy.parse_trades_batch = counted
+        client.strategies[b_index] = strategy
+    print(f"{len(client.strategies)} strategies warmed up in {time.perf_counter() - start:.1f} s "
+          f"({len(client.strategies) + 2} REST requests on one keep-alive session)")
+
+    start = time.perf_counter()
+    client.start_ws()
+    while parsed[0] < TRADES:
+        time.sleep(0.01)
+        if time.perf_counter() - start > 120:
+            break
+    elapsed = time.perf_counter() - start
+
+    threads_after = threading.active_count()
+    print(f"{parsed[0]} aggTrades dispatched in {elapsed:.2f} s ({parsed[0] / elapsed:.0f} trades/s)")
+    print(f"threads: {threads_before} before the client (main + mock server), {threads_after} with the client "
+          f"running ({SYMBOLS} symbols)")
+
+    strategy = client.strategies[0]
+    deadline = time.perf_counter() + 5
+    while (len(strategy.trades) == 0 or strategy.trades[0].entry_price is None) and time.perf_counter() < deadline:
+        time.sleep(0.05)
+
+    if len(strategy.trades) > 0:
+        trade = strategy.trades[0]
+        print(f"SYM0USDT breakout: {trade.side} trade, entry price {trade.entry_price} found by "
+              f"{mock.order_polls} status poll(s), TP {trade.take_profit_price} / SL {trade.stop_loss_price}")
+    else:
+        print("SYM0USDT breakout: no trade opened")
+
+    print("REST:", client.timings[-1])
+
+    client.close()
+    server_loop.call_soon_threadsafe(server_loop.stop)
+
+
+if __name__ == "__main__":
+    main()
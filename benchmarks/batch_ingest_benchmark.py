@@ -0,0 +1,98 @@
+"""
+Trade prints fed to a strategy one by one (parse_trades() + check_trade() for each print, as before) compared with
+parse_trades_batch() on the same prints grouped like the Bitmex trade messages, with a check that both give the same
+candles.
+
+Run from the project root:
+    python -m benchmarks.batch_ingest_benchmark
+"""
+import random
+import time
+import typing
+
+import numpy as np
+
+from models import Candle, Contract
+from strategies import BreakoutStrategy, TF_EQUIV
+
+WARM_UP = 200
+PRINTS = 200000
+MAX_BATCH = 100     # prints per message
+PARAMS = {"min_volume": float("inf")}   # no signal: the strategies never place an order
+
+
+def _contract() -> Contract:
+    return Contract("binance", {'symbol': "BTCUSDT", 'baseAsset': "BTC", 'quoteAsset': "USDT",
+                                'pricePrecision': 2, 'quantityPrecision': 3})
+
+
+def _warm_up_candles(last_ts: int) -> typing.List[Candle]:
+    tf_ms = TF_EQUIV["1m"] * 1000
+    candles = []
+    for i in range(WARM_UP):
+        candle_info = {'ts': last_ts - (WARM_UP - 1 - i) * tf_ms, 'open': 30000.0, 'high': 30000.0,
+                       'low': 30000.0, 'close': 30000.0, 'volume': 1}
+        candles.append(Candle('parse_trade', candle_info, "1m"))
+    return candles
+
+
+def _messages(first_ts: int) -> typing.List[typing.List[typing.Tuple[float, float, int]]]:
+    """ Random walk prints, a few ms apart with a gap of several minutes now and then (missing candles) """
+    messages = []
+    price = 30000.0
+    ts = first_ts
+    count = 0
+
+    while count < PRINTS:
+        batch = []
+        for _ in range(random.randint(1, MAX_BATCH)):
+            price = max(price + random.gauss(0, 2), 1.0)
+            ts += random.randint(0, 40) if random.random() > 0.00005 else random.randint(2, 5) * 60000
+            batch.append((round(price, 1), random.randint(1, 500) / 1000, ts))
+        messages.append(batch)
+        count += len(batch)
+
+    return messages
+
+
+def _strategy(last_ts: int) -> BreakoutStrategy:
+    strategy = BreakoutStrategy(None, _contract(), "Bitmex", "1m", 1, 1, 1, PARAMS)
+    strategy.candles = _warm_up_candles(last_ts)
+    return strategy
+
+
+def main():
+    random.seed(42)
+    tf_ms = TF_EQUIV["1m"] * 1000
+    now = int(time.time() * 1000)
+    last_ts = now - now % tf_ms     # the prints start now: no exchange time warning
+    messages = _messages(now)
+    prints = sum(len(m) for m in messages)
+
+    one_by_one = _strategy(last_ts)
+    start = time.perf_counter()
+    for message in messages:
+        for price, size, timestamp in message:
+            res = one_by_one.parse_trades(price, size, timestamp)
+            one_by_one.check_trade(res)
+    one_by_one_time = time.perf_counter() - start
+
+    batched = _strategy(last_ts)
+    start = time.perf_counter()
+    for message in messages:
+        batched.parse_trades_batch(message)
+    batched_time = time.perf_counter() - start
+
+    expected = one_by_one.candles.to_ohlcv().columns()
+    result = batched.candles.to_ohlcv().columns()
+    same = all(np.array_equal(e, r) for e, r in zip(expected, result))
+
+    print(f"{prints} prints in {len(messages)} messages ({prints / len(messages):.1f} prints per message), "
+          f"{len(one_by_one.candles) - WARM_UP} new candles")
+    print(f"one by one: {one_by_one_time * 1e6 / prints:.2f} us per print")
+    print(f"batched:    {batched_time * 1e6 / prints:.2f} us per print (x{one_by_one_time / batched_time:.1f})")
+    print(f"same candles: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Decoding cost of Bitmex websocket frames: json.loads + dateutil.parser.isoparse (previous code) compared with
+decoding.loads + decoding.bitmex_timestamp_ms.
+
+The frames are built from the response_bitmex.json instrument snapshot: one "instrument" partial with every
+instrument, then "trade" frames of 1 to 10 trades on those symbols, with timestamps 50 ms apart.
+
+Run from the project root:
+    python -m benchmarks.decoding_benchmark
+"""
+import json
+import random
+import time
+
+import dateutil.parser
+
+import decoding
+
+TRADE_FRAMES = 20000
+REPEAT = 3
+
+
+def make_frames() -> list:
+    with open("response_bitmex.json") as f:
+        instruments = json.load(f)
+
+    frames = [json.dumps({"table": "instrument", "action": "partial", "data": instruments})]
+
+    rng = random.Random(1)
+    ts = int(dateutil.parser.isoparse(instruments[0]['timestamp']).timestamp() * 1000)
+    for _ in range(TRADE_FRAMES):
+        trades = []
+        for _ in range(rng.randint(1, 10)):
+            ts += 50
+            instrument = rng.choice(instruments)
+            trades.append({"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ts // 1000)) +
+                           f".{ts % 1000:03d}Z", "symbol": instrument['symbol'], "side": rng.choice(["Buy", "Sell"]),
+                           "size": rng.randint(1, 1000), "price": instrument['lastPrice'] or 1.0,
+                           "tickDirection": "PlusTick", "trdMatchID": "00000000-0000-0000-0000-000000000000",
+                           "grossValue": 0, "homeNotional": 0.0, "foreignNotional": 0.0})
+        frames.append(json.dumps({"table": "trade", "action": "insert", "data": trades}))
+
+    return frames
+
+
+def legacy_decode(frames: list) -> list:
+    timestamps = []
+    for msg in frames:
+        data = json.loads(msg)
+        if data['table'] == "trade":
+            for d in data['data']:
+                timestamps.append(int(dateutil.parser.isoparse(d['timestamp']).timestamp() * 1000))
+    return timestamps
+
+
+def fast_decode(frames: list) -> list:
+    timestamps = []
+    for msg in frames:
+        data = decoding.loads(msg)
+        if data['table'] == "trade":
+            for d in data['data']:
+                timestamps.append(decoding.bitmex_timestamp_ms(d['timestamp']))
+    return timestamps
+
+
+def best_of(func, frames: list) -> float:
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func(frames)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    frames = make_frames()
+    size = sum(len(msg) for msg in frames) / 1024 / 1024
+
+    legacy = legacy_decode(frames)
+    fast = fast_decode(frames)
+    # float rounding in the legacy int(timestamp() * 1000) can land 1 ms below the exact value
+    off = sum(1 for a, b in zip(legacy, fast) if a != b)
+    assert len(legacy) == len(fast) and all(abs(a - b) <= 1 for a, b in zip(legacy, fast))
+
+    print(f"{len(frames)} frames ({size:.1f} MB), {len(fast)} trades, JSON backend: {decoding.JSON_BACKEND}")
+    print(f"{off} legacy timestamps 1 ms off because of float rounding")
+
+    legacy_time = best_of(legacy_decode, frames)
+    fast_time = best_of(fast_decode, frames)
+    print(f"json.loads + isoparse:          {legacy_time * 1000:8.1f} ms  {len(frames) / legacy_time:10.0f} frames/s")
+    print(f"decoding.loads + fixed format:  {fast_time * 1000:8.1f} ms  {len(frames) / fast_time:10.0f} frames/s "
+          f"({legacy_time / fast_time:.1f}x)")
+
+    # timestamps only
+    stamps = [d['timestamp'] for msg in frames[1:] for d in json.loads(msg)['data']]
+    start = time.perf_counter()
+    for s in stamps:
+        int(dateutil.parser.isoparse(s).timestamp() * 1000)
+    iso_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for s in stamps:
+        decoding.bitmex_timestamp_ms(s)
+    fixed_time = time.perf_counter() - start
+    print(f"timestamps: isoparse {iso_time / len(stamps) * 1e6:.2f} us, "
+          f"bitmex_timestamp_ms {fixed_time / len(stamps) * 1e6:.2f} us ({iso_time / fixed_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
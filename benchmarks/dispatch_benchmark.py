@@ -0,0 +1,97 @@
+"""
+Websocket dispatch throughput with 10 / 100 / 1000 running strategies spread over 50 symbols: the previous scan of
+every strategy for each aggTrade / bookTicker frame compared with the StrategyRegistry symbol index.
+
+The frames go through BinanceFuturesClient._on_message() (no connection), the strategies do nothing.
+
+Run from the project root:
+    python -m benchmarks.dispatch_benchmark
+"""
+import json
+import time
+
+from connectors.binance_futures import BinanceFuturesClient
+from price_registry import PriceRegistry
+from strategy_registry import StrategyRegistry
+
+SYMBOLS = 50
+FRAMES = 20000
+
+
+class FakeContract:
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+
+
+class FakeStrategy:
+    def __init__(self, symbol: str):
+        self.contract = FakeContract(symbol)
+        self.trades = []
+        self.calls = 0
+
+    def parse_trades(self, price: float, size: float, timestamp: int) -> str:
+        self.calls += 1
+        return "same_candle"
+
+    def check_trade(self, tick_type: str):
+        pass
+
+
+def legacy_dispatch(strategies: dict, symbol: str, data: dict):
+    """ aggTrade dispatch as it was before the symbol index """
+    for key, strategy in strategies.items():
+        if strategy.contract.symbol == symbol:
+            res = strategy.parse_trades(float(data['p']), float(data['q']), data['T'])
+            strategy.check_trade(res)
+
+
+def make_client(strategies) -> BinanceFuturesClient:
+    client = BinanceFuturesClient.__new__(BinanceFuturesClient)
+    client.prices = PriceRegistry()
+    client.journal = None
+    client.strategies = strategies
+    return client
+
+
+def make_frames() -> list:
+    frames = []
+    for i in range(FRAMES):
+        symbol = f"SYM{i % SYMBOLS}USDT"
+        frames.append(json.dumps({"e": "aggTrade", "s": symbol, "p": "100.5", "q": "0.01", "T": 1600000000000 + i}))
+    return frames
+
+
+def main():
+    frames = make_frames()
+
+    print(f"{FRAMES} aggTrade frames over {SYMBOLS} symbols")
+    print(f"{'strategies':>10} {'linear scan':>16} {'symbol index':>16} {'speedup':>8}")
+
+    for count in (10, 100, 1000):
+        legacy = dict()
+        registry = StrategyRegistry()
+        for b_index in range(count):
+            symbol = f"SYM{b_index % SYMBOLS}USDT"
+            legacy[b_index] = FakeStrategy(symbol)
+            registry[b_index] = FakeStrategy(symbol)
+
+        start = time.perf_counter()
+        for msg in frames:
+            data = json.loads(msg)
+            legacy_dispatch(legacy, data['s'], data)
+        legacy_time = time.perf_counter() - start
+
+        client = make_client(registry)
+        start = time.perf_counter()
+        for msg in frames:
+            client._on_message(None, msg)
+        index_time = time.perf_counter() - start
+
+        assert sum(s.calls for s in legacy.values()) == sum(s.calls for s in registry.values())
+
+        print(f"{count:>10} {FRAMES / legacy_time:>10.0f} msg/s {FRAMES / index_time:>10.0f} msg/s "
+              f"{legacy_time / index_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Cold import time of the application modules, each run in a new interpreter with `python -X importtime`.
+
+Profiling: the total time, then a per-module breakdown (slowest modules by their own import time, and what the
+imported modules cost with everything they import). Modules already loaded by the interpreter at startup are not
+counted.
+
+Budget check: with --budget-ms, exits with code 1 when the median total is over the budget, so a new module level
+import of a heavy dependency in the connectors is caught.
+
+Run from the project root:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time interface.root_component --top 30
+    python -m benchmarks.import_time --budget-ms          # connectors budget, DEFAULT_BUDGET_MS
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import typing
+
+DEFAULT_MODULES = ["connectors.binance_futures", "connectors.bitmex"]
+DEFAULT_BUDGET_MS = 100
+RUNS = 5
+
+
+class ImportEntry:
+    __slots__ = ("name", "self_us", "cumulative_us", "depth")
+
+    def __init__(self, name: str, self_us: int, cumulative_us: int, depth: int):
+        self.name = name
+        self.self_us = self_us
+        self.cumulative_us = cumulative_us
+        self.depth = depth
+
+
+def _parse(stderr: str) -> typing.List[ImportEntry]:
+    """ "import time: <self us> | <cumulative us> | <name indented by 2 spaces per level>" lines """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        entries.append(ImportEntry(name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def _run(code: str) -> typing.Tuple[float, typing.List[ImportEntry]]:
+    script = "import time\n_start = time.perf_counter()\n" + code + "\nprint(time.perf_counter() - _start)"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return float(result.stdout.strip().splitlines()[-1]), _parse(result.stderr)
+
+
+def profile(modules: typing.List[str], runs: int = RUNS) -> typing.Tuple[typing.List[float], typing.List[ImportEntry]]:
+    """ Total seconds of each run, and the entries of the fastest run without the interpreter's startup imports """
+    _, startup = _run("pass")
+    startup_names = {e.name for e in startup}
+
+    totals = []
+    best = None
+    for _ in range(runs):
+        total, entries = _run("import " + ", ".join(modules))
+        totals.append(total)
+        if best is None or total <= min(totals):
+            best = [e for e in entries if e.name not in startup_names]
+
+    return totals, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold import time profile and budget check")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=15, help="number of modules in the breakdown")
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--budget-ms", type=float, nargs="?", const=DEFAULT_BUDGET_MS, default=None,
+                        help=f"fail above this median total, {DEFAULT_BUDGET_MS} ms without a value")
+    args = parser.parse_args()
+
+    totals, entries = profile(args.modules, args.runs)
+    median_ms = statistics.median(totals) * 1000
+
+    print(f"import {', '.join(args.modules)}: median {median_ms:.1f} ms, min {min(totals) * 1000:.1f} ms "
+          f"({args.runs} cold runs)")
+
+    print("\nslowest modules, own import time (fastest run):")
+    for e in sorted(entries, key=lambda e: e.self_us, reverse=True)[:args.top]:
+        print(f"  {e.self_us / 1000:8.1f} ms  {e.name}")
+
+    # the requested modules, and what each of their direct imports costs with everything it imports. The entries
+    # are printed when an import is done: the children of a module come right before it.
+    print("\nbreakdown, with the imports of each module:")
+    children = []
+    for e in entries:
+        if e.depth == 1:
+            children.append(e)
+        elif e.depth == 0:
+            print(f"  {e.cumulative_us / 1000:8.1f} ms  {e.name}")
+            for child in sorted(children, key=lambda c: c.cumulative_us, reverse=True)[:args.top]:
+                print(f"  {child.cumulative_us / 1000:8.1f} ms      {child.name}")
+            children = []
+
+    if args.budget_ms is not None:
+        if median_ms > args.budget_ms:
+            print(f"\nFAILED: {median_ms:.1f} ms over the {args.budget_ms:.0f} ms budget")
+            sys.exit(1)
+        print(f"\nOK: under the {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == "__main__":
+    main()
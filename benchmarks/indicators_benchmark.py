@@ -0,0 +1,102 @@
+"""
+Compares the streaming MACD/RSI state of TechnicalStrategy with the pandas implementation it replaced.
+
+Run from the project root:
+    python -m benchmarks.indicators_benchmark
+"""
+import random
+import time
+import typing
+
+import pandas as pd
+
+from models import Candle, Contract
+from strategies import TechnicalStrategy, TF_EQUIV
+
+PARAMS = {"ema_fast": 12, "ema_slow": 26, "ema_signal": 9, "rsi_length": 14}
+WARM_UP = 1000
+NEW_CANDLES = 500
+
+
+def pandas_rsi(closes: typing.List[float], rsi_length: int) -> float:
+    closes = pd.Series(closes)
+
+    delta = closes.diff().dropna()
+    up, down = delta.copy(), delta.copy()
+
+    up[up < 0] = 0
+    down[down > 0] = 0
+
+    avg_gain = up.ewm(com=(rsi_length - 1), min_periods=rsi_length).mean()
+    avg_loss = down.abs().ewm(com=(rsi_length - 1), min_periods=rsi_length).mean()
+
+    rs = avg_gain / avg_loss
+    rsi = 100 - (100 / (1 + rs))
+    rsi = rsi.round(2)
+
+    return rsi.iloc[-2]
+
+
+def pandas_macd(closes: typing.List[float], ema_fast: int, ema_slow: int,
+                ema_signal: int) -> typing.Tuple[float, float]:
+    closes = pd.Series(closes)
+
+    macd_line = closes.ewm(span=ema_fast).mean() - closes.ewm(span=ema_slow).mean()
+    macd_signal = macd_line.ewm(span=ema_signal).mean()
+
+    return macd_line.iloc[-2], macd_signal.iloc[-2]
+
+
+def _random_candles(count: int) -> typing.Tuple[Contract, typing.List[Candle]]:
+    contract = Contract("binance", {'symbol': "BTCUSDT", 'baseAsset': "BTC", 'quoteAsset': "USDT",
+                                    'pricePrecision': 2, 'quantityPrecision': 3})
+    candles = []
+    price = 30000.0
+    ts = 1654682400000
+
+    for _ in range(count):
+        price = max(price + random.gauss(0, 25), 1.0)
+        candle_info = {'ts': ts, 'open': price, 'high': price, 'low': price, 'close': price, 'volume': 1}
+        candles.append(Candle('parse_trade', candle_info, "1m"))
+        ts += TF_EQUIV["1m"] * 1000
+
+    return contract, candles
+
+
+def main():
+    random.seed(42)
+    contract, candles = _random_candles(WARM_UP + NEW_CANDLES)
+
+    strategy = TechnicalStrategy(None, contract, "Binance", "1m", 1, 1, 1, PARAMS)
+    strategy.candles = candles[:WARM_UP]
+
+    pandas_time = 0.0
+    streaming_time = 0.0
+    mismatches = 0
+
+    for i in range(WARM_UP, WARM_UP + NEW_CANDLES):
+        strategy.candles.append(candles[i])
+        closes = [candle.close for candle in strategy.candles]
+
+        start = time.perf_counter()
+        expected = pandas_macd(closes, PARAMS["ema_fast"], PARAMS["ema_slow"], PARAMS["ema_signal"]),\
+            pandas_rsi(closes, PARAMS["rsi_length"])
+        pandas_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = strategy._macd(), strategy._rsi()
+        streaming_time += time.perf_counter() - start
+
+        if result != expected:
+            mismatches += 1
+
+    print(f"{NEW_CANDLES} new candles after {WARM_UP} warm-up candles")
+    print(f"pandas:    {pandas_time * 1000 / NEW_CANDLES:.4f} ms per candle")
+    print(f"streaming: {streaming_time * 1000 / NEW_CANDLES:.4f} ms per candle "
+          f"(first call includes seeding from history)")
+    print(f"speed-up:  x{pandas_time / streaming_time:.1f}")
+    print(f"mismatching values: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Memory and construction time of the slotted models compared with the previous __dict__ based classes, which kept
+the raw exchange payload of every object alive.
+
+Payloads come from the response_binance.json / response_bitmex.json snapshots.
+
+Run from the project root:
+    python -m benchmarks.models_benchmark
+"""
+import datetime
+import gc
+import json
+import time
+import tracemalloc
+import typing
+
+import dateutil.parser
+
+from models import Candle, Contract, tick_to_decimals, BITMEX_MULTIPLIER, BITMEX_TF_MINUTES
+
+CANDLES = 1000
+REPEAT = 20
+
+
+class LegacyContract:
+    """ Contract as it was before __slots__ """
+    def __init__(self, platform, contract_info):
+        self.contract_info = contract_info
+        self.platform = platform
+        if self.platform == "binance":
+            self.symbol = self.contract_info['symbol']
+            self.base_asset = self.contract_info['baseAsset']
+            self.quote_asset = self.contract_info['quoteAsset']
+            self.price_decimals = self.contract_info['pricePrecision']
+            self.quantity_decimals = self.contract_info['quantityPrecision']
+            self.tick_size = 1 / pow(10, self.price_decimals)
+            self.lot_size = 1 / pow(10, self.quantity_decimals)
+        elif self.platform == "bitmex":
+            self.symbol = self.contract_info['symbol']
+            self.base_asset = self.contract_info['rootSymbol']
+            self.quote_asset = self.contract_info['quoteCurrency']
+            self.tick_size = self.contract_info['tickSize']
+            self.lot_size = self.contract_info['lotSize']
+            self.price_decimals = tick_to_decimals(self.tick_size)
+            self.quantity_decimals = tick_to_decimals(self.lot_size)
+            self.quanto = self.contract_info['isQuanto']
+            self.inverse = self.contract_info['isInverse']
+            self.multiplier = self.contract_info['multiplier'] * BITMEX_MULTIPLIER
+            if self.inverse:
+                self.multiplier *= -1
+
+
+class LegacyCandle:
+    """ Candle as it was before __slots__ """
+    def __init__(self, platform, candle_info, timeframe: str):
+        self.candle_info = candle_info
+        self.platform = platform
+        self.timeframe = timeframe
+        if self.platform == "binance":
+            self.timestamp = self.candle_info[0]
+            self.open = float(self.candle_info[1])
+            self.high = float(self.candle_info[2])
+            self.low = float(self.candle_info[3])
+            self.close = float(self.candle_info[4])
+            self.volume = float(self.candle_info[5])
+        elif self.platform == "bitmex":
+            str_time = dateutil.parser.isoparse(self.candle_info["timestamp"])
+            str_time = str_time - datetime.timedelta(minutes=BITMEX_TF_MINUTES[self.timeframe])
+            self.timestamp = int(str_time.timestamp() * 1000)
+            self.open = self.candle_info["open"]
+            self.high = self.candle_info["high"]
+            self.low = self.candle_info["low"]
+            self.close = self.candle_info["close"]
+            self.volume = self.candle_info["volume"]
+
+
+def _binance_klines() -> str:
+    ts = 1654682400000
+    klines = []
+    for i in range(CANDLES):
+        price = 30000 + i
+        klines.append([ts + i * 60000, str(price), str(price + 5), str(price - 5), str(price + 1), "12.345",
+                       ts + i * 60000 + 59999, "370350.00", 1000, "6.1", "183000.00", "0"])
+    return json.dumps(klines)
+
+
+def _bitmex_buckets() -> str:
+    start = datetime.datetime(2022, 6, 8, tzinfo=datetime.timezone.utc)
+    buckets = []
+    for i in range(CANDLES):
+        price = 30000.5 + i
+        ts = (start + datetime.timedelta(minutes=i + 1)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        buckets.append({"timestamp": ts, "symbol": "XBTUSD", "open": price, "high": price + 5, "low": price - 5,
+                        "close": price + 1, "trades": 42, "volume": 12000, "vwap": price, "lastSize": 100,
+                        "turnover": 40000000, "homeNotional": 0.4, "foreignNotional": 12000})
+    return json.dumps(buckets)
+
+
+def _measure(name: str, raw: str, build: typing.Callable[[typing.Any], list]):
+    gc.collect()
+    tracemalloc.start()
+    objects = build(json.loads(raw))  # the parsed payload is dropped here unless an object keeps it
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+
+    payloads = [json.loads(raw) for _ in range(REPEAT)]
+    start = time.perf_counter()
+    for payload in payloads:
+        build(payload)
+    elapsed = (time.perf_counter() - start) / REPEAT
+
+    print(f"{name:<42} {retained / 1024:>10.1f} KiB {elapsed * 1000:>10.3f} ms")
+
+
+def main():
+    with open("response_binance.json") as f:
+        binance_info = f.read()
+    with open("response_bitmex.json") as f:
+        bitmex_info = f.read()
+    klines = _binance_klines()
+    buckets = _bitmex_buckets()
+
+    print(f"{'':<42} {'retained':>14} {'build time':>13}")
+
+    _measure("Binance contracts - legacy", binance_info,
+             lambda d: [LegacyContract("binance", s) for s in d['symbols']])
+    _measure("Binance contracts - slotted", binance_info,
+             lambda d: [Contract.from_binance(s) for s in d['symbols']])
+
+    _measure("Bitmex contracts - legacy", bitmex_info,
+             lambda d: [LegacyContract("bitmex", s) for s in d])
+    _measure("Bitmex contracts - slotted", bitmex_info,
+             lambda d: [Contract.from_bitmex(s) for s in d])
+
+    _measure(f"{CANDLES} Binance candles - legacy", klines,
+             lambda d: [LegacyCandle("binance", c, "1m") for c in d])
+    _measure(f"{CANDLES} Binance candles - slotted", klines,
+             lambda d: [Candle.from_binance(c, "1m") for c in d])
+
+    _measure(f"{CANDLES} Bitmex candles - legacy", buckets,
+             lambda d: [LegacyCandle("bitmex", c, "1m") for c in d])
+    _measure(f"{CANDLES} Bitmex candles - slotted", buckets,
+             lambda d: [Candle.from_bitmex(c, "1m") for c in d])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Scaling of the parameter sweep with the number of worker processes.
+
+Run from the project root:
+    python -m benchmarks.optimizer_benchmark
+"""
+import os
+import time
+
+from benchmarks.backtest_benchmark import random_walk
+from optimizer import grid_combinations, optimize
+
+CANDLES = 100000
+
+GRID = {
+    "ema_fast": [8, 10, 12, 14],
+    "ema_slow": [21, 26, 30],
+    "ema_signal": [9],
+    "rsi_length": [14],
+    "take_profit": [0.5, 1.0, 1.5, 2.0],
+    "stop_loss": [0.25, 0.5, 1.0],
+}
+
+
+def main():
+    data = random_walk(CANDLES)
+    combinations = grid_combinations(GRID)
+
+    workers = 1
+    single_worker_time = None
+
+    while workers <= (os.cpu_count() or 1):
+        start = time.perf_counter()
+        ranked = optimize("Technical", data, combinations, rank_by=["total_return", "-max_drawdown"], workers=workers)
+        elapsed = time.perf_counter() - start
+
+        single_worker_time = single_worker_time or elapsed
+        print(f"{workers:>3} workers: {len(combinations)} combinations in {elapsed:.2f} s "
+              f"(speed-up x{single_worker_time / elapsed:.2f}) | best: {ranked[0][0]}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Stress test of the copy-on-write StrategyRegistry and PriceRegistry of a client.
+
+While two threads replay aggTrade and bookTicker frames through BinanceFuturesClient._on_message() (no connection),
+another thread adds and removes strategies as fast as it can and an observer thread keeps iterating the strategies
+and the prices, like the interface does. Checks:
+- no exception in any thread (no "dictionary changed size during iteration")
+- the strategies registered for the whole run got every trade of their symbol: no tick skipped
+- the observer never saw a bid and an ask of two different updates
+
+The same add / remove loop on a plain dict is run first, to show the RuntimeError the registries avoid.
+Exits with code 1 when a check fails.
+
+Run from the project root:
+    python -m benchmarks.registry_stress
+"""
+import json
+import random
+import sys
+import threading
+import time
+
+from connectors.binance_futures import BinanceFuturesClient
+from price_registry import PriceRegistry
+from strategy_registry import StrategyRegistry
+from ui_events import UiEvents
+
+SYMBOLS = 20
+FRAMES = 200000     # per replay thread
+REPLAY_THREADS = 2
+SPREAD = 0.5
+
+
+class FakeContract:
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+
+
+class CountingStrategy:
+    def __init__(self, symbol: str):
+        self.contract = FakeContract(symbol)
+        self.open_trades = []
+        self.trades = []
+        self.received = 0
+
+    def parse_trades(self, price: float, size: float, timestamp: int) -> str:
+        self.received += 1
+        return "same_candle"
+
+    def check_trade(self, tick_type: str):
+        pass
+
+
+def make_client() -> BinanceFuturesClient:
+    client = BinanceFuturesClient.__new__(BinanceFuturesClient)
+    client.prices = PriceRegistry()
+    client.journal = None
+    client.strategies = StrategyRegistry()
+    client.ui_events = UiEvents()
+    client.order_books = dict()
+    return client
+
+
+def make_frames(seed: int):
+    """ Frames of a replay thread, and the number of aggTrades of each symbol """
+    rng = random.Random(seed)
+    frames = []
+    trades = dict()
+    for i in range(FRAMES):
+        symbol = f"SYM{rng.randrange(SYMBOLS)}USDT"
+        if i % 2 == 0:
+            frames.append(json.dumps({"e": "aggTrade", "s": symbol, "p": "100.5", "q": "0.01",
+                                      "T": int(time.time() * 1000)}))
+            trades[symbol] = trades.get(symbol, 0) + 1
+        else:
+            bid = rng.randint(1, 100000)
+            frames.append(json.dumps({"e": "bookTicker", "s": symbol, "b": str(bid), "a": str(bid + SPREAD)}))
+    return frames, trades
+
+
+def plain_dict_errors(duration: float) -> int:
+    """ The previous registries: a dict changed by one thread while another iterates it """
+    strategies = {b_index: b_index for b_index in range(1000)}
+    stop = threading.Event()
+    errors = [0]
+
+    def churn():
+        b_index = 1000
+        while not stop.is_set():
+            for i in range(10):
+                strategies[b_index + i] = b_index
+            for i in range(10):
+                del strategies[b_index + i]
+            b_index += 10
+
+    t = threading.Thread(target=churn)
+    t.start()
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        try:
+            for _ in strategies.items():
+                pass
+        except RuntimeError:
+            errors[0] += 1
+    stop.set()
+    t.join()
+    return errors[0]
+
+
+def main():
+    sys.setswitchinterval(0.00001)  # switch threads often: more interleavings
+
+    print(f"plain dict, 1 s of add / remove while iterating: {plain_dict_errors(1.0)} RuntimeError")
+
+    client = make_client()
+    permanent = []
+    for b_index in range(SYMBOLS):
+        strategy = CountingStrategy(f"SYM{b_index}USDT")
+        client.strategies[b_index] = strategy
+        permanent.append(strategy)
+
+    replays = [make_frames(seed) for seed in range(REPLAY_THREADS)]
+    expected = dict()
+    for _, trades in replays:
+        for symbol, count in trades.items():
+            expected[symbol] = expected.get(symbol, 0) + count
+
+    stop = threading.Event()
+    errors = []
+    writes = [0]
+    observed = [0, 0]   # iterations, torn prices
+
+    def replay(frames):
+        try:
+            for frame in frames:
+                client._on_message(None, frame)
+        except Exception as e:
+            errors.append(f"replay: {e!r}")
+
+    def churn():
+        rng = random.Random(42)
+        b_index = SYMBOLS
+        added = []
+        try:
+            while not stop.is_set():
+                if len(added) < 50 or rng.random() < 0.5:
+                    client.strategies[b_index] = CountingStrategy(f"SYM{rng.randrange(SYMBOLS)}USDT")
+                    added.append(b_index)
+                    b_index += 1
+                else:
+                    del client.strategies[added.pop(rng.randrange(len(added)))]
+                writes[0] += 1
+        except Exception as e:
+            errors.append(f"churn: {e!r}")
+
+    def observe():
+        try:
+            while not stop.is_set():
+                for b_index, strategy in client.strategies.items():
+                    pass
+                for symbol in client.strategies.symbols():
+                    pass
+                for symbol, prices in client.prices.items():
+                    if prices['ask'] - prices['bid'] != SPREAD:
+                        observed[1] += 1
+                observed[0] += 1
+        except Exception as e:
+            errors.append(f"observer: {e!r}")
+
+    writers = [threading.Thread(target=churn), threading.Thread(target=observe)]
+    readers = [threading.Thread(target=replay, args=(frames,)) for frames, _ in replays]
+
+    start = time.perf_counter()
+    for t in writers + readers:
+        t.start()
+    for t in readers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for t in writers:
+        t.join()
+
+    skipped = {s.contract.symbol: expected.get(s.contract.symbol, 0) - s.received for s in permanent
+               if s.received != expected.get(s.contract.symbol, 0)}
+
+    print(f"{REPLAY_THREADS * FRAMES} frames replayed on {REPLAY_THREADS} threads in {elapsed:.2f} s, "
+          f"{writes[0]} strategy adds / removes ({writes[0] / elapsed:.0f}/s), {observed[0]} observer passes")
+    print(f"exceptions: {len(errors)} {errors[:3]}")
+    print(f"trades skipped by the permanent strategies: {sum(skipped.values())} {skipped}")
+    print(f"torn bid / ask seen: {observed[1]}")
+
+    if len(errors) > 0 or len(skipped) > 0 or observed[1] > 0:
+        print("FAILED")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
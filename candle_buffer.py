@@ -0,0 +1,231 @@
+import typing
+
+import numpy as np
+
+from models import Candle
+
+"""
+Fixed capacity, columnar candle storage used behind Strategy.candles.
+
+Timestamp/OHLCV are kept in contiguous float64 arrays twice as long as the capacity. New candles are written after
+the last one and, when the end of the arrays is reached, the most recent rows are moved back to the start
+(amortized O(1) per append). This way the last N values of a column are always one contiguous slice, so they can be
+handed out as zero-copy numpy views.
+"""
+
+DEFAULT_CAPACITY = 1000
+COLUMNS = ("timestamp", "open", "high", "low", "close", "volume")
+
+
+class Ohlcv:
+    """ Columnar candle data: one float64 numpy array per field """
+    __slots__ = ("timestamp", "open", "high", "low", "close", "volume")
+
+    def __init__(self, timestamp, open_, high, low, close, volume):
+        self.timestamp = np.asarray(timestamp, dtype=np.float64)
+        self.open = np.asarray(open_, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.volume = np.asarray(volume, dtype=np.float64)
+
+    @classmethod
+    def from_candles(cls, candles: typing.Union["CandleBuffer", typing.List[Candle]]) -> "Ohlcv":
+        if isinstance(candles, CandleBuffer):
+            return cls(candles.timestamps(), candles.opens(), candles.highs(), candles.lows(), candles.closes(),
+                       candles.volumes())
+
+        return cls([c.timestamp for c in candles], [c.open for c in candles], [c.high for c in candles],
+                   [c.low for c in candles], [c.close for c in candles], [c.volume for c in candles])
+
+    def __len__(self) -> int:
+        return len(self.close)
+
+    def __getitem__(self, index: slice) -> "Ohlcv":
+        return Ohlcv(self.timestamp[index], self.open[index], self.high[index], self.low[index], self.close[index],
+                     self.volume[index])
+
+    def columns(self) -> typing.Tuple[np.ndarray, ...]:
+        """ Arrays in COLUMNS order """
+        return self.timestamp, self.open, self.high, self.low, self.close, self.volume
+
+
+class CandleView:
+    """
+    Behaves like a Candle (same attributes, readable and writable) but reads and writes the CandleBuffer arrays.
+    It points at a candle by its sequence number, so it stays valid when the buffer moves its rows around,
+    and raises IndexError once the candle has been dropped from the buffer.
+    """
+    __slots__ = ("_buffer", "_seq")
+
+    def __init__(self, buffer: "CandleBuffer", seq: int):
+        self._buffer = buffer
+        self._seq = seq
+
+    def _pos(self) -> int:
+        return self._buffer._position(self._seq)
+
+    @property
+    def timestamp(self) -> int:
+        return int(self._buffer._data[0, self._pos()])
+
+    @timestamp.setter
+    def timestamp(self, value: int):
+        self._buffer._data[0, self._pos()] = value
+
+    @property
+    def open(self) -> float:
+        return float(self._buffer._data[1, self._pos()])
+
+    @open.setter
+    def open(self, value: float):
+        self._buffer._data[1, self._pos()] = value
+
+    @property
+    def high(self) -> float:
+        return float(self._buffer._data[2, self._pos()])
+
+    @high.setter
+    def high(self, value: float):
+        self._buffer._data[2, self._pos()] = value
+
+    @property
+    def low(self) -> float:
+        return float(self._buffer._data[3, self._pos()])
+
+    @low.setter
+    def low(self, value: float):
+        self._buffer._data[3, self._pos()] = value
+
+    @property
+    def close(self) -> float:
+        return float(self._buffer._data[4, self._pos()])
+
+    @close.setter
+    def close(self, value: float):
+        self._buffer._data[4, self._pos()] = value
+
+    @property
+    def volume(self) -> float:
+        return float(self._buffer._data[5, self._pos()])
+
+    @volume.setter
+    def volume(self, value: float):
+        self._buffer._data[5, self._pos()] = value
+
+    def __repr__(self):
+        return f"CandleView(timestamp={self.timestamp}, open={self.open}, high={self.high}, low={self.low}, " \
+               f"close={self.close}, volume={self.volume})"
+
+
+class CandleBuffer:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, candles: typing.Iterable[Candle] = ()):
+        if capacity < 2:
+            raise ValueError("CandleBuffer capacity must be at least 2 candles")
+
+        self.capacity = capacity
+
+        # one row per column, 2 * capacity slots so the last `capacity` candles always stay contiguous
+        self._data = np.zeros((len(COLUMNS), 2 * capacity), dtype=np.float64)
+        self._start = 0     # position of the oldest candle kept
+        self._end = 0       # position after the newest candle
+        self._seq_base = 0  # sequence number of the candle stored at position 0
+
+        self.extend(candles)
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def __getitem__(self, index: int) -> CandleView:
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("CandleBuffer index out of range")
+
+        return CandleView(self, self._seq_base + self._start + index)
+
+    def __iter__(self) -> typing.Iterator[CandleView]:
+        first_seq = self._seq_base + self._start
+        for seq in range(first_seq, first_seq + len(self)):
+            yield CandleView(self, seq)
+
+    def _position(self, seq: int) -> int:
+        pos = seq - self._seq_base
+        if not self._start <= pos < self._end:
+            raise IndexError("Candle is no longer in the CandleBuffer")
+        return pos
+
+    def append_values(self, timestamp: int, open_: float, high: float, low: float, close: float, volume: float):
+        if self._end == self._data.shape[1]:
+            # move the newest `capacity - 1` candles back to the start to make room
+            keep = min(self.capacity - 1, len(self))
+            self._data[:, :keep] = self._data[:, self._end - keep:self._end]
+            self._seq_base += self._end - keep
+            self._start = 0
+            self._end = keep
+
+        self._data[:, self._end] = (timestamp, open_, high, low, close, volume)
+        self._end += 1
+
+        if self._end - self._start > self.capacity:
+            self._start += 1
+
+    def append(self, candle: typing.Union[Candle, CandleView]):
+        self.append_values(candle.timestamp, candle.open, candle.high, candle.low, candle.close, candle.volume)
+
+    def extend(self, candles: typing.Iterable[typing.Union[Candle, CandleView]]):
+        for candle in candles:
+            self.append(candle)
+
+    def extend_ohlcv(self, data: Ohlcv):
+        """ Appends columnar candles with one array copy instead of one append per candle """
+        data = data[-self.capacity:]
+        n = len(data)
+        if n == 0:
+            return
+
+        if self._end + n > self._data.shape[1]:
+            keep = min(self.capacity - n, len(self))
+            self._data[:, :keep] = self._data[:, self._end - keep:self._end]
+            self._seq_base += self._end - keep
+            self._start = 0
+            self._end = keep
+
+        for row, column in enumerate(data.columns()):
+            self._data[row, self._end:self._end + n] = column
+        self._end += n
+        self._start = max(self._start, self._end - self.capacity)
+
+    def to_ohlcv(self) -> Ohlcv:
+        """ Zero-copy views of all the candles kept, valid until the next append """
+        return Ohlcv(*(self.column(name) for name in COLUMNS))
+
+    def column(self, name: str, n: typing.Optional[int] = None) -> np.ndarray:
+        """
+        Zero-copy view of the last n values (all candles kept if n is None) of a column.
+        The view is only guaranteed to stay valid until the next append.
+        """
+        row = COLUMNS.index(name)
+        length = len(self)
+        n = length if n is None else min(n, length)
+
+        return self._data[row, self._end - n:self._end]
+
+    def timestamps(self, n: typing.Optional[int] = None) -> np.ndarray:
+        return self.column("timestamp", n)
+
+    def opens(self, n: typing.Optional[int] = None) -> np.ndarray:
+        return self.column("open", n)
+
+    def highs(self, n: typing.Optional[int] = None) -> np.ndarray:
+        return self.column("high", n)
+
+    def lows(self, n: typing.Optional[int] = None) -> np.ndarray:
+        return self.column("low", n)
+
+    def closes(self, n: typing.Optional[int] = None) -> np.ndarray:
+        return self.column("close", n)
+
+    def volumes(self, n: typing.Optional[int] = None) -> np.ndarray:
+        return self.column("volume", n)
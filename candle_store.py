@@ -0,0 +1,262 @@
+import logging
+import os
+import threading
+import time
+import typing
+
+import numpy as np
+
+from candle_buffer import CandleBuffer, Ohlcv, COLUMNS, DEFAULT_CAPACITY
+from models import Contract
+from strategies import TF_EQUIV
+
+if typing.TYPE_CHECKING:
+    from connectors.bitmex import BitmexClient
+    from connectors.binance_futures import BinanceFuturesClient
+
+"""
+On-disk historical candles, one directory per exchange/symbol/timeframe:
+
+    candle_data/binance/BTCUSDT/1m/timestamp.f64, open.f64, high.f64, low.f64, close.f64, volume.f64
+
+Each column is a raw float64 file that only grows at the end, so adding candles is an append and reading the last N
+candles is one read per column. Only closed candles are stored, sorted by timestamp and without duplicates.
+The stored candles can have gaps (history merged from a period that doesn't touch the stored one, exchange outages):
+load() only returns the candles after the last gap, the strategies read them as consecutive candles.
+If an append was interrupted, the columns are cut back to the shortest one the next time the key is used. Older
+history (see history_downloader.py) is added with merge(), which rewrites the columns through temporary files.
+"""
+
+logger = logging.getLogger()
+
+_ITEM_SIZE = np.dtype(np.float64).itemsize
+
+
+def _contiguous_from(candles: list, tf_ms: int) -> int:
+    """ Index of the first candle of the gapless run at the end of the list (0 if there is no gap) """
+    for i in range(len(candles) - 1, 0, -1):
+        if candles[i].timestamp != candles[i - 1].timestamp + tf_ms:
+            return i
+    return 0
+
+
+class CandleStore:
+    def __init__(self, root: str = "candle_data"):
+        self.root = root
+        self._locks: typing.Dict[typing.Tuple[str, str, str], threading.Lock] = dict()
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, exchange: str, symbol: str, timeframe: str) -> threading.Lock:
+        key = (exchange.lower(), symbol, timeframe)
+        with self._locks_lock:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def _dir(self, exchange: str, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.root, exchange.lower(), symbol, timeframe)
+
+    def _path(self, exchange: str, symbol: str, timeframe: str, column: str) -> str:
+        return os.path.join(self._dir(exchange, symbol, timeframe), column + ".f64")
+
+    def _merge_marker(self, exchange: str, symbol: str, timeframe: str) -> str:
+        return os.path.join(self._dir(exchange, symbol, timeframe), "merge.ready")
+
+    def _recover(self, exchange: str, symbol: str, timeframe: str):
+        """ Finishes a merge() whose new columns were all written, drops the ones of a merge() interrupted earlier """
+        marker = self._merge_marker(exchange, symbol, timeframe)
+        complete = os.path.exists(marker)
+
+        for column in COLUMNS:
+            tmp_path = self._path(exchange, symbol, timeframe, column) + ".tmp"
+            if os.path.exists(tmp_path):
+                if complete:
+                    os.replace(tmp_path, self._path(exchange, symbol, timeframe, column))
+                else:
+                    os.remove(tmp_path)
+
+        if complete:
+            os.remove(marker)
+
+    def _length(self, exchange: str, symbol: str, timeframe: str) -> int:
+        """ Number of complete rows, cuts the columns left longer by an interrupted write """
+        self._recover(exchange, symbol, timeframe)
+
+        sizes = []
+        for column in COLUMNS:
+            path = self._path(exchange, symbol, timeframe, column)
+            sizes.append(os.path.getsize(path) // _ITEM_SIZE if os.path.exists(path) else 0)
+
+        length = min(sizes)
+        for column, size in zip(COLUMNS, sizes):
+            if size > length:
+                with open(self._path(exchange, symbol, timeframe, column), "r+b") as f:
+                    f.truncate(length * _ITEM_SIZE)
+
+        return length
+
+    def length(self, exchange: str, symbol: str, timeframe: str) -> int:
+        with self._lock(exchange, symbol, timeframe):
+            return self._length(exchange, symbol, timeframe)
+
+    def last_timestamp(self, exchange: str, symbol: str, timeframe: str) -> typing.Optional[int]:
+        with self._lock(exchange, symbol, timeframe):
+            length = self._length(exchange, symbol, timeframe)
+            if length == 0:
+                return None
+            path = self._path(exchange, symbol, timeframe, "timestamp")
+            return int(np.fromfile(path, dtype=np.float64, count=1, offset=(length - 1) * _ITEM_SIZE)[0])
+
+    def first_timestamp(self, exchange: str, symbol: str, timeframe: str) -> typing.Optional[int]:
+        with self._lock(exchange, symbol, timeframe):
+            if self._length(exchange, symbol, timeframe) == 0:
+                return None
+            path = self._path(exchange, symbol, timeframe, "timestamp")
+            return int(np.fromfile(path, dtype=np.float64, count=1)[0])
+
+    def load(self, exchange: str, symbol: str, timeframe: str, n: typing.Optional[int] = None) -> Ohlcv:
+        """ Last n stored candles (all of them if n is None), fewer if there is a gap: none from before it """
+        with self._lock(exchange, symbol, timeframe):
+            length = self._length(exchange, symbol, timeframe)
+            count = length if n is None else min(n, length)
+            offset = (length - count) * _ITEM_SIZE
+
+            columns = []
+            for column in COLUMNS:
+                path = self._path(exchange, symbol, timeframe, column)
+                if count == 0:
+                    columns.append(np.empty(0, dtype=np.float64))
+                else:
+                    columns.append(np.fromfile(path, dtype=np.float64, count=count, offset=offset))
+
+        gaps = np.flatnonzero(np.diff(columns[0]) != TF_EQUIV[timeframe] * 1000)
+        if len(gaps) > 0:
+            columns = [column[gaps[-1] + 1:] for column in columns]
+
+        return Ohlcv(*columns)
+
+    def append(self, exchange: str, symbol: str, timeframe: str, data: Ohlcv) -> int:
+        """
+        Appends the candles newer than the last stored one. data must be sorted by timestamp.
+        Returns the number of candles written.
+        """
+        with self._lock(exchange, symbol, timeframe):
+            length = self._length(exchange, symbol, timeframe)
+            if length > 0:
+                path = self._path(exchange, symbol, timeframe, "timestamp")
+                last_ts = np.fromfile(path, dtype=np.float64, count=1, offset=(length - 1) * _ITEM_SIZE)[0]
+                data = data[int(np.searchsorted(data.timestamp, last_ts, side="right")):]
+
+            if len(data) == 0:
+                return 0
+
+            os.makedirs(self._dir(exchange, symbol, timeframe), exist_ok=True)
+            for column, values in zip(COLUMNS, data.columns()):
+                with open(self._path(exchange, symbol, timeframe, column), "ab") as f:
+                    np.ascontiguousarray(values, dtype=np.float64).tofile(f)
+
+        return len(data)
+
+    def merge(self, exchange: str, symbol: str, timeframe: str, data: Ohlcv) -> int:
+        """
+        Adds candles anywhere in time (e.g. older history), keeping the stored ones for timestamps present in both.
+        The columns are rewritten, use append() for candles newer than the stored ones.
+        Returns the number of candles added.
+        """
+        with self._lock(exchange, symbol, timeframe):
+            length = self._length(exchange, symbol, timeframe)
+            stored = [np.fromfile(self._path(exchange, symbol, timeframe, column), dtype=np.float64)
+                      if length > 0 else np.empty(0, dtype=np.float64) for column in COLUMNS]
+
+            columns = [np.concatenate((old, new)) for old, new in zip(stored, data.columns())]
+            # np.unique keeps the first occurrence: the stored candle wins
+            _, first = np.unique(columns[0], return_index=True)
+            columns = [column[first] for column in columns]
+
+            os.makedirs(self._dir(exchange, symbol, timeframe), exist_ok=True)
+            for column, values in zip(COLUMNS, columns):
+                values.tofile(self._path(exchange, symbol, timeframe, column) + ".tmp")
+
+            # from here the new columns are complete: an interrupted swap is finished by _recover()
+            open(self._merge_marker(exchange, symbol, timeframe), "w").close()
+            self._recover(exchange, symbol, timeframe)
+
+        return len(columns[0]) - length
+
+    def reset(self, exchange: str, symbol: str, timeframe: str):
+        with self._lock(exchange, symbol, timeframe):
+            for column in COLUMNS:
+                path = self._path(exchange, symbol, timeframe, column)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def get_warm_up_candles(self, client: typing.Union["BitmexClient", "BinanceFuturesClient"], contract: Contract,
+                            timeframe: str, count: int = DEFAULT_CAPACITY) -> CandleBuffer:
+        """
+        Replaces client.get_historical_candles() for the strategies' warm-up: only the candles missing since the last
+        stored one are requested, the rest is read from disk. Returns the last `count` candles, the last one being
+        the candle in progress when the exchange returns it.
+        """
+        exchange = client.platform
+        tf_ms = TF_EQUIV[timeframe] * 1000
+        last_ts = self.last_timestamp(exchange, contract.symbol, timeframe)
+
+        if last_ts is not None and time.time() * 1000 - last_ts > count * tf_ms:
+            # more candles missing than the warm-up needs: paging through all of them would freeze the interface
+            # (e.g. ~90 Bitmex pages for a month of 1m candles) for candles that wouldn't be loaded anyway
+            logger.info("%s %s %s: stored candles older than the %s needed, starting the candle store over",
+                        exchange, contract.symbol, timeframe, count)
+            self.reset(exchange, contract.symbol, timeframe)
+            last_ts = None
+
+        if last_ts is None:
+            fetched = client.get_historical_candles(contract, timeframe) or []
+        else:
+            fetched = self._fetch_since(client, contract, timeframe, last_ts + tf_ms)
+
+            # the rows are read back as consecutive candles: a candle missing between the stored ones and the new
+            # ones, or between two new ones (inside a page or where two pages join), would distort the indicators
+            if len(fetched) > 0 and (fetched[0].timestamp != last_ts + tf_ms or _contiguous_from(fetched, tf_ms) > 0):
+                logger.warning("%s %s %s: gap in the new candles, starting the candle store over",
+                               exchange, contract.symbol, timeframe)
+                self.reset(exchange, contract.symbol, timeframe)
+                fetched = client.get_historical_candles(contract, timeframe) or []
+
+        start = _contiguous_from(fetched, tf_ms)
+        if start > 0:
+            # a gap on the exchange side: only the candles after it are stored
+            logger.warning("%s %s %s: gap in the candles, the %s before it are not stored",
+                           exchange, contract.symbol, timeframe, start)
+            fetched = fetched[start:]
+
+        now = time.time() * 1000
+        closed = [c for c in fetched if c.timestamp + tf_ms <= now]
+        in_progress = [c for c in fetched if c.timestamp + tf_ms > now][-1:]
+
+        if len(closed) > 0:
+            written = self.append(exchange, contract.symbol, timeframe, Ohlcv.from_candles(closed))
+            logger.info("%s %s %s: %s new candles stored", exchange, contract.symbol, timeframe, written)
+
+        buffer = CandleBuffer(max(count, 2))
+        buffer.extend_ohlcv(self.load(exchange, contract.symbol, timeframe, count - len(in_progress)))
+        buffer.extend(in_progress)
+
+        return buffer
+
+    @staticmethod
+    def _fetch_since(client: typing.Union["BitmexClient", "BinanceFuturesClient"], contract: Contract,
+                     timeframe: str, start_time: int) -> list:
+        """ Pages forward from start_time until the candle in progress is reached, at most `count` candles after the
+        last stored one (see get_warm_up_candles) """
+        tf_ms = TF_EQUIV[timeframe] * 1000
+        fetched = []
+
+        while start_time <= time.time() * 1000:
+            page = client.get_historical_candles(contract, timeframe, start_time=start_time)
+            page = [c for c in page if c.timestamp >= start_time] if page is not None else []
+            if len(page) == 0:
+                break
+            fetched.extend(page)
+            start_time = page[-1].timestamp + tf_ms
+
+        return fetched
@@ -0,0 +1,284 @@
+import abc
+import asyncio
+import collections
+import logging
+import threading
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+import yarl
+
+from balance_cache import BalanceCache
+from decoding import loads
+from http_transport import RequestTiming
+from journal import MessageJournal
+from rate_limiter import ExchangeRateLimits
+from scheduler import Backoff, ScheduledTask, default_scheduler
+from subscriptions import SubscriptionManager
+from ui_events import UiEvents
+from price_registry import PriceRegistry
+from strategy_registry import StrategyRegistry
+
+"""
+Base of the asyncio clients (binance_futures_async.py, bitmex_async.py).
+
+A client runs one event loop in one thread: REST requests (aiohttp, keep-alive), the websocket connection and the
+order status polls all share it, whatever the number of symbols. The strategies run on a single worker thread
+fed in order by the event loop, so a strategy placing an order waits for it without blocking the market data.
+
+The public methods are the ones of the threaded clients and can be called from any thread except the event loop's.
+Each one has an *_async coroutine version for the code running inside the loop. The streams are subscribed through a
+SubscriptionManager with the stream limit of the exchange, and call_later() returns a ScheduledTask, like the
+threaded clients.
+
+Not a drop-in replacement for the interface yet: main.py and Root only take the threaded clients. The asyncio clients
+have a single market data connection (no WsPool), no local order books and no user data stream, so the strategies
+find their fills with the order status polls only (user_stream_connected stays False).
+"""
+
+logger = logging.getLogger()
+
+# strategies of a symbol, and the prints of a message for it: [(price, size, timestamp)]
+TradeBatch = typing.Tuple[typing.Sequence, typing.List[typing.Tuple[float, float, int]]]
+
+
+class AsyncExchangeClient(abc.ABC):
+    platform = ""
+    max_streams: typing.Optional[int] = None    # per connection
+    market_streams: typing.List[str] = []       # streams of all symbols, subscribed with the client
+
+    def __init__(self, base_url: str, wss_url: str, journal_path: typing.Optional[str] = None,
+                 connect: bool = True):
+        """
+        base_url, wss_url: can point to a local mock server
+        connect: False to only start the event loop, e.g. to call get_contracts() yourself
+        """
+        self._base_url = base_url
+        self._wss_url = wss_url
+
+        self.contracts = dict()
+        self.prices = PriceRegistry()
+        self.logs = []
+        self.reconnect = True
+        # no user data stream in the asyncio clients yet: the strategies poll the order status
+        self.user_stream_connected = False
+
+        # {b_index: strategy}, also indexed by symbol for the websocket dispatch
+        self.strategies = StrategyRegistry()
+        # log messages, watched prices and trade changes for the interface, see ui_events.py
+        self.ui_events = UiEvents()
+
+        self.journal: typing.Optional[MessageJournal] = MessageJournal(journal_path) if journal_path else None
+        self.limiter: ExchangeRateLimits = self._new_limiter()
+        # order status polls and balance refreshes, one thread shared by the clients
+        self.scheduler = default_scheduler()
+        self.timings: typing.Deque[RequestTiming] = collections.deque(maxlen=1000)
+
+        # in memory for the trade sizing, refreshed in the background (scheduler thread, blocking get_balances())
+        self.balance_cache = BalanceCache(self.get_balances)
+
+        self.loop = asyncio.new_event_loop()
+        self._session: typing.Optional[aiohttp.ClientSession] = None
+        self._ws: typing.Optional[aiohttp.ClientWebSocketResponse] = None
+        self._ws_task: typing.Optional[asyncio.Task] = None
+        self._reconnect_backoff = Backoff(initial=2.0, maximum=60.0)
+        # sent again on each reconnection, see subscriptions.py
+        self.subscriptions = SubscriptionManager(f"{self.platform.capitalize()} async ws", self._send_frame,
+                                                 self._subscription_frame, max_streams=self.max_streams,
+                                                 scheduler=self.scheduler)
+        self.subscriptions.subscribe(self.market_streams)
+
+        self._strategy_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{self.platform}-strategies")
+
+        self._thread = threading.Thread(target=self._run_loop, name=f"{self.platform}-loop", daemon=True)
+        self._thread.start()
+
+        self._run(self._open_session())
+
+        if connect:
+            self.contracts = self.get_contracts()
+            self.balance_cache.refresh()
+            self.balance_cache.start()
+            self.start_ws()
+
+            logger.info("%s async client successfully initialized", self.platform.capitalize())
+
+    @property
+    def balances(self) -> typing.Dict:
+        return self.balance_cache.balances
+
+    @abc.abstractmethod
+    def _new_limiter(self) -> ExchangeRateLimits:
+        pass
+
+    def _add_log(self, msg: str):
+        logger.info("%s", msg)
+        self.logs.append({"log": msg, "displayed": False})
+        self.ui_events.log(msg)
+
+    # Event loop
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def _run(self, coro: typing.Coroutine):
+        """ Runs a coroutine on the event loop and waits for its result, from another thread """
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("Blocking call from the event loop, use the *_async method instead")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _open_session(self):
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=10, keepalive_timeout=60),
+                                              timeout=aiohttp.ClientTimeout(sock_connect=3.05, total=10))
+
+    def call_later(self, delay: float, callback: typing.Callable[[], None]) -> ScheduledTask:
+        """ Runs callback on the strategy thread in `delay` seconds, the task can be cancelled """
+        return self.scheduler.call_later(delay, lambda: self._strategy_worker.submit(callback))
+
+    def close(self):
+        self.reconnect = False
+        self.balance_cache.stop()
+        self._run(self._close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self._strategy_worker.shutdown()
+
+        if self.journal is not None:
+            self.journal.close()
+
+    async def _close(self):
+        if self._ws is not None:
+            await self._ws.close()
+        if self._ws_task is not None:
+            self._ws_task.cancel()
+        await self._session.close()
+
+    # REST
+
+    @abc.abstractmethod
+    def _sign(self, method: str, endpoint: str, query: str) -> typing.Tuple[str, typing.Dict[str, str]]:
+        """ Returns the query string to send and the headers of a signed request """
+
+    @abc.abstractmethod
+    def _request_weight(self, method: str, endpoint: str, params: typing.Dict) -> typing.Tuple[float, bool, bool]:
+        """ (weight, priority, counted as an order) for the rate limiter """
+
+    @abc.abstractmethod
+    def _encode(self, params: typing.Dict) -> str:
+        pass
+
+    async def _request(self, method: str, endpoint: str, params: typing.Dict, signed: bool = False):
+        weight, priority, order = self._request_weight(method, endpoint, params)
+        await self.limiter.acquire_async(weight, priority=priority, order=order)
+
+        query = self._encode(params)
+        headers = dict()
+        if signed:
+            query, headers = self._sign(method, endpoint, query)
+
+        url = yarl.URL(self._base_url + endpoint + ("?" + query if query else ""), encoded=True)
+
+        start = time.perf_counter()
+        status = None
+        ttfb = 0.0
+        try:
+            async with self._session.request(method, url, headers=headers) as response:
+                status = response.status
+                ttfb = time.perf_counter() - start
+                body = await response.text()
+                self.limiter.update(response.headers, response.status)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error("Connection error while making %s request to %s: %s", method, endpoint, e)
+            return None
+        finally:
+            # the connect time isn't exposed by aiohttp, it is part of ttfb
+            self.timings.append(RequestTiming(method, endpoint, status, 0.0, ttfb, time.perf_counter() - start))
+
+        if status == 200:
+            return loads(body)
+        else:
+            logger.error("Error while making %s request to %s: %s (error code %s)", method, endpoint, body, status)
+            return None
+
+    # Websocket
+
+    def start_ws(self):
+        self.loop.call_soon_threadsafe(self._start_ws_task)
+
+    def _start_ws_task(self):
+        if self._ws_task is None or self._ws_task.done():
+            self._ws_task = self.loop.create_task(self._ws_loop())
+
+    async def _ws_loop(self):
+        while self.reconnect:
+            try:
+                async with self._session.ws_connect(self._wss_url, heartbeat=30, timeout=10) as ws:
+                    self._ws = ws
+                    logger.info("%s WebSocket connection opened.", self.platform.capitalize())
+                    self._reconnect_backoff.reset()
+                    await self._on_open()
+                    self.subscriptions.on_open()
+
+                    async for msg in ws:
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            if self.journal is not None:
+                                self.journal.record(msg.data)
+                            try:
+                                self._on_message(msg.data)
+                            except Exception as e:
+                                logger.error("%s error while processing a websocket message: %s",
+                                             self.platform.capitalize(), e)
+                        elif msg.type == aiohttp.WSMsgType.ERROR:
+                            logger.error("%s WebSocket connection error: %s", self.platform.capitalize(),
+                                         ws.exception())
+                            break
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                logger.error("%s WebSocket connection error: %s", self.platform.capitalize(), e)
+            finally:
+                self._ws = None
+                self.subscriptions.on_close()
+
+            logger.warning("%s WebSocket connection closed.", self.platform.capitalize())
+            if self.reconnect:
+                await asyncio.sleep(self._reconnect_backoff.next())
+
+    def _send_frame(self, frame: str):
+        """ Frames of the SubscriptionManager, from any thread: doesn't wait for the frame to be written """
+        ws = self._ws
+        if ws is None or ws.closed:
+            raise ConnectionError("websocket not connected")
+
+        if threading.current_thread() is self._thread:
+            self.loop.create_task(ws.send_str(frame))
+        else:
+            asyncio.run_coroutine_threadsafe(ws.send_str(frame), self.loop)
+
+    @staticmethod
+    @abc.abstractmethod
+    def _subscription_frame(method: str, streams: typing.List[str], request_id: int) -> str:
+        """ (method "subscribe" / "unsubscribe", streams, request id) -> text frame of the exchange """
+
+    async def _on_open(self):
+        pass
+
+    @abc.abstractmethod
+    def _on_message(self, msg: str):
+        pass
+
+    def _dispatch_trades(self, batches: typing.List[TradeBatch]):
+        """ Processed in order on the strategy thread """
+        if len(batches) > 0:
+            self._strategy_worker.submit(self._process_trades, batches)
+
+    @staticmethod
+    def _process_trades(batches: typing.List[TradeBatch]):
+        for strategies, prints in batches:
+            for strategy in strategies:
+                try:
+                    strategy.parse_trades_batch(prints)
+                except Exception as e:
+                    logger.error("Error in strategy %s %s: %s", strategy.strategy_name, strategy.contract.symbol, e)
@@ -1,6 +1,4 @@
-import pprint
 import time
-import requests
 import typing
 import json
 import logging
@@ -8,15 +6,22 @@ import hmac
 import hashlib
 from urllib.parse import urlencode
 
-import websocket
-
 import threading
 
-from keys import BINANCE_TESTNET_API_PUBLIC, BINANCE_TESTNET_API_SECRET
-
-
 from models import *
 from strategies import *
+from journal import MessageJournal, USER_STREAM
+from strategy_registry import StrategyRegistry
+from decoding import loads
+from http_transport import HttpTransport
+from rate_limiter import BinanceRateLimits
+from balance_cache import BalanceCache
+from metadata_cache import MetadataCache
+from order_book import BinanceOrderBook, SlippageEstimate
+from scheduler import Backoff, ScheduledTask, default_scheduler
+from ws_pool import WsPool, WsShard
+from ui_events import UiEvents
+from price_registry import PriceRegistry
 
 """ 
 apis send requests and receive data 
@@ -27,8 +32,16 @@ websockets subscribes to a data feed and gets data stream
 
 logger = logging.getLogger()
 
+MAX_STREAMS = 200   # per connection
+WS_CONNECTIONS = 2  # market data connections, the streams of a symbol are always on the same one
+
+if typing.TYPE_CHECKING:
+    import websocket
+
 binance_futures_url = "https://fapi.binance.com/fapi/v1/exchangeInfo"
 
+LISTEN_KEY_KEEP_ALIVE = 30 * 60     # seconds
+
 # TODO:
 """
 1- make_request() should have different class. OR something like;
@@ -43,69 +56,129 @@ binance_futures_url = "https://fapi.binance.com/fapi/v1/exchangeInfo"
 
 class BinanceFuturesClient:
 
-    def __init__(self, public_key: str, secret_key: str, testnet: bool) -> None:
+    def __init__(self, public_key: str, secret_key: str, testnet: bool,
+                 journal_path: typing.Optional[str] = None, ws_connections: int = WS_CONNECTIONS,
+                 connect: bool = True) -> None:
+        """ connect: False for an offline client (journal replay): no request, no websocket, the contracts of the
+        metadata cache only """
         if testnet:
             self._base_url = "https://testnet.binancefuture.com"
             self._wss_url = "wss://testnet.binancefuture.com/ws"
             self.connection_type = "Testnet"
         else:
             self._base_url = "https://fapi.binance.com"
-            self._wss_url = "wss://fsrteam.binance.com/ws"
+            self._wss_url = "wss://fstream.binance.com/ws"
             self.connection_type = "Real Account"
 
         self.platform = "binance"
+        self.offline = not connect
+        self.rate_limits: typing.List[typing.Dict] = []     # REQUEST_WEIGHT / ORDERS limits from exchangeInfo
         self._public_key = public_key
         self._secret_key = secret_key
         self.headers = {'X-MBX-APIKEY': self._public_key}
+        # keep-alive connections, orders don't wait for a new TLS handshake. Timings in self.transport.stats()
+        self.transport = HttpTransport(self._base_url)
+        # order status polls and periodic requests, one thread shared by the clients
+        self.scheduler = default_scheduler()
+        # documented limits until get_contracts() reads the ones of exchangeInfo
+        self.limiter = BinanceRateLimits(self.rate_limits)
+
+        # log messages, watched prices, trade and contract changes for the interface, see ui_events.py
+        self.ui_events = UiEvents()
+
+        # contracts of the last run, refreshed in the background: no request before the interface shows up
+        self.metadata_cache = MetadataCache(self.platform, testnet)
+        self.contracts = self._parse_contracts(self.metadata_cache.load())
+        if not self.offline:
+            if len(self.contracts) == 0:
+                self.contracts = self.get_contracts()
+            else:
+                self.scheduler.call_later(0, self._refresh_contracts)
+        # in memory for the trade sizing, refreshed in the background and by the account updates. The first
+        # request runs in the background too, no trade is sized until it is done
+        self.balance_cache = BalanceCache(self.get_balances)
+        if not self.offline:
+            self.balance_cache.start(first_delay=0)
+
+        self.prices = PriceRegistry()
+        # market data connections, each with its reader thread and its streams, sent again on each reconnection.
+        # The bid / ask of every symbol come from the all market bookTicker stream: one stream instead of one per
+        # contract
+        self.ws_pool = WsPool("Binance", self._wss_url, ws_connections, self._on_open, self._on_message,
+                              self._on_close, self._subscription_frame, max_streams=MAX_STREAMS)
+        self.ws_pool.shard_for(None).subscriptions.subscribe(["!bookTicker"])
+        self.reconnect = True
 
-        self.contracts = self.get_contracts()
-        self.balances = self.get_balances()
+        # order fills and balance changes pushed by the user data stream, the strategies only poll the order
+        # status as a fallback while it is disconnected
+        self.user_ws: typing.Optional[websocket.WebSocketApp] = None
+        self.user_stream_connected = False
+        self._listen_key: typing.Optional[str] = None
+        self._user_reconnect_backoff = Backoff(initial=2.0, maximum=60.0)
 
-        self.prices = dict()
-        self._ws_id = 1
-        self.ws: websocket.WebSocketApp
-        self.reconnect = True
+        # raw websocket frames are recorded only when a journal file is given, see journal.py
+        self.journal: typing.Optional[MessageJournal] = MessageJournal(journal_path) if journal_path else None
 
         self.logs = []
 
-        # TODO: Instead of pointing out like that, can we say 'all child classes of Strategy class'?
-        self.strategies: typing.Dict[int, typing.Union[TechnicalStrategy, BreakoutStrategy]] = dict()
+        # {b_index: strategy}, also indexed by symbol for the websocket dispatch
+        self.strategies = StrategyRegistry()
 
-        t = threading.Thread(target=self._start_ws)
-        t.start()
+        # {symbol: local L2 book}, see subscribe_order_book()
+        self.order_books: typing.Dict[str, BinanceOrderBook] = dict()
+
+        if not self.offline:
+            self.ws_pool.start()
+
+            t = threading.Thread(target=self._start_user_stream)
+            t.start()
 
         logger.info(f"Binance Futures Client {self.connection_type} successfully initialized")
 
+    @property
+    def balances(self) -> typing.Dict[str, Balance]:
+        return self.balance_cache.balances
+
     def _add_log(self, msg: str):
         logger.info("%s", msg)
         self.logs.append({"log": msg, "displayed": False})
+        self.ui_events.log(msg)
+
+    def call_later(self, delay: float, callback: typing.Callable[[], None]) -> ScheduledTask:
+        """ Used by the strategies for the order status polls, runs on the scheduler thread """
+        return self.scheduler.call_later(delay, callback)
 
     def _generate_signature(self, data: typing.Dict) -> str:
         # TODO: Inspect and explore this method.
         return hmac.new(self._secret_key.encode(), urlencode(data).encode(), hashlib.sha256).hexdigest()
 
-    def _make_requests(self, method: str, endpoint: str, parameters: typing.Dict):
-        if method == "GET":
-            try:
-                response = requests.get(self._base_url + endpoint, params=parameters, headers=self.headers)
-            except Exception as e:
-                logger.error("Connection error while making %s request to %s: %s", method, endpoint, e)
-                return None
-        elif method == "POST":
-            try:
-                response = requests.post(self._base_url + endpoint, params=parameters, headers=self.headers)
-            except Exception as e:
-                logger.error("Connection error while making %s request to %s: %s", method, endpoint, e)
-                return None
-        elif method == "DELETE":
-            try:
-                response = requests.delete(self._base_url + endpoint, params=parameters, headers=self.headers)
-            except Exception as e:
-                logger.error("Connection error while making %s request to %s: %s", method, endpoint, e)
-                return None
-        else:
-            raise ValueError("so far, only GET, POST and DELETE methods are coded.")
-        
+    def _make_requests(self, method: str, endpoint: str, parameters: typing.Dict, signed: bool = False):
+        if method not in ("GET", "POST", "PUT", "DELETE"):
+            raise ValueError("so far, only GET, POST, PUT and DELETE methods are coded.")
+
+        if self.offline:
+            logger.warning("Binance client offline, %s request to %s not sent", method, endpoint)
+            return None
+
+        # waits for the capacity instead of getting a 429, new orders and cancels first
+        order_endpoint = endpoint == "/fapi/v1/order"
+        self.limiter.acquire(self.limiter.request_weight(method, endpoint, parameters),
+                             priority=order_endpoint and method != "GET", order=order_endpoint and method == "POST")
+
+        if signed:
+            # after the rate limit wait: the request is refused once the timestamp is older than recvWindow (5 s)
+            parameters = dict(parameters)
+            parameters['timestamp'] = int(time.time() * 1000)
+            parameters['signature'] = self._generate_signature(parameters)
+
+        try:
+            response = self.transport.request(method, endpoint, parameters, self.headers)
+        except Exception as e:
+            logger.error("Connection error while making %s request to %s: %s", method, endpoint, e)
+            return None
+
+        self.limiter.update(response.headers, response.status_code)
+
         if response.status_code == 200:
             return response.json()
         else:
@@ -114,27 +187,57 @@ class BinanceFuturesClient:
             return None
 
     def get_contracts(self) -> typing.Dict[str, Contract]:
+        """ Also saved in the metadata cache for the next start """
         exchange_info = self._make_requests("GET", "/fapi/v1/exchangeInfo", dict())
+
+        if exchange_info is not None:
+            self.metadata_cache.save(exchange_info)
+
+        return self._parse_contracts(exchange_info)
+
+    def _parse_contracts(self, exchange_info: typing.Optional[typing.Dict]) -> typing.Dict[str, Contract]:
         contracts = dict()
 
         if exchange_info is not None:
+            if exchange_info['rateLimits'] != self.rate_limits:
+                self.rate_limits = exchange_info['rateLimits']
+                self.limiter = BinanceRateLimits(self.rate_limits)
             for contract_data in exchange_info['symbols']:
-                contracts[contract_data['symbol']] = Contract(self.platform, contract_data)
+                contracts[contract_data['symbol']] = Contract.from_binance(contract_data)
 
         return contracts
 
-    def get_historical_candles(self, contract: Contract, interval: str) -> typing.List[Candle]:
+    def _refresh_contracts(self):
+        contracts = self.get_contracts()
+        if len(contracts) > 0:
+            self.contracts = contracts  # swapped, the websocket thread may be iterating the old dict
+            self.ui_events.contracts_changed()
+
+
+    def get_historical_candles(self, contract: Contract, interval: str, start_time: typing.Optional[int] = None,
+                               end_time: typing.Optional[int] = None) -> typing.Optional[typing.List[Candle]]:
+        """
+        start_time: open time in ms of the first candle wanted, the last 1000 candles are returned if None
+        end_time: open time in ms of the last candle wanted (included)
+        Returns None if the request failed, an empty list if there is no candle in the period.
+        """
         candlesticks_endpoint = "/fapi/v1/klines"   # GET
         data = dict()
         data['symbol'] = contract.symbol
         data['interval'] = interval
         data['limit'] = 1000
+        if start_time is not None:
+            data['startTime'] = start_time
+        if end_time is not None:
+            data['endTime'] = end_time
 
         raw_candles = self._make_requests("GET", candlesticks_endpoint, parameters=data)
+        if raw_candles is None:
+            return None
+
         candles = []
-        if raw_candles is not None:
-            for candle in raw_candles:
-                candles.append(Candle(self.platform, candle, interval))
+        for candle in raw_candles:
+            candles.append(Candle.from_binance(candle, interval))
 
         return candles  # time, open, high, low, close, volume
 
@@ -145,26 +248,18 @@ class BinanceFuturesClient:
         order_book_request = self._make_requests("GET", order_book_endpoint, data)
 
         if order_book_request is not None:
-            if contract.symbol not in self.prices:
-                self.prices[contract.symbol] = {'bid': float(order_book_request['bidPrice']),
-                                                'ask': float(order_book_request['askPrice'])}
-            else:
-                self.prices[contract.symbol]['bid'] = float(order_book_request['bidPrice'])
-                self.prices[contract.symbol]['ask'] = float(order_book_request['askPrice'])
-
-            return self.prices[contract.symbol]
+            return self.prices.update(contract.symbol, float(order_book_request['bidPrice']),
+                                      float(order_book_request['askPrice']))
 
     def get_balances(self) -> typing.Dict[str, Balance]:
         endpoint = "/fapi/v1/account"
         data = dict()
-        data['timestamp'] = int(time.time() * 1000)
-        data['signature'] = self._generate_signature(data)
-        
+
         balances = dict()
-        account_data = self._make_requests("GET", endpoint, data)
+        account_data = self._make_requests("GET", endpoint, data, signed=True)
         if account_data is not None:
             for asset in account_data['assets']:
-                balances[asset['asset']] = Balance(self.platform, asset)
+                balances[asset['asset']] = Balance.from_binance(asset)
 
         return balances
 
@@ -196,13 +291,11 @@ class BinanceFuturesClient:
             data['price'] = round(round(price / contract.tick_size) * contract.tick_size, 8)
         if tif is not None:
             data['timeInForce'] = tif
-        data['timestamp'] = int(time.time() * 1000)
-        data['signature'] = self._generate_signature(data)
 
-        order_status = self._make_requests("POST", endpoint, data)
+        order_status = self._make_requests("POST", endpoint, data, signed=True)
 
         if order_status is not None:
-            order_status = OrderStatus(self.platform, order_status)
+            order_status = OrderStatus.from_binance(order_status)
 
         return order_status
 
@@ -223,13 +316,10 @@ class BinanceFuturesClient:
         data['orderID'] = order_id
         data['symbol'] = contract.symbol
 
-        data['timestamp'] = int(time.time() * 1000)
-        data['signature'] = self._generate_signature(data)
-
-        order_status = self._make_requests("DELETE", endpoint, data)
+        order_status = self._make_requests("DELETE", endpoint, data, signed=True)
 
         if order_status is not None:
-            order_status = OrderStatus(self.platform, order_status)
+            order_status = OrderStatus.from_binance(order_status)
 
         return order_status
 
@@ -240,15 +330,13 @@ class BinanceFuturesClient:
     def get_order_status(self, contract: Contract, order_id: int) -> OrderStatus:
         endpoint = "/fapi/v1/order"  # GET
         data = dict()
-        data['timestamp'] = int(time.time() * 1000)
         data['symbol'] = contract.symbol
         data['orderId'] = order_id
-        data['signature'] = self._generate_signature(data)
 
-        order_status = self._make_requests("GET", endpoint, data)
+        order_status = self._make_requests("GET", endpoint, data, signed=True)
 
         if order_status is not None:
-            order_status = OrderStatus(self.platform, order_status)
+            order_status = OrderStatus.from_binance(order_status)
 
         return order_status
 
@@ -259,102 +347,198 @@ class BinanceFuturesClient:
         """
         endpoint = "/fapi/v1/openOrders"    # GET
         data = dict()
-        data['timestamp'] = int(time.time() * 1000)
 
         if symbol is not None:
             data['symbol'] = symbol
 
-        data['signature'] = self._generate_signature(data)
-
-        open_orders = self._make_requests("GET", endpoint, data)
+        open_orders = self._make_requests("GET", endpoint, data, signed=True)
 
         return open_orders
 
-    def _start_ws(self):
-        self.ws = websocket.WebSocketApp(self._wss_url,
-                                         on_open=self._on_open, on_close=self._on_close,
-                                         on_error=self._on_error, on_message=self._on_message)
-        while True:
-            try:
-                if self.reconnect:
-                    self.ws.run_forever()
-                else:
-                    break
-            except Exception as e:
-                logger.error("Binance error in run_forever() method: %s", e)
-            time.sleep(2)
-    
-    def _on_open(self, ws):
-        logger.info("Binance WebSocket connection opened.")
+    # User data stream
+
+    def _new_listen_key(self) -> typing.Optional[str]:
+        """ The listenKey only needs the API key header, no signature """
+        response = self._make_requests("POST", "/fapi/v1/listenKey", dict())
+        if response is not None:
+            return response['listenKey']
+
+    def _keep_alive_listen_key(self):
+        """ A listenKey expires 60 minutes after its last keep alive """
+        if not self.reconnect:
+            self._keep_alive_task.cancel()
+        elif self._listen_key is not None:
+            self._make_requests("PUT", "/fapi/v1/listenKey", dict())
+
+    def _start_user_stream(self):
+        import websocket    # on the websocket threads, not with the connector
+        self._keep_alive_task = self.scheduler.call_every(LISTEN_KEY_KEEP_ALIVE, self._keep_alive_listen_key,
+                                                          jitter=0.05)
+
+        while self.reconnect:
+            self._listen_key = self._new_listen_key()
+            if self._listen_key is not None:
+                self.user_ws = websocket.WebSocketApp(self._wss_url + "/" + self._listen_key,
+                                                      on_open=self._on_user_open, on_close=self._on_user_close,
+                                                      on_error=self._on_user_error, on_message=self._on_user_message)
+                try:
+                    self.user_ws.run_forever()
+                except Exception as e:
+                    logger.error("Binance error in the user data stream run_forever() method: %s", e)
+            self.user_stream_connected = False
+            time.sleep(self._user_reconnect_backoff.next())
+
+    def _on_user_open(self, ws):
+        logger.info("Binance user data stream connection opened.")
+        self.user_stream_connected = True
+        self._user_reconnect_backoff.reset()
+
+    def _on_user_close(self, ws):
+        logger.warning("Binance user data stream connection closed.")
+        self.user_stream_connected = False
+
+    def _on_user_error(self, ws, msg: str):
+        logger.error("Binance user data stream connection error: %s", msg)
+
+    def _on_user_message(self, ws, msg: str):
+        """ ws is None for a journal replay """
+
+        if self.journal is not None:
+            self.journal.record(msg, USER_STREAM)
+
+        data = loads(msg)
+        event = data.get("e")
 
-        self.subscribe_channel(list(self.contracts.values()), "bookTicker")
-        # self.subscribe_channel(list(self.contracts.values()), "aggTrade")
+        if event == "ORDER_TRADE_UPDATE":
+            order_info = data['o']
+            order_status = OrderStatus.from_binance_update(order_info)
+            for strategy in self.strategies.for_symbol(order_info['s']):
+                strategy.on_order_update(order_status)
 
-    def _on_close(self, ws):
-        logger.warning("Binance WebSocket connection closed.")
+        elif event == "ACCOUNT_UPDATE":
+            for asset in data['a']['B']:
+                self.balance_cache.push(asset['a'], lambda balance, wb=float(asset['wb']):
+                                        setattr(balance, "wallet_balance", wb))
 
-    def _on_error(self, ws, msg: str):
-        logger.error("Binance WebSocket connection error: %s", msg)
+        elif event == "listenKeyExpired":
+            logger.warning("Binance listenKey expired, reconnecting the user data stream")
+            if ws is not None:
+                ws.close()  # _start_user_stream() gets a new one
 
-    def _on_message(self, ws, msg: str):
+    # Market data streams
 
-        data = json.loads(msg)
+    def _on_open(self, shard: WsShard):
+        # diffs were missed while disconnected, the books of the shard need new snapshots
+        for symbol in self.order_books:
+            if self.ws_pool.shard_for(symbol) is shard:
+                contract = self.contracts[symbol]
+                self.order_books[symbol].reset()
+                self.scheduler.call_later(0, lambda c=contract: self._sync_order_book(c))
+
+    def _on_close(self, shard: WsShard):
+        for symbol, book in self.order_books.items():
+            if self.ws_pool.shard_for(symbol) is shard:
+                book.reset()
+
+    def _on_message(self, shard: typing.Optional[WsShard], msg: str):
+        """ From the reader thread of a shard, shard is None for a journal replay """
+
+        if self.journal is not None:
+            self.journal.record(msg)
+
+        data = loads(msg)
+
+        if "id" in data and "e" not in data:     # answer to a SUBSCRIBE / UNSUBSCRIBE
+            if shard is not None:
+                shard.subscriptions.on_response(data['id'], data.get("error"))
+            return
 
         if "e" in data:
             symbol = data['s']
 
             if data['e'] == 'bookTicker':
 
-                if symbol not in self.prices:
-                    self.prices[symbol] = {'bid': float(data['b']),
-                                           'ask': float(data['a'])}
-                else:
-                    self.prices[symbol]['bid'] = float(data['b'])
-                    self.prices[symbol]['ask'] = float(data['a'])
+                prices = self.prices.update(symbol, float(data['b']), float(data['a']))
+                self.ui_events.price(symbol, prices['bid'], prices['ask'])
 
                 # PNL Calculation
-                try:
-                    for b_index, strategy in self.strategies.items():
-                        if strategy.contract.symbol == symbol:
-                            for trade in strategy.trades:
-                                if trade.status == "open" and trade.entry_price is not None:
-                                    if trade.side == "long":
-                                        trade.pnl = (self.prices[symbol]['bid'] - trade.entry_price) * trade.quantity
-                                    elif trade.side == "short":
-                                        trade.pnl = (trade.entry_price - self.prices[symbol]['ask']) * trade.quantity
-                except RuntimeError as e:
-                    logger.error("Error while looping through the Binance Strategies: %s", e)
+                for strategy in self.strategies.for_symbol(symbol):
+                    for trade in strategy.open_trades:
+                        if trade.status == "open" and trade.entry_price is not None:
+                            if trade.side == "long":
+                                trade.pnl = (prices['bid'] - trade.entry_price) * trade.quantity
+                            elif trade.side == "short":
+                                trade.pnl = (trade.entry_price - prices['ask']) * trade.quantity
+                            self.ui_events.trade(trade)
+
+            if data['e'] == "depthUpdate":
+                book = self.order_books.get(symbol)
+                if book is not None and not book.on_diff(data):
+                    contract = self.contracts[symbol]
+                    self.scheduler.call_later(0, lambda: self._sync_order_book(contract))
 
             if data['e'] == "aggTrade":
                 # print(f"we reached Binance on_message: aggTrade for {symbol} // binance_futures.py")
 
-                for key, strategy in self.strategies.items():
-                    if strategy.contract.symbol == symbol:
-                        res = strategy.parse_trades(float(data['p']), float(data['q']), data['T'])
-                        strategy.check_trade(res)
+                for strategy in self.strategies.for_symbol(symbol):
+                    res = strategy.parse_trades(float(data['p']), float(data['q']), data['T'])
+                    strategy.check_trade(res)
 
     def subscribe_channel(self, contracts: typing.List[Contract], channel: str):
-        data = dict()
-        data['method'] = "SUBSCRIBE"
-        data['params'] = []
-        # print(f"we reached binance subscribe_channel for {contracts[0].symbol.lower()} as {channel} // binance_futures.py")
-
-        for contract in contracts:
-            data['params'].append(contract.symbol.lower() + "@" + channel)
-        data['id'] = self._ws_id
+        """ Streams already subscribed are skipped, the others sent in as few frames as the limits allow """
+        for shard, streams in self._streams_by_shard(contracts, channel).items():
+            shard.subscriptions.subscribe(streams)
 
-        try:
-            self.ws.send(json.dumps(data))
-        except Exception as e:
-            logger.error("Websocket error while subscribing to %s %s updates: %s",
-                         len(contracts), channel, e)
+    def unsubscribe_channel(self, contracts: typing.List[Contract], channel: str):
+        for shard, streams in self._streams_by_shard(contracts, channel).items():
+            shard.subscriptions.unsubscribe(streams)
 
-        self._ws_id += 1
-        return
+    def _streams_by_shard(self, contracts: typing.List[Contract],
+                          channel: str) -> typing.Dict[WsShard, typing.List[str]]:
+        streams = dict()
+        for contract in contracts:
+            shard = self.ws_pool.shard_for(contract.symbol)
+            streams.setdefault(shard, []).append(contract.symbol.lower() + "@" + channel)
+        return streams
+
+    @staticmethod
+    def _subscription_frame(method: str, streams: typing.List[str], request_id: int) -> str:
+        return json.dumps({"method": method.upper(), "params": streams, "id": request_id})
+
+    def subscribe_order_book(self, contract: Contract) -> BinanceOrderBook:
+        """ Local order book of the symbol, from the depth diffs on top of a REST snapshot """
+        if contract.symbol not in self.order_books:
+            self.order_books[contract.symbol] = BinanceOrderBook(contract.symbol)
+            self.subscribe_channel([contract], "depth@100ms")
+            self.scheduler.call_later(0, lambda: self._sync_order_book(contract))
+
+        return self.order_books[contract.symbol]
+
+    def _sync_order_book(self, contract: Contract):
+        book = self.order_books.get(contract.symbol)
+        if book is None or book.synced:
+            return
+
+        snapshot = self._make_requests("GET", "/fapi/v1/depth", {'symbol': contract.symbol, 'limit': 1000})
+        if snapshot is None or not book.apply_snapshot(snapshot):
+            self.scheduler.call_later(1.0, lambda: self._sync_order_book(contract))
+
+    def estimate_slippage(self, contract: Contract, side: str, quantity: float) -> typing.Optional[SlippageEstimate]:
+        """ None if the order book of the symbol isn't subscribed or synced """
+        book = self.order_books.get(contract.symbol)
+        if book is not None:
+            return book.estimate_slippage(side, quantity)
 
     def get_trade_size(self, contract: Contract, price: float, balance_pct: float):
+        balances = self.balance_cache.get()
+        if balances is None:
+            logger.warning("Binance balances not updated for %.0f seconds, no trade size", self.balance_cache.age)
+            return None
+        return self._trade_size(contract, price, balance_pct, balances)
+
+    @staticmethod
+    def _trade_size(contract: Contract, price: float, balance_pct: float, balance: typing.Dict[str, Balance]):
 
-        balance = self.get_balances()
         if balance is not None:
             if 'USDT' in balance:
                 balance = balance['USDT'].wallet_balance
@@ -372,6 +556,9 @@ class BinanceFuturesClient:
 
 
 if __name__ == "__main__":
+    import pprint
+    from keys import BINANCE_TESTNET_API_PUBLIC, BINANCE_TESTNET_API_SECRET
+
     binance = BinanceFuturesClient(BINANCE_TESTNET_API_PUBLIC,
                                    BINANCE_TESTNET_API_SECRET, testnet=True)
 
@@ -0,0 +1,222 @@
+import hashlib
+import hmac
+import logging
+import time
+import typing
+from urllib.parse import urlencode
+
+from connectors.async_base import AsyncExchangeClient
+from connectors.binance_futures import BinanceFuturesClient, MAX_STREAMS
+from decoding import loads
+from models import Balance, Candle, Contract, OrderStatus
+from rate_limiter import BinanceRateLimits
+
+"""
+asyncio version of BinanceFuturesClient, see async_base.py
+"""
+
+logger = logging.getLogger()
+
+
+class AsyncBinanceFuturesClient(AsyncExchangeClient):
+    platform = "binance"
+    max_streams = MAX_STREAMS
+    # the bid / ask of every symbol: one stream instead of one per contract
+    market_streams = ["!bookTicker"]
+
+    def __init__(self, public_key: str, secret_key: str, testnet: bool, journal_path: typing.Optional[str] = None,
+                 base_url: typing.Optional[str] = None, wss_url: typing.Optional[str] = None,
+                 connect: bool = True):
+        if testnet:
+            self.connection_type = "Testnet"
+            default_base_url = "https://testnet.binancefuture.com"
+            default_wss_url = "wss://stream.binancefuture.com/ws"
+        else:
+            self.connection_type = "Real Account"
+            default_base_url = "https://fapi.binance.com"
+            default_wss_url = "wss://fstream.binance.com/ws"
+
+        self._public_key = public_key
+        self._secret_key = secret_key
+        self.rate_limits: typing.List[typing.Dict] = []
+
+        super().__init__(base_url or default_base_url, wss_url or default_wss_url, journal_path, connect)
+
+    def _new_limiter(self) -> BinanceRateLimits:
+        return BinanceRateLimits(self.rate_limits)
+
+    def _encode(self, params: typing.Dict) -> str:
+        return urlencode(params)
+
+    def _sign(self, method: str, endpoint: str, query: str) -> typing.Tuple[str, typing.Dict[str, str]]:
+        query = (query + "&" if query else "") + "timestamp=" + str(int(time.time() * 1000))
+        signature = hmac.new(self._secret_key.encode(), query.encode(), hashlib.sha256).hexdigest()
+        return query + "&signature=" + signature, {'X-MBX-APIKEY': self._public_key}
+
+    def _request_weight(self, method: str, endpoint: str, params: typing.Dict) -> typing.Tuple[float, bool, bool]:
+        order_endpoint = endpoint == "/fapi/v1/order"
+        return (self.limiter.request_weight(method, endpoint, params), order_endpoint and method != "GET",
+                order_endpoint and method == "POST")
+
+    # REST, coroutines
+
+    async def get_contracts_async(self) -> typing.Dict[str, Contract]:
+        exchange_info = await self._request("GET", "/fapi/v1/exchangeInfo", dict())
+        contracts = dict()
+
+        if exchange_info is not None:
+            self.rate_limits = exchange_info['rateLimits']
+            self.limiter = BinanceRateLimits(self.rate_limits)
+            for contract_data in exchange_info['symbols']:
+                contracts[contract_data['symbol']] = Contract.from_binance(contract_data)
+
+        return contracts
+
+    async def get_historical_candles_async(self, contract: Contract, interval: str,
+                                           start_time: typing.Optional[int] = None,
+                                           end_time: typing.Optional[int] = None)\
+            -> typing.Optional[typing.List[Candle]]:
+        data = {'symbol': contract.symbol, 'interval': interval, 'limit': 1000}
+        if start_time is not None:
+            data['startTime'] = start_time
+        if end_time is not None:
+            data['endTime'] = end_time
+
+        raw_candles = await self._request("GET", "/fapi/v1/klines", data)
+        if raw_candles is None:
+            return None
+
+        return [Candle.from_binance(candle, interval) for candle in raw_candles]
+
+    async def get_bid_ask_async(self, contract: Contract) -> typing.Dict[str, float]:
+        order_book = await self._request("GET", "/fapi/v1/ticker/bookTicker", {'symbol': contract.symbol})
+
+        if order_book is not None:
+            return self.prices.update(contract.symbol, float(order_book['bidPrice']), float(order_book['askPrice']))
+
+    async def get_balances_async(self) -> typing.Dict[str, Balance]:
+        account_data = await self._request("GET", "/fapi/v1/account", dict(), signed=True)
+        balances = dict()
+
+        if account_data is not None:
+            for asset in account_data['assets']:
+                balances[asset['asset']] = Balance.from_binance(asset)
+
+        return balances
+
+    async def place_order_async(self, contract: Contract, side: str, quantity: float, order_type: str, price=None,
+                                tif=None) -> typing.Optional[OrderStatus]:
+        data = dict()
+        data['symbol'] = contract.symbol
+        data['side'] = side.upper()
+        data['quantity'] = round(round(quantity / contract.lot_size) * contract.lot_size, 8)
+        data['type'] = order_type.upper()
+        if price is not None:
+            data['price'] = round(round(price / contract.tick_size) * contract.tick_size, 8)
+        if tif is not None:
+            data['timeInForce'] = tif
+
+        order_status = await self._request("POST", "/fapi/v1/order", data, signed=True)
+
+        if order_status is not None:
+            order_status = OrderStatus.from_binance(order_status)
+
+        return order_status
+
+    async def cancel_order_async(self, contract: Contract, order_id: int) -> typing.Optional[OrderStatus]:
+        order_status = await self._request("DELETE", "/fapi/v1/order",
+                                           {'symbol': contract.symbol, 'orderId': order_id}, signed=True)
+
+        if order_status is not None:
+            order_status = OrderStatus.from_binance(order_status)
+
+        return order_status
+
+    async def get_order_status_async(self, contract: Contract, order_id: int) -> typing.Optional[OrderStatus]:
+        order_status = await self._request("GET", "/fapi/v1/order",
+                                           {'symbol': contract.symbol, 'orderId': order_id}, signed=True)
+
+        if order_status is not None:
+            order_status = OrderStatus.from_binance(order_status)
+
+        return order_status
+
+    async def get_trade_size_async(self, contract: Contract, price: float, balance_pct: float):
+        return self.get_trade_size(contract, price, balance_pct)
+
+    # REST, blocking versions with the threaded client's names
+
+    def get_contracts(self) -> typing.Dict[str, Contract]:
+        return self._run(self.get_contracts_async())
+
+    def get_historical_candles(self, contract: Contract, interval: str, start_time: typing.Optional[int] = None,
+                               end_time: typing.Optional[int] = None) -> typing.Optional[typing.List[Candle]]:
+        return self._run(self.get_historical_candles_async(contract, interval, start_time, end_time))
+
+    def get_bid_ask(self, contract: Contract) -> typing.Dict[str, float]:
+        return self._run(self.get_bid_ask_async(contract))
+
+    def get_balances(self) -> typing.Dict[str, Balance]:
+        return self._run(self.get_balances_async())
+
+    def place_order(self, contract: Contract, side: str, quantity: float, order_type: str, price=None, tif=None)\
+            -> typing.Optional[OrderStatus]:
+        return self._run(self.place_order_async(contract, side, quantity, order_type, price, tif))
+
+    def cancel_order(self, contract: Contract, order_id: int) -> typing.Optional[OrderStatus]:
+        return self._run(self.cancel_order_async(contract, order_id))
+
+    def get_order_status(self, contract: Contract, order_id: int) -> typing.Optional[OrderStatus]:
+        return self._run(self.get_order_status_async(contract, order_id))
+
+    def get_trade_size(self, contract: Contract, price: float, balance_pct: float):
+        """ Memory read, no request: callable from the event loop too """
+        balances = self.balance_cache.get()
+        if balances is None:
+            logger.warning("%s balances not updated for %.0f seconds, no trade size", self.platform.capitalize(),
+                           self.balance_cache.age)
+            return None
+        return BinanceFuturesClient._trade_size(contract, price, balance_pct, balances)
+
+    # Websocket
+
+    _subscription_frame = staticmethod(BinanceFuturesClient._subscription_frame)
+
+    def subscribe_channel(self, contracts: typing.List[Contract], channel: str):
+        """ Streams already subscribed are skipped, the others sent in as few frames as the limits allow """
+        self.subscriptions.subscribe(contract.symbol.lower() + "@" + channel for contract in contracts)
+
+    def unsubscribe_channel(self, contracts: typing.List[Contract], channel: str):
+        self.subscriptions.unsubscribe(contract.symbol.lower() + "@" + channel for contract in contracts)
+
+    def _on_message(self, msg: str):
+        data = loads(msg)
+
+        if "id" in data and "e" not in data:     # answer to a SUBSCRIBE / UNSUBSCRIBE
+            self.subscriptions.on_response(data['id'], data.get("error"))
+            return
+
+        if "e" not in data:
+            return
+
+        symbol = data['s']
+
+        if data['e'] == "bookTicker":
+            bid, ask = float(data['b']), float(data['a'])
+            self.prices.update(symbol, bid, ask)
+            self.ui_events.price(symbol, bid, ask)
+
+            # PNL Calculation
+            for strategy in self.strategies.for_symbol(symbol):
+                for trade in strategy.open_trades:
+                    if trade.status == "open" and trade.entry_price is not None:
+                        if trade.side == "long":
+                            trade.pnl = (bid - trade.entry_price) * trade.quantity
+                        elif trade.side == "short":
+                            trade.pnl = (trade.entry_price - ask) * trade.quantity
+                        self.ui_events.trade(trade)
+
+        elif data['e'] == "aggTrade":
+            strategies = self.strategies.for_symbol(symbol)
+            if len(strategies) > 0:
+                self._dispatch_trades([(strategies, [(float(data['p']), float(data['q']), data['T'])])])
@@ -1,20 +1,27 @@
+import datetime
 import hashlib
 import hmac
-import pprint
 from urllib.parse import urlencode
 import time
-import requests
 import json
 import typing
 import logging
-from keys import *
-import threading
 
 
 from models import *
-import websocket
 from strategies import *
-import dateutil.parser
+from journal import MessageJournal
+from strategy_registry import StrategyRegistry
+from decoding import loads, bitmex_timestamp_ms
+from http_transport import HttpTransport
+from rate_limiter import BitmexRateLimits
+from balance_cache import BalanceCache
+from metadata_cache import MetadataCache
+from order_book import BitmexOrderBook, SlippageEstimate
+from scheduler import ScheduledTask, default_scheduler
+from ws_pool import WsPool, WsShard
+from ui_events import UiEvents
+from price_registry import PriceRegistry
 
 logger = logging.getLogger()
 
@@ -32,9 +39,15 @@ def _is_tradable(symbol: str, ends_with="USDT") -> bool:
            and symbol.endswith(ends_with)
 
 
+WS_CONNECTIONS = 2  # market data connections, the topics of a symbol are always on the same one
+
+
 class BitmexClient:
 
-    def __init__(self, public_key: str, secret_key: str, testnet: bool):
+    def __init__(self, public_key: str, secret_key: str, testnet: bool, journal_path: typing.Optional[str] = None,
+                 ws_connections: int = WS_CONNECTIONS, connect: bool = True):
+        """ connect: False for an offline client (journal replay): no request, no websocket, the contracts of the
+        metadata cache only """
         self._public_key = public_key
         self._secret_key = secret_key
         if testnet:
@@ -47,28 +60,69 @@ class BitmexClient:
             self.connection_type = "Real Account"
 
         self.platform = "bitmex"
-
-        self.contracts = self.get_contracts()
-        self.balances = self.get_balances()
-
-        self.prices = dict()
-        self._ws_id = 1
-        self.ws: websocket.WebSocketApp
+        self.offline = not connect
+        # keep-alive connections, orders don't wait for a new TLS handshake. Timings in self.transport.stats()
+        self.transport = HttpTransport(self._base_url)
+        self.limiter = BitmexRateLimits()
+        # order status polls and periodic requests, one thread shared by the clients
+        self.scheduler = default_scheduler()
+
+        # log messages, watched prices, trade and contract changes for the interface, see ui_events.py
+        self.ui_events = UiEvents()
+
+        # contracts of the last run, refreshed in the background: no request before the interface shows up
+        self.metadata_cache = MetadataCache(self.platform, testnet)
+        self.contracts = self._parse_contracts(self.metadata_cache.load())
+        if not self.offline:
+            if len(self.contracts) == 0:
+                self.contracts = self.get_contracts()
+            else:
+                self.scheduler.call_later(0, self._refresh_contracts)
+        # in memory for the trade sizing, refreshed in the background and by the account updates. The first
+        # request runs in the background too, no trade is sized until it is done
+        self.balance_cache = BalanceCache(self.get_balances)
+        if not self.offline:
+            self.balance_cache.start(first_delay=0)
+
+        self.prices = PriceRegistry()
+        # connections, each with its reader thread and its topics, sent again on each reconnection. The topics of
+        # all symbols are on the first one, with the private topics: it is authenticated before they are replayed
+        self.ws_pool = WsPool("Bitmex", self._wss_url, ws_connections, self._on_open, self._on_message,
+                              self._on_close, self._subscription_frame)
+        self.ws_pool.shard_for(None).subscriptions.subscribe(["instrument", "execution", "order", "margin"])
         self.reconnect = True
+        # order fills and margin changes are pushed on the first connection, the strategies only poll the order
+        # status as a fallback while it is disconnected
+        self.user_stream_connected = False
+
+        # raw websocket frames are recorded only when a journal file is given, see journal.py
+        self.journal: typing.Optional[MessageJournal] = MessageJournal(journal_path) if journal_path else None
 
         self.logs = []
 
-        # TODO: Instead of pointing out like that, can we say 'all child classes of Strategy class'?
-        self.strategies: typing.Dict[int, typing.Union[TechnicalStrategy, BreakoutStrategy]] = dict()
+        # {b_index: strategy}, also indexed by symbol for the websocket dispatch
+        self.strategies = StrategyRegistry()
+
+        # {symbol: local L2 book}, see subscribe_order_book()
+        self.order_books: typing.Dict[str, BitmexOrderBook] = dict()
 
-        t = threading.Thread(target=self._start_ws)
-        t.start()
+        if not self.offline:
+            self.ws_pool.start()
 
         logger.info("Bitmex Client successfully initialized")
 
+    @property
+    def balances(self) -> typing.Dict[str, Balance]:
+        return self.balance_cache.balances
+
     def _add_log(self, msg: str):
         logger.info("%s", msg)
         self.logs.append({"log": msg, "displayed": False})
+        self.ui_events.log(msg)
+
+    def call_later(self, delay: float, callback: typing.Callable[[], None]) -> ScheduledTask:
+        """ Used by the strategies for the order status polls, runs on the scheduler thread """
+        return self.scheduler.call_later(delay, callback)
 
     def _generate_signature(self, method: str, endpoint: str, expires: str, data: typing.Dict) -> str:
 
@@ -81,39 +135,61 @@ class BitmexClient:
 
     def _make_request(self, method: str, endpoint: str, params: typing.Dict):
 
+        if self.offline:
+            logger.warning("Bitmex client offline, %s request to %s not sent", method, endpoint)
+            return None
+
+        # before the signature, which expires 5 seconds later
+        order = endpoint == "/order" and method != "GET"
+        self.limiter.acquire(1, priority=order, order=order)
+
         api_expires = str(int(time.time() + 5))
         header = {"api-expires": api_expires, "api-key": self._public_key,
                   "api-signature": self._generate_signature(method=method, endpoint=endpoint,
                                                             expires=api_expires, data=params)}
 
+        if method not in ("GET", "POST", "DELETE"):
+            raise ValueError("so far, only GET, POST and DELETE methods are coded.")
+
         try:
-            if method == "GET":
-                response = requests.get(url=self._base_url + endpoint, params=params, headers=header)
-            elif method == "POST":
-                response = requests.post(url=self._base_url + endpoint, params=params, headers=header)
-            elif method == "DELETE":
-                response = requests.delete(url=self._base_url + endpoint, params=params, headers=header)
-            else:
-                raise ValueError("so far, only GET, POST and DELETE methods are coded.")
+            response = self.transport.request(method, endpoint, params, header)
         except Exception as e:
             logger.error("Connection error while making %s request to %s: %s", method, endpoint, e)
             return None
 
+        self.limiter.update(response.headers, response.status_code)
+
         if response.status_code == 200:
             return response.json()
         else:
-            print(response.status_code)
-            pprint.pprint(response.json())
+            logger.error("Error while making %s request to %s: %s (error code %s)",
+                         method, endpoint, response.json(), response.status_code)
+            return None
 
     def get_contracts(self) -> typing.Dict[str, Contract]:
+        """ Also saved in the metadata cache for the next start """
         endpoint = "/instrument/active"
-        contracts = dict()
         instruments = self._make_request("GET", endpoint, dict())
+
+        if instruments is not None:
+            self.metadata_cache.save(instruments)
+
+        return self._parse_contracts(instruments)
+
+    def _refresh_contracts(self):
+        contracts = self.get_contracts()
+        if len(contracts) > 0:
+            self.contracts = contracts  # swapped, the websocket thread may be iterating the old dict
+            self.ui_events.contracts_changed()
+
+    @staticmethod
+    def _parse_contracts(instruments: typing.Optional[typing.List[typing.Dict]]) -> typing.Dict[str, Contract]:
+        contracts = dict()
         if instruments is not None:
             for s in instruments:
                 symbol = s['symbol']
                 if _is_tradable(symbol, "") and not symbol.startswith("."):
-                    contracts[s['symbol']] = Contract(self.platform, s)
+                    contracts[s['symbol']] = Contract.from_bitmex(s)
 
         return contracts
 
@@ -127,29 +203,48 @@ class BitmexClient:
         balances = dict()
         if margin_data is not None:
             for each in margin_data:
-                balances[each['currency']] = Balance(self.platform, each)
+                balances[each['currency']] = Balance.from_bitmex(each)
 
         return balances
 
-    def get_historical_candles(self, contract: Contract, timeframe: str) -> typing.List[Candle]:
+    def get_historical_candles(self, contract: Contract, timeframe: str, start_time: typing.Optional[int] = None,
+                               end_time: typing.Optional[int] = None) -> typing.Optional[typing.List[Candle]]:
+        """
+        start_time: open time in ms of the first candle wanted, the last 500 candles are returned if None
+        end_time: open time in ms of the last candle wanted (included)
+        Returns None if the request failed, an empty list if there is no candle in the period.
+        """
         endpoint = "/trade/bucketed"
         data = dict()
         data['symbol'] = contract.symbol
         data['partial'] = True
         data['binSize'] = timeframe
         data['count'] = 500
-        data['reverse'] = True
-        
+        data['reverse'] = start_time is None
+        # Bitmex buckets are timestamped with the END of the period
+        if start_time is not None:
+            data['startTime'] = self._bucket_end_time(start_time, timeframe)
+        if end_time is not None:
+            data['endTime'] = self._bucket_end_time(end_time, timeframe)
+
         raw_candles = self._make_request(method="GET", endpoint=endpoint, params=data)
-        
+        if raw_candles is None:
+            return None
+
         candles = []
-        
-        if raw_candles is not None:
-            for each in reversed(raw_candles):
-                candles.append(Candle(self.platform, each, timeframe))
+
+        if data['reverse']:
+            raw_candles = reversed(raw_candles)
+        for each in raw_candles:
+            candles.append(Candle.from_bitmex(each, timeframe))
 
         return candles
 
+    @staticmethod
+    def _bucket_end_time(open_time: int, timeframe: str) -> str:
+        bucket_end = open_time / 1000 + BITMEX_TF_MINUTES[timeframe] * 60
+        return datetime.datetime.fromtimestamp(bucket_end, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
     def place_order(self, contract: Contract, side: str, quantity: float,
                     order_type: str, price=None, tif=None) -> OrderStatus:
         """
@@ -188,7 +283,7 @@ class BitmexClient:
         order_info = self._make_request(method=method, endpoint=endpoint, params=data)
         
         if order_info is not None:
-            order_info = OrderStatus(self.platform, order_info)
+            order_info = OrderStatus.from_bitmex(order_info)
 
         return order_info
         
@@ -204,7 +299,7 @@ class BitmexClient:
         if order_status is not None:
             for order in order_status:
                 if order['orderID'] == order_id:
-                    order_status = OrderStatus(self.platform, order)
+                    order_status = OrderStatus.from_bitmex(order)
                     return order_status
 
     def cancel_order(self, order_id: str) -> OrderStatus:
@@ -216,7 +311,7 @@ class BitmexClient:
         order_info = self._make_request(method=method, endpoint=endpoint, params=data)
 
         if order_info is not None:
-            order_info = OrderStatus(self.platform, order_info[0])
+            order_info = OrderStatus.from_bitmex(order_info[0])
 
         return order_info
 
@@ -239,35 +334,45 @@ class BitmexClient:
         else:
             return None
 
-    def _start_ws(self):
-        self.ws = websocket.WebSocketApp(self._wss_url,
-                                         on_open=self._on_open, on_close=self._on_close,
-                                         on_error=self._on_error, on_message=self._on_message)
-        while True:
-            try:
-                if self.reconnect:
-                    self.ws.run_forever()
-                else:
-                    break
-            except Exception as e:
-                logger.error("Bitmex error in run_forever() method: %s", e)
-            time.sleep(2)
+    def _on_open(self, shard: WsShard):
+        if shard.index == 0:
+            self._authenticate_ws(shard)
+
+    def _authenticate_ws(self, shard: WsShard):
+        expires = int(time.time() + 5)
+        signature = hmac.new(self._secret_key.encode(), f"GET/realtime{expires}".encode(), hashlib.sha256).hexdigest()
 
-    def _on_open(self, ws):
-        logger.info("Bitmex WebSocket connection opened.")
+        try:
+            shard.send(json.dumps({"op": "authKeyExpires", "args": [self._public_key, expires, signature]}))
+        except Exception as e:
+            logger.error("Bitmex Websocket error while authenticating: %s", e)
 
-        self.subscribe_channel("instrument")
-        self.subscribe_channel("trade")
+    def _on_close(self, shard: WsShard):
+        # the order books get a new partial with their subscription
+        for symbol, book in self.order_books.items():
+            if self.ws_pool.shard_for(symbol) is shard:
+                book.reset()
+        if shard.index == 0:
+            self.user_stream_connected = False
 
-    def _on_close(self, ws):
-        logger.warning("Bitmex WebSocket connection closed.")
+    def _on_message(self, shard: typing.Optional[WsShard], msg: str):
+        """ From the reader thread of a shard, shard is None for a journal replay """
 
-    def _on_error(self, ws, msg: str):
-        logger.error("Bitmex WebSocket connection error: %s", msg)
+        if self.journal is not None:
+            self.journal.record(msg)
 
-    def _on_message(self, ws, msg: str):
+        data = loads(msg)
 
-        data = json.loads(msg)
+        if data.get("request", {}).get("op") == "authKeyExpires":
+            self.user_stream_connected = data.get("success", False)
+            if not self.user_stream_connected:
+                logger.error("Bitmex WebSocket authentication failed: %s", data.get("error"))
+            return
+
+        if "error" in data and data.get("request", {}).get("op") in ("subscribe", "unsubscribe"):
+            if shard is not None:
+                shard.subscriptions.reject(data['request']['op'], data['request'].get("args", []), data['error'])
+            return
 
         if "table" in data:
             if data['table'] == 'instrument':
@@ -277,76 +382,108 @@ class BitmexClient:
                     if symbol.startswith("."):
                         continue
 
-                    if symbol not in self.prices:
-                        self.prices[symbol] = {'bid': None, 'ask': None}
-
-                    if 'bidPrice' in d:
-                        self.prices[symbol]['bid'] = d['bidPrice']
-                    if 'askPrice' in d:
-                        self.prices[symbol]['ask'] = d['askPrice']
+                    prices = self.prices.update(symbol, d.get('bidPrice'), d.get('askPrice'))
+                    self.ui_events.price(symbol, prices['bid'], prices['ask'])
 
                     # PNL Calculation
-                    try:
-                        for b_index, strategy in self.strategies.items():
-                            if strategy.contract.symbol == symbol:
-                                for trade in strategy.trades:
-                                    if trade.status == "open" and trade.entry_price is not None:
-                                        if trade.side == "long":
-                                            price = self.prices[symbol]['bid']
-                                        else:
-                                            price = self.prices[symbol]['ask']
-                                        multiplier = trade.contract.multiplier
-                                        if trade.contract.inverse:
-                                            if trade.side == "long":
-                                                trade.pnl = (1 / trade.entry_price - 1 / price) *\
-                                                            trade.quantity * multiplier
-                                            elif trade.side == "short":
-                                                trade.pnl = (1 / price - 1 / trade.entry_price) *\
-                                                            trade.quantity * multiplier
-
-                                        else:
-                                            if trade.side == "long":
-                                                trade.pnl = (price - trade.entry_price) * trade.quantity * multiplier
-                                            elif trade.side == "short":
-                                                trade.pnl = (trade.entry_price - price) * trade.quantity * multiplier
-                    except RuntimeError as e:
-                        logger.error("Error while ooping through the Bitmex Strategies: %s", e)
+                    for strategy in self.strategies.for_symbol(symbol):
+                        for trade in strategy.open_trades:
+                            if trade.status == "open" and trade.entry_price is not None:
+                                if trade.side == "long":
+                                    price = prices['bid']
+                                else:
+                                    price = prices['ask']
+                                multiplier = trade.contract.multiplier
+                                if trade.contract.inverse:
+                                    if trade.side == "long":
+                                        trade.pnl = (1 / trade.entry_price - 1 / price) *\
+                                                    trade.quantity * multiplier
+                                    elif trade.side == "short":
+                                        trade.pnl = (1 / price - 1 / trade.entry_price) *\
+                                                    trade.quantity * multiplier
+
+                                else:
+                                    if trade.side == "long":
+                                        trade.pnl = (price - trade.entry_price) * trade.quantity * multiplier
+                                    elif trade.side == "short":
+                                        trade.pnl = (trade.entry_price - price) * trade.quantity * multiplier
+                                self.ui_events.trade(trade)
 
             if data['table'] == 'trade':
+                # the prints of a message go to the strategies of their symbol in one batch
+                prints_by_symbol = dict()
                 for d in data['data']:
 
                     symbol = d['symbol']
-                    if symbol.startswith("."):
+                    if symbol.startswith(".") or len(self.strategies.for_symbol(symbol)) == 0:
                         continue
 
-                    ts = int(dateutil.parser.isoparse(d['timestamp']).timestamp() * 1000)
+                    prints_by_symbol.setdefault(symbol, []).append(
+                        (float(d['price']), float(d['size']), bitmex_timestamp_ms(d['timestamp'])))
 
-                    for key, strategy in self.strategies.items():
+                for symbol, prints in prints_by_symbol.items():
+                    for strategy in self.strategies.for_symbol(symbol):
+                        strategy.parse_trades_batch(prints)
 
-                        # print(f"we reached bitmex trade data for {strategy}")
-                        print(symbol, strategy.contract.symbol)
-                        if strategy.contract.symbol.lower() == symbol.lower():
-                            print(f" matching strategy for {symbol} // bitmex.py")
-                            res = strategy.parse_trades(float(d['price']), float(d['size']), ts)
-                            strategy.check_trade(res)
+            if data['table'] == 'orderBookL2_25':
+                rows_by_symbol = dict()
+                for d in data['data']:
+                    rows_by_symbol.setdefault(d['symbol'], []).append(d)
 
-    def subscribe_channel(self, topic: str):
-        data = dict()
-        data['op'] = "subscribe"
-        data['args'] = []
-        data['args'].append(topic)
+                for symbol, rows in rows_by_symbol.items():
+                    book = self.order_books.get(symbol)
+                    if book is not None and not book.on_table(data['action'], rows):
+                        self.ws_pool.shard_for(symbol).subscriptions.resubscribe(["orderBookL2_25:" + symbol])
 
-        try:
-            self.ws.send(json.dumps(data))
-        except Exception as e:
-            logger.error("Bitmex Websocket error while subscribing to %s: %s",topic, e)
+            if data['table'] in ('order', 'execution'):
+                for d in data['data']:
+                    if 'ordStatus' not in d:
+                        continue
+
+                    order_status = OrderStatus.from_bitmex_update(d)
+                    for strategy in self.strategies.for_symbol(d['symbol']):
+                        strategy.on_order_update(order_status)
+
+            if data['table'] == 'margin':
+                for d in data['data']:
+                    self.balance_cache.push(d['currency'], lambda balance, d=d: balance.update_bitmex(d))
 
-        self._ws_id += 1
+    def subscribe_channel(self, topic: str, symbol: typing.Optional[str] = None):
+        """ topic of a symbol ("trade", "orderBookL2_25"...), or of all symbols without one """
+        self.ws_pool.shard_for(symbol).subscriptions.subscribe([topic if symbol is None else topic + ":" + symbol])
+
+    def unsubscribe_channel(self, topic: str, symbol: typing.Optional[str] = None):
+        self.ws_pool.shard_for(symbol).subscriptions.unsubscribe([topic if symbol is None else topic + ":" + symbol])
+
+    @staticmethod
+    def _subscription_frame(method: str, topics: typing.List[str], request_id: int) -> str:
+        return json.dumps({"op": method, "args": topics})
+
+    def subscribe_order_book(self, contract: Contract) -> BitmexOrderBook:
+        """ Local order book of the symbol (25 levels per side), sizes in contracts """
+        if contract.symbol not in self.order_books:
+            self.order_books[contract.symbol] = BitmexOrderBook(contract.symbol)
+            self.subscribe_channel("orderBookL2_25", contract.symbol)
+
+        return self.order_books[contract.symbol]
+
+    def estimate_slippage(self, contract: Contract, side: str, quantity: float) -> typing.Optional[SlippageEstimate]:
+        """ quantity in contracts. None if the order book of the symbol isn't subscribed or synced """
+        book = self.order_books.get(contract.symbol)
+        if book is not None:
+            return book.estimate_slippage(side, quantity)
 
     # TODO: automated order gets error here with 'Invalid orderQty' response (error code 400) on .place_order() method.
     # orderQty must be greater than 100
     def get_trade_size(self, contract: Contract, price: float, balance_pct: float):
-        balance = self.get_balances()
+        balances = self.balance_cache.get()
+        if balances is None:
+            logger.warning("Bitmex balances not updated for %.0f seconds, no trade size", self.balance_cache.age)
+            return None
+        return self._trade_size(contract, price, balance_pct, balances)
+
+    @staticmethod
+    def _trade_size(contract: Contract, price: float, balance_pct: float, balance: typing.Dict[str, Balance]):
         if balance is not None:
             if 'XBt' in balance:
                 balance = balance['XBt'].wallet_balance
@@ -372,6 +509,8 @@ class BitmexClient:
 
 
 if __name__ == "__main__":
+    import pprint
+    from keys import BITMEX_TESTNET_API_PUBLIC, BITMEX_TESTNET_API_SECRET
 
     bitmex = BitmexClient(BITMEX_TESTNET_API_PUBLIC, BITMEX_TESTNET_API_SECRET, testnet=True)
     # bitmex = BitmexClient(BITMEX_REAL_API_PUBILC, BITMEX_REAL_API_SECRET, testnet=False)
@@ -0,0 +1,235 @@
+import hashlib
+import hmac
+import logging
+import time
+import typing
+from urllib.parse import urlencode
+
+from connectors.async_base import AsyncExchangeClient
+from connectors.bitmex import BitmexClient, _is_tradable
+from decoding import loads, bitmex_timestamp_ms
+from models import Balance, Candle, Contract, OrderStatus
+from rate_limiter import BitmexRateLimits
+
+"""
+asyncio version of BitmexClient, see async_base.py
+"""
+
+logger = logging.getLogger()
+
+
+class AsyncBitmexClient(AsyncExchangeClient):
+    platform = "bitmex"
+    market_streams = ["instrument"]
+
+    def __init__(self, public_key: str, secret_key: str, testnet: bool, journal_path: typing.Optional[str] = None,
+                 base_url: typing.Optional[str] = None, wss_url: typing.Optional[str] = None,
+                 connect: bool = True):
+        if testnet:
+            self.connection_type = "Testnet"
+            default_base_url = "https://testnet.bitmex.com/api/v1"
+            default_wss_url = "wss://ws.testnet.bitmex.com/realtime"
+        else:
+            self.connection_type = "Real Account"
+            default_base_url = "https://www.bitmex.com/api/v1"
+            default_wss_url = "wss://ws.bitmex.com/realtime"
+
+        self._public_key = public_key
+        self._secret_key = secret_key
+
+        super().__init__(base_url or default_base_url, wss_url or default_wss_url, journal_path, connect)
+
+    def _new_limiter(self) -> BitmexRateLimits:
+        return BitmexRateLimits()
+
+    def _encode(self, params: typing.Dict) -> str:
+        return urlencode(params)
+
+    def _sign(self, method: str, endpoint: str, query: str) -> typing.Tuple[str, typing.Dict[str, str]]:
+        expires = str(int(time.time() + 5))
+        message = method + "/api/v1" + endpoint + ("?" + query if query else "") + expires
+        signature = hmac.new(self._secret_key.encode(), message.encode(), hashlib.sha256).hexdigest()
+        return query, {"api-expires": expires, "api-key": self._public_key, "api-signature": signature}
+
+    def _request_weight(self, method: str, endpoint: str, params: typing.Dict) -> typing.Tuple[float, bool, bool]:
+        order = endpoint == "/order" and method != "GET"
+        return 1, order, order
+
+    # REST, coroutines. Bitmex signs every request, like the threaded client
+
+    async def get_contracts_async(self) -> typing.Dict[str, Contract]:
+        instruments = await self._request("GET", "/instrument/active", dict(), signed=True)
+        contracts = dict()
+
+        if instruments is not None:
+            for s in instruments:
+                if _is_tradable(s['symbol'], "") and not s['symbol'].startswith("."):
+                    contracts[s['symbol']] = Contract.from_bitmex(s)
+
+        return contracts
+
+    async def get_historical_candles_async(self, contract: Contract, timeframe: str,
+                                           start_time: typing.Optional[int] = None,
+                                           end_time: typing.Optional[int] = None)\
+            -> typing.Optional[typing.List[Candle]]:
+        data = {'symbol': contract.symbol, 'partial': True, 'binSize': timeframe, 'count': 500,
+                'reverse': start_time is None}
+        # Bitmex buckets are timestamped with the END of the period
+        if start_time is not None:
+            data['startTime'] = BitmexClient._bucket_end_time(start_time, timeframe)
+        if end_time is not None:
+            data['endTime'] = BitmexClient._bucket_end_time(end_time, timeframe)
+
+        raw_candles = await self._request("GET", "/trade/bucketed", data, signed=True)
+        if raw_candles is None:
+            return None
+
+        if data['reverse']:
+            raw_candles = reversed(raw_candles)
+
+        return [Candle.from_bitmex(candle, timeframe) for candle in raw_candles]
+
+    async def get_bid_ask_async(self, contract: Contract) -> typing.Optional[typing.Dict[str, float]]:
+        quotes = await self._request("GET", "/quote", {'symbol': contract.symbol, 'count': 1, 'reverse': True},
+                                     signed=True)
+
+        if quotes is not None and len(quotes) > 0:
+            return {'bid': quotes[0]['bidPrice'], 'ask': quotes[0]['askPrice']}
+
+    async def get_balances_async(self) -> typing.Dict[str, Balance]:
+        margin_data = await self._request("GET", "/user/margin", {'currency': "all"}, signed=True)
+        balances = dict()
+
+        if margin_data is not None:
+            for each in margin_data:
+                balances[each['currency']] = Balance.from_bitmex(each)
+
+        return balances
+
+    async def place_order_async(self, contract: Contract, side: str, quantity: float, order_type: str, price=None,
+                                tif=None) -> typing.Optional[OrderStatus]:
+        input_quantity = round(quantity / (contract.multiplier / 0.01), 8)
+
+        data = dict()
+        data['symbol'] = contract.symbol.upper()
+        data['side'] = side.capitalize()
+        data['orderQty'] = round(round(input_quantity / contract.lot_size) * contract.lot_size, 8)
+        data['ordType'] = order_type.capitalize()
+        if price is not None:
+            data['price'] = round(price / contract.tick_size) * contract.tick_size
+        if tif is not None:
+            data['timeInForce'] = tif
+
+        order_info = await self._request("POST", "/order", data, signed=True)
+
+        if order_info is not None:
+            order_info = OrderStatus.from_bitmex(order_info)
+
+        return order_info
+
+    async def cancel_order_async(self, order_id: str) -> typing.Optional[OrderStatus]:
+        order_info = await self._request("DELETE", "/order", {'orderID': order_id}, signed=True)
+
+        if order_info is not None:
+            order_info = OrderStatus.from_bitmex(order_info[0])
+
+        return order_info
+
+    async def get_order_status_async(self, contract: Contract, order_id: str) -> typing.Optional[OrderStatus]:
+        orders = await self._request("GET", "/order", {'symbol': contract.symbol, 'reverse': True}, signed=True)
+
+        if orders is not None:
+            for order in orders:
+                if order['orderID'] == order_id:
+                    return OrderStatus.from_bitmex(order)
+
+    async def get_trade_size_async(self, contract: Contract, price: float, balance_pct: float):
+        return self.get_trade_size(contract, price, balance_pct)
+
+    # REST, blocking versions with the threaded client's names
+
+    def get_contracts(self) -> typing.Dict[str, Contract]:
+        return self._run(self.get_contracts_async())
+
+    def get_historical_candles(self, contract: Contract, timeframe: str, start_time: typing.Optional[int] = None,
+                               end_time: typing.Optional[int] = None) -> typing.Optional[typing.List[Candle]]:
+        return self._run(self.get_historical_candles_async(contract, timeframe, start_time, end_time))
+
+    def get_bid_ask(self, contract: Contract) -> typing.Optional[typing.Dict[str, float]]:
+        return self._run(self.get_bid_ask_async(contract))
+
+    def get_balances(self) -> typing.Dict[str, Balance]:
+        return self._run(self.get_balances_async())
+
+    def place_order(self, contract: Contract, side: str, quantity: float, order_type: str, price=None, tif=None)\
+            -> typing.Optional[OrderStatus]:
+        return self._run(self.place_order_async(contract, side, quantity, order_type, price, tif))
+
+    def cancel_order(self, order_id: str) -> typing.Optional[OrderStatus]:
+        return self._run(self.cancel_order_async(order_id))
+
+    def get_order_status(self, contract: Contract, order_id: str) -> typing.Optional[OrderStatus]:
+        return self._run(self.get_order_status_async(contract, order_id))
+
+    def get_trade_size(self, contract: Contract, price: float, balance_pct: float):
+        """ Memory read, no request: callable from the event loop too """
+        balances = self.balance_cache.get()
+        if balances is None:
+            logger.warning("%s balances not updated for %.0f seconds, no trade size", self.platform.capitalize(),
+                           self.balance_cache.age)
+            return None
+        return BitmexClient._trade_size(contract, price, balance_pct, balances)
+
+    # Websocket
+
+    _subscription_frame = staticmethod(BitmexClient._subscription_frame)
+
+    def subscribe_channel(self, topic: str, symbol: typing.Optional[str] = None):
+        """ topic of a symbol ("trade"...), or of all symbols without one """
+        self.subscriptions.subscribe([topic if symbol is None else topic + ":" + symbol])
+
+    def unsubscribe_channel(self, topic: str, symbol: typing.Optional[str] = None):
+        self.subscriptions.unsubscribe([topic if symbol is None else topic + ":" + symbol])
+
+    def _on_message(self, msg: str):
+        data = loads(msg)
+
+        if "error" in data and data.get("request", {}).get("op") in ("subscribe", "unsubscribe"):
+            self.subscriptions.reject(data['request']['op'], data['request'].get("args", []), data['error'])
+            return
+
+        if "table" not in data:
+            return
+
+        if data['table'] == "instrument":
+            for d in data['data']:
+                symbol = d['symbol']
+                if symbol.startswith("."):
+                    continue
+
+                prices = self.prices.update(symbol, d.get('bidPrice'), d.get('askPrice'))
+                self.ui_events.price(symbol, prices['bid'], prices['ask'])
+
+                # PNL Calculation
+                for strategy in self.strategies.for_symbol(symbol):
+                    for trade in strategy.open_trades:
+                        if trade.status == "open" and trade.entry_price is not None:
+                            price = prices['bid'] if trade.side == "long" else prices['ask']
+                            multiplier = trade.contract.multiplier
+                            if trade.contract.inverse:
+                                diff = 1 / trade.entry_price - 1 / price
+                            else:
+                                diff = price - trade.entry_price
+                            trade.pnl = (diff if trade.side == "long" else -diff) * trade.quantity * multiplier
+                            self.ui_events.trade(trade)
+
+        elif data['table'] == "trade":
+            # the prints of a message go to the strategies of their symbol in one batch
+            prints_by_symbol = dict()
+            for d in data['data']:
+                if len(self.strategies.for_symbol(d['symbol'])) > 0:
+                    prints_by_symbol.setdefault(d['symbol'], []).append(
+                        (float(d['price']), float(d['size']), bitmex_timestamp_ms(d['timestamp'])))
+
+            self._dispatch_trades([(self.strategies.for_symbol(symbol), prints)
+                                   for symbol, prints in prints_by_symbol.items()])
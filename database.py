@@ -11,6 +11,10 @@ class WorkspaceData:
         self.cursor.execute("CREATE TABLE IF NOT EXISTS watchlist (symbol TEXT, exchange TEXT)")
         self.cursor.execute("CREATE TABLE IF NOT EXISTS strategies (strategy_type TEXT, contract TEXT,"
                             "timeframe TEXT, balance_pct REAL, take_profit REAL, stop_loss REAL, extra_params TEXT)")
+        self.cursor.execute("CREATE TABLE IF NOT EXISTS optimization_results (run_id TEXT, created INTEGER,"
+                            "strategy_type TEXT, contract TEXT, timeframe TEXT, take_profit REAL, stop_loss REAL,"
+                            "extra_params TEXT, total_return REAL, max_drawdown REAL, win_rate REAL,"
+                            "num_trades INTEGER, sharpe REAL)")
         self.conn.commit()
 
     def save(self, table: str, data: typing.List[typing.Tuple]):
@@ -33,3 +37,7 @@ class WorkspaceData:
 
         return data
 
+    def add_optimization_results(self, data: typing.List[typing.Tuple]):
+        # unlike save(), results of previous runs are kept, each run has its own run_id
+        self.cursor.executemany("INSERT INTO optimization_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", data)
+        self.conn.commit()
@@ -0,0 +1,58 @@
+import calendar
+import datetime
+import json
+import typing
+
+"""
+Decoding of the exchanges' payloads on the websocket hot path.
+
+loads() is orjson.loads or ujson.loads when one of them is installed (pip install orjson), json.loads otherwise.
+
+bitmex_timestamp_ms() parses Bitmex timestamps, always "YYYY-MM-DDTHH:MM:SS.sssZ" in UTC, without going through
+dateutil: the date, hour and minute part only changes once a minute, so its epoch value is cached and only the
+seconds and milliseconds are computed for each trade.
+Anything in another format goes to dateutil.parser.isoparse().
+"""
+
+try:
+    import orjson
+    loads: typing.Callable[[typing.Union[str, bytes]], typing.Any] = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    try:
+        import ujson
+        loads = ujson.loads
+        JSON_BACKEND = "ujson"
+    except ImportError:
+        loads = json.loads
+        JSON_BACKEND = "json"
+
+_CACHE_SIZE = 1024
+_minute_cache: typing.Dict[str, int] = dict()
+
+
+def _minute_ms(prefix: str) -> int:
+    """ Epoch milliseconds of a "YYYY-MM-DDTHH:MM" prefix (UTC) """
+    minute_ms = _minute_cache.get(prefix)
+    if minute_ms is None:
+        day = datetime.date(int(prefix[0:4]), int(prefix[5:7]), int(prefix[8:10]))
+        minute_ms = (calendar.timegm(day.timetuple()) * 1000 + int(prefix[11:13]) * 3600000
+                     + int(prefix[14:16]) * 60000)
+
+        if len(_minute_cache) >= _CACHE_SIZE:
+            _minute_cache.clear()
+        _minute_cache[prefix] = minute_ms
+
+    return minute_ms
+
+
+def bitmex_timestamp_ms(timestamp: str) -> int:
+    """ "2022-03-16T04:00:00.000Z" -> 1647403200000 """
+    if len(timestamp) == 24 and timestamp[10] == "T" and timestamp[19] == "." and timestamp[23] == "Z":
+        try:
+            return _minute_ms(timestamp[:16]) + int(timestamp[17:19]) * 1000 + int(timestamp[20:23])
+        except ValueError:
+            pass
+
+    import dateutil.parser  # rarely needed, not imported with the connectors
+    return int(dateutil.parser.isoparse(timestamp).timestamp() * 1000)
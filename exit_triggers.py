@@ -0,0 +1,134 @@
+import heapq
+import threading
+import typing
+
+from models import Trade
+
+"""
+Take profit / stop loss levels of the open trades of a strategy, sorted by price.
+
+The levels are computed once, when the entry price of a trade is known, and kept in two heaps:
+- upper: levels hit when the price goes up to them (long take profit, short stop loss), lowest first
+- lower: levels hit when the price goes down to them (long stop loss, short take profit), highest first
+
+So each tick only compares the price with the top of both heaps. A trade leaves the index when one of its levels is
+hit; its other level stays in the heap and is dropped when it reaches the top.
+"""
+
+
+class ExitTriggers:
+    def __init__(self):
+        self._upper: typing.List[typing.Tuple[float, int, str, Trade]] = []
+        self._lower: typing.List[typing.Tuple[float, int, str, Trade]] = []
+        self._seq = 0
+
+        # new lists instead of in-place changes: the connectors loop over it for the PnL from the websocket thread
+        self._open: typing.List[Trade] = []
+        self._live: typing.Set[Trade] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def trades(self) -> typing.List[Trade]:
+        """ Open trades with a known entry price """
+        return self._open
+
+    def __len__(self) -> int:
+        return len(self._open)
+
+    def add(self, trade: Trade, take_profit: typing.Optional[float], stop_loss: typing.Optional[float]):
+        """ take_profit, stop_loss: in % of the entry price, None for no level """
+        if trade.side == "long":
+            trade.take_profit_price = None if take_profit is None else trade.entry_price * (1 + take_profit / 100)
+            trade.stop_loss_price = None if stop_loss is None else trade.entry_price * (1 - stop_loss / 100)
+        else:
+            trade.take_profit_price = None if take_profit is None else trade.entry_price * (1 - take_profit / 100)
+            trade.stop_loss_price = None if stop_loss is None else trade.entry_price * (1 + stop_loss / 100)
+
+        self.restore(trade)
+
+    def restore(self, trade: Trade):
+        """ Puts back a trade returned by pop_triggered() (e.g. its exit order failed), with the same levels """
+        with self._lock:
+            if trade in self._live:
+                return
+            self._live.add(trade)
+            self._open = self._open + [trade]
+
+            if trade.take_profit_price is not None:
+                self._push(trade.take_profit_price, "Take Profit", trade, upper=trade.side == "long")
+            if trade.stop_loss_price is not None:
+                self._push(trade.stop_loss_price, "Stop Loss", trade, upper=trade.side == "short")
+
+    def _push(self, level: float, trigger: str, trade: Trade, upper: bool):
+        self._seq += 1
+        if upper:
+            heapq.heappush(self._upper, (level, self._seq, trigger, trade))
+        else:
+            heapq.heappush(self._lower, (-level, self._seq, trigger, trade))
+
+    def remove(self, trade: Trade):
+        """ For a trade closed outside of the take profit / stop loss """
+        with self._lock:
+            if trade in self._live:
+                self._live.discard(trade)
+                self._open = [t for t in self._open if t is not trade]
+                self._compact()
+
+    def pop_triggered(self, price: float) -> typing.List[typing.Tuple[Trade, str]]:
+        """ Removes and returns the trades whose take profit or stop loss is hit at `price`, with the trigger name """
+        return self.pop_triggered_range(price, price)
+
+    @property
+    def seq(self) -> int:
+        """ Grows with each level added, to tell apart the levels added after a given point """
+        return self._seq
+
+    def pop_triggered_range(self, low: float, high: float,
+                            added_until: typing.Optional[int] = None) -> typing.List[typing.Tuple[Trade, str]]:
+        """
+        Same for a batch of prices from low to high. A trade hit on both sides is returned once, upper first.
+        added_until: only the levels added up to this seq are checked, the newer ones stay in the index
+        """
+        triggered = []
+
+        with self._lock:
+            if len(self._open) == 0:
+                return triggered
+
+            newer = []
+            while len(self._upper) > 0 and self._upper[0][0] <= high:
+                entry = heapq.heappop(self._upper)
+                if added_until is not None and entry[1] > added_until:
+                    newer.append(entry)
+                elif entry[3] in self._live:
+                    self._live.discard(entry[3])
+                    triggered.append((entry[3], entry[2]))
+            for entry in newer:
+                heapq.heappush(self._upper, entry)
+
+            newer = []
+            while len(self._lower) > 0 and -self._lower[0][0] >= low:
+                entry = heapq.heappop(self._lower)
+                if added_until is not None and entry[1] > added_until:
+                    newer.append(entry)
+                elif entry[3] in self._live:
+                    self._live.discard(entry[3])
+                    triggered.append((entry[3], entry[2]))
+            for entry in newer:
+                heapq.heappush(self._lower, entry)
+
+            if len(triggered) > 0:
+                self._open = [t for t in self._open if t in self._live]
+                self._compact()
+
+        return triggered
+
+    def _compact(self):
+        """ Drops the levels of the trades that left the index once they outnumber the live ones """
+        if len(self._upper) + len(self._lower) <= 2 * len(self._open) + 16:
+            return
+
+        self._upper = [entry for entry in self._upper if entry[3] in self._live]
+        self._lower = [entry for entry in self._lower if entry[3] in self._live]
+        heapq.heapify(self._upper)
+        heapq.heapify(self._lower)
@@ -0,0 +1,153 @@
+import logging
+import os
+import threading
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from candle_buffer import Ohlcv, COLUMNS
+from candle_store import CandleStore
+from models import Contract
+from rate_limiter import RateLimiter, binance_weight_limiter
+from strategies import TF_EQUIV
+
+if typing.TYPE_CHECKING:
+    from connectors.bitmex import BitmexClient
+    from connectors.binance_futures import BinanceFuturesClient
+
+"""
+Bulk download of historical candles, beyond the 1000 (Binance) / 500 (Bitmex) candles of get_historical_candles().
+
+The requested period is cut into pages of one request each, fetched newest first by a few threads. Every request
+takes its weight from a RateLimiter seeded from the exchange's published limits (only a share of them, the rest is
+left to live trading).
+
+Each page fetched is saved as its own file under candle_data/_downloads/<exchange>/<symbol>/<timeframe>/, named
+after its start and end, so an interrupted download restarts with the missing pages only. A page without candles
+(before the listing of the contract, exchange outage) is saved empty, only a failed request leaves a page missing. The
+last page of a resumed download ending later is fetched again up to the new end. Once all the pages are there, they
+are merged into the CandleStore columns and the page files are removed.
+"""
+
+logger = logging.getLogger()
+
+PAGE_SIZE = {"binance": 1000, "bitmex": 500}
+
+# weight of one /fapi/v1/klines request with limit=1000
+BINANCE_KLINES_WEIGHT = 5
+# Bitmex: 120 requests per minute for authenticated users, each request counts as 1
+BITMEX_REQUESTS_PER_MINUTE = 120
+
+
+class BulkDownloader:
+    def __init__(self, client: typing.Union["BitmexClient", "BinanceFuturesClient"], store: CandleStore,
+                 max_workers: int = 4, weight_share: float = 0.5):
+        """
+        weight_share: part of the exchange's rate limit the downloader is allowed to use
+        """
+        self.client = client
+        self.store = store
+        self.max_workers = max_workers
+
+        self.page_size = PAGE_SIZE[client.platform]
+
+        if client.platform == "binance":
+            self._limiter = binance_weight_limiter(client.rate_limits, weight_share)
+            self._request_weight = BINANCE_KLINES_WEIGHT
+        else:
+            self._limiter = RateLimiter(BITMEX_REQUESTS_PER_MINUTE * weight_share, 60)
+            self._request_weight = 1
+
+        self._stop = threading.Event()
+
+    def stop(self):
+        """ Stops after the pages in flight, the download can be resumed later """
+        self._stop.set()
+
+    def _pages_dir(self, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.store.root, "_downloads", self.client.platform, symbol, timeframe)
+
+    def _page_path(self, symbol: str, timeframe: str, page_start: int, page_end: int) -> str:
+        return os.path.join(self._pages_dir(symbol, timeframe), f"{page_start}_{page_end}.npy")
+
+    def _fetch_page(self, contract: Contract, timeframe: str, page_start: int, page_end: int) -> typing.Optional[int]:
+        """ Number of candles saved, None if the download was stopped or the request failed """
+        if self._stop.is_set():
+            return None
+
+        self._limiter.acquire(self._request_weight)
+
+        candles = self.client.get_historical_candles(contract, timeframe, start_time=page_start,
+                                                     end_time=page_end - TF_EQUIV[timeframe] * 1000)
+        if candles is None:
+            return None
+        candles = [c for c in candles if page_start <= c.timestamp < page_end]
+
+        page = np.array([[c.timestamp, c.open, c.high, c.low, c.close, c.volume] for c in candles],
+                        dtype=np.float64).reshape(-1, len(COLUMNS)).T
+
+        path = self._page_path(contract.symbol, timeframe, page_start, page_end)
+        np.save(path + ".tmp.npy", page)
+        os.replace(path + ".tmp.npy", path)
+
+        # the same page fetched earlier up to another end (resumed download ending later)
+        for name in os.listdir(self._pages_dir(contract.symbol, timeframe)):
+            if name.startswith(f"{page_start}_") and name.endswith(".npy") and not path.endswith(os.sep + name):
+                os.remove(os.path.join(self._pages_dir(contract.symbol, timeframe), name))
+
+        return page.shape[1]
+
+    def download(self, contract: Contract, timeframe: str, start_time: int,
+                 end_time: typing.Optional[int] = None) -> int:
+        """
+        Downloads the closed candles between start_time and end_time (ms, default: now) into the CandleStore.
+        Calling it again with the same arguments after an interruption only fetches the missing pages.
+        Returns the number of candles added to the store, -1 if the download was stopped or some pages failed.
+        """
+        tf_ms = TF_EQUIV[timeframe] * 1000
+        page_ms = self.page_size * tf_ms
+
+        if end_time is None:
+            end_time = int(time.time() * 1000)
+        start_time = start_time // tf_ms * tf_ms
+        end_time = end_time // tf_ms * tf_ms   # open time of the candle in progress: excluded
+
+        pages_dir = self._pages_dir(contract.symbol, timeframe)
+        os.makedirs(pages_dir, exist_ok=True)
+
+        # pages are aligned on start_time so that a resumed download finds the same page files. A page is done when
+        # it was fetched up to the same end: the last page of a download resumed with a later end_time is fetched again
+        pages = [(p, min(p + page_ms, end_time)) for p in range(start_time, end_time, page_ms)]
+        missing = [(p, p_end) for p, p_end in reversed(pages)
+                   if not os.path.exists(self._page_path(contract.symbol, timeframe, p, p_end))]
+
+        logger.info("%s %s %s: %s pages to download (%s already done)", self.client.platform, contract.symbol,
+                    timeframe, len(missing), len(pages) - len(missing))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._fetch_page, contract, timeframe, p, p_end) for p, p_end in missing]
+            for future in as_completed(futures):
+                future.result()
+
+        # an empty page is saved too (no candle in the period), only the failed requests are missing
+        failed = [p for p, p_end in pages if not os.path.exists(self._page_path(contract.symbol, timeframe, p, p_end))]
+
+        if self._stop.is_set() or len(failed) > 0:
+            logger.warning("%s %s %s: download interrupted or incomplete (%s pages missing), call download() again "
+                           "to resume", self.client.platform, contract.symbol, timeframe, len(failed))
+            return -1
+
+        page_paths = [self._page_path(contract.symbol, timeframe, p, p_end) for p, p_end in pages]
+        data = Ohlcv(*np.concatenate([np.load(path) for path in page_paths], axis=1))
+        added = self.store.merge(self.client.platform, contract.symbol, timeframe, data)
+
+        for path in page_paths:
+            os.remove(path)
+
+        logger.info("%s %s %s: %s candles downloaded in %.1f s, %s new in the candle store", self.client.platform,
+                    contract.symbol, timeframe, len(data), time.perf_counter() - start, added)
+
+        return added
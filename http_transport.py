@@ -0,0 +1,178 @@
+import collections
+import logging
+import statistics
+import threading
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    import requests
+
+"""
+Keep-alive HTTP transport of the REST clients.
+
+Each client gets its own HttpTransport: a requests.Session whose connections to the exchange are kept open and
+reused, so an order only pays the TCP + TLS handshake when the pool has no idle connection left.
+
+Retries:
+- connection failures (nothing was sent) are retried for every method
+- read errors and 5xx answers are retried for GET and DELETE only. A POST (new order) that may have reached the
+  exchange is never sent twice.
+
+Every request is timed (see RequestTiming), the last `history` timings are kept for stats().
+
+requests (and urllib3) are imported with the first request, on the thread making it: importing the connectors, or
+creating a client, doesn't wait for them.
+"""
+
+logger = logging.getLogger()
+
+_local = threading.local()
+
+
+class _TimedConnectMixin:
+    """ Saves the duration of the TCP (+ TLS) connection setup for the request being made by this thread """
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _local.connect_time = getattr(_local, "connect_time", 0.0) + time.perf_counter() - start
+
+
+_adapter_class = None
+_adapter_lock = threading.Lock()
+
+
+def _timed_adapter_class():
+    """ requests HTTPAdapter whose connection pools time the connection setup, defined on first use """
+    global _adapter_class
+
+    with _adapter_lock:
+        if _adapter_class is None:
+            from requests.adapters import HTTPAdapter
+            from urllib3.connection import HTTPConnection, HTTPSConnection
+            from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+            class _TimedHTTPConnection(_TimedConnectMixin, HTTPConnection):
+                pass
+
+            class _TimedHTTPSConnection(_TimedConnectMixin, HTTPSConnection):
+                pass
+
+            class _TimedHTTPConnectionPool(HTTPConnectionPool):
+                ConnectionCls = _TimedHTTPConnection
+
+            class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+                ConnectionCls = _TimedHTTPSConnection
+
+            class _TimedAdapter(HTTPAdapter):
+                def init_poolmanager(self, *args, **kwargs):
+                    super().init_poolmanager(*args, **kwargs)
+                    self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool,
+                                                               "https": _TimedHTTPSConnectionPool}
+
+            _adapter_class = _TimedAdapter
+
+        return _adapter_class
+
+
+class RequestTiming:
+    """
+    connect: seconds spent opening a new connection (0 when a pooled one was reused)
+    ttfb: seconds until the response headers were received, connect included
+    total: seconds until the body was read
+    """
+    __slots__ = ("time", "method", "endpoint", "status", "connect", "ttfb", "total")
+
+    def __init__(self, method: str, endpoint: str, status: typing.Optional[int], connect: float, ttfb: float,
+                 total: float):
+        self.time = time.time()
+        self.method = method
+        self.endpoint = endpoint
+        self.status = status
+        self.connect = connect
+        self.ttfb = ttfb
+        self.total = total
+
+    def __repr__(self):
+        return (f"RequestTiming({self.method} {self.endpoint} {self.status}: connect {self.connect * 1000:.1f} ms, "
+                f"ttfb {self.ttfb * 1000:.1f} ms, total {self.total * 1000:.1f} ms)")
+
+
+class HttpTransport:
+    def __init__(self, base_url: str, pool_size: int = 10, connect_timeout: float = 3.05,
+                 read_timeout: float = 10, retries: int = 2, backoff: float = 0.2, history: int = 1000):
+        """
+        pool_size: max number of idle connections kept open, as many threads can send requests at the same time
+        retries: number of retries of a failed request, see the module docstring for which ones are retried
+        backoff: wait before the 2nd retry (doubled for each next one, the 1st retry is immediate)
+        """
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self._pool_size = pool_size
+        self._retries = retries
+        self._backoff = backoff
+        self._session: typing.Optional["requests.Session"] = None
+        self._session_lock = threading.Lock()
+
+        self.timings: typing.Deque[RequestTiming] = collections.deque(maxlen=history)
+
+    @property
+    def session(self) -> "requests.Session":
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from urllib3.util.retry import Retry
+
+                retry = Retry(total=self._retries, connect=self._retries, read=self._retries,
+                              status=self._retries, other=0, allowed_methods=frozenset({"GET", "DELETE"}),
+                              status_forcelist=(500, 502, 503, 504), backoff_factor=self._backoff,
+                              raise_on_status=False, respect_retry_after_header=False)
+
+                session = requests.Session()
+                adapter = _timed_adapter_class()(pool_connections=1, pool_maxsize=self._pool_size, max_retries=retry)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+
+            return self._session
+
+    def request(self, method: str, endpoint: str, params: typing.Optional[typing.Dict] = None,
+                headers: typing.Optional[typing.Dict] = None) -> "requests.Response":
+        """ Raises requests.RequestException like requests.get/post/delete """
+        _local.connect_time = 0.0
+        start = time.perf_counter()
+        status = None
+        ttfb = 0.0
+
+        try:
+            response = self.session.request(method, self.base_url + endpoint, params=params, headers=headers,
+                                            timeout=self.timeout)
+            status = response.status_code
+            ttfb = response.elapsed.total_seconds()
+            response.content    # read the body inside the timing
+            return response
+        finally:
+            timing = RequestTiming(method, endpoint, status, _local.connect_time, ttfb, time.perf_counter() - start)
+            self.timings.append(timing)
+            logger.debug("%s", timing)
+
+    def stats(self, method: typing.Optional[str] = None,
+              endpoint: typing.Optional[str] = None) -> typing.Dict[str, float]:
+        """ Summary of the kept timings, optionally for one method and/or endpoint only. Times in milliseconds. """
+        timings = [t for t in list(self.timings) if (method is None or t.method == method)
+                   and (endpoint is None or t.endpoint == endpoint)]
+        if len(timings) == 0:
+            return {"count": 0}
+
+        totals = sorted(t.total for t in timings)
+        return {"count": len(timings),
+                "new_connections": sum(1 for t in timings if t.connect > 0),
+                "connect_mean": statistics.mean(t.connect for t in timings) * 1000,
+                "ttfb_median": statistics.median(t.ttfb for t in timings) * 1000,
+                "total_median": statistics.median(totals) * 1000,
+                "total_p95": totals[min(len(totals) - 1, int(len(totals) * 0.95))] * 1000,
+                "total_max": totals[-1] * 1000}
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
@@ -0,0 +1,98 @@
+import math
+import typing
+
+"""
+Streaming versions of the indicators used by the strategies.
+
+Each class keeps only the running accumulators, so advancing it by one closed candle is O(1) instead of
+rebuilding a pandas Series over the whole candle history. The update rules follow pandas' own ewm() recurrence
+(adjust=True) step by step, so the values are the same ones pandas would return for the same closes.
+"""
+
+
+class Ema:
+    """
+    Running equivalent of pandas.Series.ewm(alpha=alpha, min_periods=min_periods).mean()
+
+    Parameters:
+    alpha: smoothing factor, 2 / (span + 1) for a span or 1 / (1 + com) for a center of mass
+    min_periods: number of observations required before a value is returned (NaN before that)
+    """
+    def __init__(self, alpha: float, min_periods: int = 0):
+        self._old_wt_factor = 1.0 - alpha
+        self._min_periods = max(min_periods, 1)
+
+        self._weighted = math.nan
+        self._old_wt = 1.0
+        self.nobs = 0
+        self.value = math.nan
+
+    @classmethod
+    def from_span(cls, span: int, min_periods: int = 0) -> "Ema":
+        return cls(2.0 / (span + 1.0), min_periods)
+
+    @classmethod
+    def from_com(cls, com: float, min_periods: int = 0) -> "Ema":
+        return cls(1.0 / (1.0 + com), min_periods)
+
+    def update(self, value: float) -> float:
+        if self.nobs == 0:
+            self._weighted = value
+        else:
+            self._old_wt *= self._old_wt_factor
+            if self._weighted != value:
+                self._weighted = (self._old_wt * self._weighted + value) / (self._old_wt + 1.0)
+            self._old_wt += 1.0
+
+        self.nobs += 1
+        self.value = self._weighted if self.nobs >= self._min_periods else math.nan
+
+        return self.value
+
+
+class Macd:
+    def __init__(self, ema_fast: int, ema_slow: int, ema_signal: int):
+        self._fast = Ema.from_span(ema_fast)
+        self._slow = Ema.from_span(ema_slow)
+        self._signal = Ema.from_span(ema_signal)
+
+        self.macd_line = math.nan
+        self.macd_signal = math.nan
+
+    def update(self, close: float) -> typing.Tuple[float, float]:
+        self.macd_line = self._fast.update(close) - self._slow.update(close)
+        self.macd_signal = self._signal.update(self.macd_line)
+
+        return self.macd_line, self.macd_signal
+
+
+class Rsi:
+    """ Wilder RSI, rounded to 2 decimals the same way pandas' Series.round(2) does """
+    def __init__(self, rsi_length: int):
+        self._avg_gain = Ema.from_com(rsi_length - 1, min_periods=rsi_length)
+        self._avg_loss = Ema.from_com(rsi_length - 1, min_periods=rsi_length)
+
+        self._prev_close: typing.Optional[float] = None
+        self.value = math.nan
+
+    def update(self, close: float) -> float:
+        if self._prev_close is None:
+            self._prev_close = close
+            return self.value
+
+        delta = close - self._prev_close
+        self._prev_close = close
+
+        avg_gain = self._avg_gain.update(delta if delta > 0 else 0.0)
+        avg_loss = self._avg_loss.update(-delta if delta < 0 else 0.0)
+
+        if math.isnan(avg_gain) or math.isnan(avg_loss) or avg_gain == avg_loss == 0:
+            self.value = math.nan
+        elif avg_loss == 0:
+            self.value = 100.0
+        else:
+            rs = avg_gain / avg_loss    # rs = relative strength
+            rsi = 100 - (100 / (1 + rs))
+            self.value = round(rsi * 100) / 100     # numpy rounds half to even on the scaled value
+
+        return self.value
@@ -16,9 +16,12 @@ from connectors.binance_futures import BinanceFuturesClient
 from interface.watchlist_component import WatchList
 from interface.trades_component import TradesWatch
 from interface.strategy_component import StrategyEditor
+from models import Contract
 
 logger = logging.getLogger()
 
+UI_REFRESH_MS = 250
+
 
 class Root(tk.Tk):
     def __init__(self, binance: BinanceFuturesClient, bitmex: BitmexClient):
@@ -26,6 +29,7 @@ class Root(tk.Tk):
 
         self.binance = binance
         self.bitmex = bitmex
+        self._exchange_clients = {"Binance": self.binance, "Bitmex": self.bitmex}
 
         self.title("$$$🚀💵 MoneyMachine v1.0 💵🚀$$$")
         self.protocol("WM_DELETE_WINDOW", self._ask_before_close)
@@ -48,6 +52,11 @@ class Root(tk.Tk):
         self._watchlist_frame = WatchList(self.binance.contracts, self.bitmex.contracts,
                                           self._left_frame, bg=BG_COLOR)
         self._watchlist_frame.pack(side=tk.TOP)
+        # the prices of the saved symbols, then of the ones added / removed later
+        for exchange, symbol in self._watchlist_frame.watched():
+            self._watch_symbol(exchange, symbol)
+        self._watchlist_frame.on_watch = self._watch_symbol
+        self._watchlist_frame.on_unwatch = self._unwatch_symbol
 
         self.logging_frame = Logging(self._left_frame, bg=BG_COLOR)
         self.logging_frame.pack(side=tk.TOP)
@@ -65,8 +74,15 @@ class Root(tk.Tk):
         if result == "yes":
             self.binance.reconnect = False
             self.bitmex.reconnect = False
-            self.binance.ws.close()
-            self.bitmex.ws.close()
+            self.binance.ws_pool.close()
+            if self.binance.user_ws is not None:
+                self.binance.user_ws.close()
+            self.bitmex.ws_pool.close()
+
+            for client in [self.binance, self.bitmex]:
+                if client.journal is not None:
+                    client.journal.close()
+                client.transport.close()
 
             self.destroy()
 
@@ -108,98 +124,54 @@ class Root(tk.Tk):
 
         self.logging_frame.add_log("Workspace Saved Successfully!")
 
+    def _watch_symbol(self, exchange: str, symbol: str):
+        """ New watchlist symbol: its prices are published by the client from now on """
+        client = self._exchange_clients[exchange]
+        contract = client.contracts.get(symbol)
+        if contract is None:
+            return
+
+        client.ui_events.watch(symbol)
+        prices = client.prices.get(symbol)
+        if prices is not None:
+            client.ui_events.price(symbol, prices['bid'], prices['ask'])
+        elif exchange == "Binance":
+            # no bookTicker received for it yet (websocket not connected yet), asked once on the scheduler thread
+            client.scheduler.call_later(0, lambda: self._fetch_bid_ask(client, contract))
+
+    @staticmethod
+    def _fetch_bid_ask(client: BinanceFuturesClient, contract: Contract):
+        prices = client.get_bid_ask(contract)
+        if prices is not None:
+            client.ui_events.price(contract.symbol, prices['bid'], prices['ask'])
+
+    def _unwatch_symbol(self, exchange: str, symbol: str):
+        self._exchange_clients[exchange].ui_events.unwatch(symbol)
+
     def _update_ui(self):
+        """ Only what the clients and strategies published since the last refresh: new logs, changed prices of the
+        watchlist symbols, the trades opened / updated and the symbol lists after a refresh of the contracts """
+
+        for exchange, client in self._exchange_clients.items():
+            logs, prices, trades = client.ui_events.drain()
+
+            if client.ui_events.pop_contracts_changed():
+                self._watchlist_frame.update_symbols(exchange, list(client.contracts.keys()))
+                self._strategy_frame.update_contracts()
+
+            for msg in logs:
+                self.logging_frame.add_log(msg)
 
-        # Logs
-
-        for log in self.bitmex.logs:
-            if not log["displayed"]:
-                self.logging_frame.add_log(log['log'])
-                log['displayed'] = True
-
-        for log in self.binance.logs:
-            if not log["displayed"]:
-                self.logging_frame.add_log(log['log'])
-                log['displayed'] = True
-
-        # Trades and Logs
-
-        for client in [self.binance, self.bitmex]:
-            try:
-
-                for b_index, strategy in client.strategies.items():
-                    for log in strategy.logs:
-                        if not log['displayed']:
-                            self.logging_frame.add_log(log['log'])
-                            log['displayed'] = True
-
-                    for trade in strategy.trades:
-                        if trade.time not in self._trades_frame.body_widgets['symbol']:  # we can select any column
-                            self._trades_frame.add_trade(trade)
-
-                        if trade.contract.platform == "binance":
-                            precision_pnl = trade.contract.price_decimals
-                        else:
-                            precision_pnl = 8   # pnl will always be in xbt for bitmex (??)
-
-                        pnl_str = "{0:.{prec}f}".format(trade.pnl, prec=precision_pnl)
-                        self._trades_frame.body_widgets['pnl_var'][trade.time].set(pnl_str)
-                        self._trades_frame.body_widgets['status_var'][trade.time].set(trade.status.capitalize())
-
-            except RuntimeError as e:
-                logger.error("RuntimeError while looping through strategies dictionary: %s", e)
-
-        # Watchlist Prices
-
-        try:
-            for key, value in self._watchlist_frame.body_widgets['symbol'].items():
-                symbol = self._watchlist_frame.body_widgets['symbol'][key].cget('text')
-                exchange = self._watchlist_frame.body_widgets['exchange'][key].cget('text')
-
-                if exchange == "Binance":
-
-                    self.binance.subscribe_channel([self.binance.contracts[symbol]], "aggTrade")
-
-                    if symbol not in self.binance.contracts:
-                        continue
-                    if symbol not in self.binance.prices:
-                        try:
-                            self.binance.get_bid_ask(self.binance.contracts)
-                        except AttributeError as e:
-                            # This try-except catches exception where in the first couple minutes of running,
-                            # websockets might not get all bid/asks so UI gets Attribute error for contract.symbol
-                            # entered to the watchlist
-                            logger.error("AttributeError while getting bid/asks for a symbol: %s", e)
-                            # t = threading.Thread(target=self.binance._start_ws)
-                            # t.start()
-                            # TODO: Sometimes Binance Websocket does not connect for 1-2 minutes,
-                            # I need to be sure not to take action before connection established or
-                            # retry connection like commented 2 lines above (?)
-                            # Above 2 lines work, it forces a new websocket and eventually we get a
-                            # connection. Still needs manual handling though
-                            # EUREKA!: Create sample contract object with missing symbol, get_bid_ask() and add
-                            # that to binance.contracts in the exception code-block
-                            continue
-                    precision = self.binance.contracts[symbol].price_decimals
-                    prices = self.binance.prices[symbol]
-
-                elif exchange == "Bitmex":
-                    if symbol not in self.bitmex.contracts:
-                        continue
-                    if symbol not in self.bitmex.prices:
-                        continue
-                    precision = self.bitmex.contracts[symbol].price_decimals
-                    prices = self.bitmex.prices[symbol]
-                else:
+            for symbol, (bid, ask) in prices.items():
+                contract = client.contracts.get(symbol)
+                if contract is None:
                     continue
+                precision = contract.price_decimals
+                bid_str = None if bid is None else "{0:.{prec}f}".format(bid, prec=precision)
+                ask_str = None if ask is None else "{0:.{prec}f}".format(ask, prec=precision)
+                self._watchlist_frame.update_price(exchange, symbol, bid_str, ask_str)
 
-                if prices['bid'] is not None:
-                    price_str = "{0:.{prec}f}".format(prices['bid'], prec=precision)
-                    self._watchlist_frame.body_widgets['bid_var'][key].set(price_str)
-                if prices['ask'] is not None:
-                    price_str = "{0:.{prec}f}".format(prices['ask'], prec=precision)
-                    self._watchlist_frame.body_widgets['ask_var'][key].set(price_str)
-        except RuntimeError as e:
-            logger.error("RuntimeError while looping through watchlist dictionary: %s", e)
+            for trade in trades:
+                self._trades_frame.update_trade(trade)
 
-        self.after(1500, self._update_ui)
+        self.after(UI_REFRESH_MS, self._update_ui)
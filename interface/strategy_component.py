@@ -1,4 +1,5 @@
 import json
+import typing
 import tkinter as tk
 
 from interface.styling import *
@@ -9,6 +10,9 @@ from utils import *
 from interface.scrollable_frame import ScrollableFrame
 from database import WorkspaceData
 
+if typing.TYPE_CHECKING:
+    from candle_store import CandleStore
+
 
 class StrategyEditor(tk.Frame):
     def __init__(self, root, binance: BinanceFuturesClient, bitmex: BitmexClient, *args, **kwargs):
@@ -17,19 +21,16 @@ class StrategyEditor(tk.Frame):
         self.root = root
 
         self.db = WorkspaceData()
+        self._candle_store: typing.Optional["CandleStore"] = None
 
         self._valid_integer = self.register(check_integer_format)
         self._valid_float = self.register(check_float_format)
 
         self._exchanges = {"Binance": binance, "Bitmex": bitmex}
 
-        self._all_contracts = ["BTCUSDT", "ETHUSDT"]
+        self._all_contracts = self._contract_names()
         self._all_timeframes = ["1m", "5m", "15m", "30m", "1h", "4h"]
 
-        for exchange, client in self._exchanges.items():
-            for symbol, contract in client.contracts.items():
-                self._all_contracts.append(symbol + "_" + exchange.capitalize())
-
         self._commands_frame = tk.Frame(self, bg=BG_COLOR)
         self._commands_frame.pack(side=tk.TOP)
 
@@ -107,6 +108,24 @@ class StrategyEditor(tk.Frame):
 
         self._load_workspace()
 
+    def _contract_names(self) -> typing.List[str]:
+        names = ["BTCUSDT", "ETHUSDT"]
+        for exchange, client in self._exchanges.items():
+            for symbol in client.contracts:
+                names.append(symbol + "_" + exchange.capitalize())
+        return names
+
+    def update_contracts(self):
+        """ After a refresh of the contracts, for the rows added from now on """
+        self._all_contracts[:] = self._contract_names()
+
+    @property
+    def candle_store(self) -> "CandleStore":
+        if self._candle_store is None:
+            from candle_store import CandleStore    # numpy, only imported once a strategy is started
+            self._candle_store = CandleStore()
+        return self._candle_store
+
     def _add_strategy_row(self):
         b_index = self._body_index
 
@@ -265,7 +284,8 @@ class StrategyEditor(tk.Frame):
             else:
                 return
             
-            new_strategy.candles = self._exchanges[exchange].get_historical_candles(contract, timeframe)
+            # warm-up candles come from the local candle store, only the missing ones are requested
+            new_strategy.candles = self.candle_store.get_warm_up_candles(self._exchanges[exchange], contract, timeframe)
 
             if len(new_strategy.candles) == 0:
                 self.root.logging_frame.add_log(f"No historical data retrieved for {contract.symbol}.")
@@ -276,6 +296,8 @@ class StrategyEditor(tk.Frame):
             if exchange.lower() == "binance":
                 print("exchange is binance // strategy_component.py")
                 self._exchanges[exchange].subscribe_channel([contract], "aggTrade")
+            else:
+                self._exchanges[exchange].subscribe_channel("trade", contract.symbol)
 
             # here we add the started strategy to its client object.so, when client is run, websocket runs the
             # strategy immediately
@@ -294,6 +316,12 @@ class StrategyEditor(tk.Frame):
         else:
 
             del self._exchanges[exchange].strategies[b_index]
+            # no trade stream kept for a symbol without strategy
+            if len(self._exchanges[exchange].strategies.for_symbol(symbol)) == 0:
+                if exchange.lower() == "binance":
+                    self._exchanges[exchange].unsubscribe_channel([contract], "aggTrade")
+                else:
+                    self._exchanges[exchange].unsubscribe_channel("trade", contract.symbol)
 
             # enable changes in the running strategy, change on button config and add log entry
             for param in self._base_params:
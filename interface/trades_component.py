@@ -42,6 +42,7 @@ class TradesWatch(tk.Frame):
                 self.body_widgets[h + "_var"] = dict()
 
         self._body_index = 0
+        self._shown: typing.Dict[int, typing.Tuple[str, str]] = dict()   # t_index: (status, pnl) shown
 
     def add_trade(self, trade: Trade):
         # TODO: Improving OrderStatus and using it here might be better
@@ -95,4 +96,25 @@ class TradesWatch(tk.Frame):
 
         self._body_index += 1
 
+    def update_trade(self, trade: Trade):
+        """ Adds the row of a new trade, then sets its status and pnl if they changed """
+        t_index = trade.time
+        if t_index not in self.body_widgets['symbol']:
+            self.add_trade(trade)
+
+        if trade.contract.platform == "binance":
+            precision_pnl = trade.contract.price_decimals
+        else:
+            precision_pnl = 8   # pnl will always be in xbt for bitmex (??)
+
+        status_str = trade.status.capitalize()
+        pnl_str = "{0:.{prec}f}".format(trade.pnl, prec=precision_pnl)
+        shown_status, shown_pnl = self._shown.get(t_index, (None, None))
+
+        if status_str != shown_status:
+            self.body_widgets['status_var'][t_index].set(status_str)
+        if pnl_str != shown_pnl:
+            self.body_widgets['pnl_var'][t_index].set(pnl_str)
+        self._shown[t_index] = (status_str, pnl_str)
+
 
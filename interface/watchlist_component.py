@@ -69,14 +69,55 @@ class WatchList(tk.Frame):
 
         self._body_index = 1
 
+        # rows of each (exchange, symbol), for the price updates, and the last strings shown in them
+        self._rows: typing.Dict[typing.Tuple[str, str], typing.List[int]] = dict()
+        self._shown: typing.Dict[int, typing.Tuple[typing.Optional[str], typing.Optional[str]]] = dict()
+        # called with (exchange, symbol) when a symbol gets its first row / loses its last one
+        self.on_watch: typing.Optional[typing.Callable[[str, str], None]] = None
+        self.on_unwatch: typing.Optional[typing.Callable[[str, str], None]] = None
+
         saved_symbols = self.db.get("watchlist")
         for s in saved_symbols:
             self._add_symbol(s['symbol'], s['exchange'])
 
     def _remove_symbol(self, b_index: int):
+        key = (self.body_widgets['exchange'][b_index].cget("text"), self.body_widgets['symbol'][b_index].cget("text"))
+
         for h in self._headers:
             self.body_widgets[h][b_index].grid_forget()
             del self.body_widgets[h][b_index]
+        for h in ["bid_var", "ask_var"]:
+            del self.body_widgets[h][b_index]
+        self._shown.pop(b_index, None)
+
+        self._rows[key].remove(b_index)
+        if len(self._rows[key]) == 0:
+            del self._rows[key]
+            if self.on_unwatch is not None:
+                self.on_unwatch(*key)
+
+    def watched(self) -> typing.List[typing.Tuple[str, str]]:
+        """ (exchange, symbol) of the rows """
+        return list(self._rows.keys())
+
+    def update_price(self, exchange: str, symbol: str, bid: typing.Optional[str], ask: typing.Optional[str]):
+        """ Formatted bid / ask, only the rows showing something else are set """
+        for b_index in self._rows.get((exchange, symbol), []):
+            shown_bid, shown_ask = self._shown.get(b_index, (None, None))
+            if bid is not None and bid != shown_bid:
+                self.body_widgets['bid_var'][b_index].set(bid)
+                shown_bid = bid
+            if ask is not None and ask != shown_ask:
+                self.body_widgets['ask_var'][b_index].set(ask)
+                shown_ask = ask
+            self._shown[b_index] = (shown_bid, shown_ask)
+
+    def update_symbols(self, exchange: str, symbols: typing.List[str]):
+        """ After a refresh of the contracts. In place, the entries autocomplete from these lists """
+        if exchange == "Binance":
+            self.binance_symbols[:] = symbols
+        else:
+            self.bitmex_symbols[:] = symbols
 
     # TODO: Instead of en entry box, it may be better to use tk.OptionMenu... we already have the keys list above.
     # using select box may eliminate typing mistakes or upper-lower case mistakes
@@ -126,4 +167,12 @@ class WatchList(tk.Frame):
 
         self._body_index += 1
 
+        key = (exchange, symbol)
+        if key in self._rows:
+            self._rows[key].append(b_index)
+        else:
+            self._rows[key] = [b_index]
+            if self.on_watch is not None:
+                self.on_watch(*key)
+
 
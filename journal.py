@@ -0,0 +1,145 @@
+import gzip
+import json
+import logging
+import queue
+import threading
+import time
+import typing
+
+"""
+Raw websocket frames journal.
+
+MessageJournal appends every frame received by a connector, with its receive time, to a gzip file. The websocket
+thread only puts the frame on a queue, the file is written by a background thread so the socket never waits on the
+disk. Each recording session is appended to the file as a new gzip member, so earlier sessions are never rewritten.
+
+Frames are tagged with the stream they came from: "market" for the market data connections, "user" for the Binance
+user data stream (order and balance updates). replay() feeds a journal back through a connector's _on_message() and
+_on_user_message(), at the recorded pace, N times faster, or as fast as possible. replay_client() does it for a whole
+client with its journal off, built offline (connect=False: no request, no websocket, no background thread):
+
+    client = BinanceFuturesClient("", "", testnet=False, connect=False)
+    client.strategies[0] = strategy
+    replay_client("binance.jsonl.gz", client, speed=None)
+
+File format, one frame per line (inside gzip): [receive time in microseconds since epoch, "raw frame", "stream"]
+Lines without a stream (journals recorded before the user data stream was) are market frames.
+"""
+
+logger = logging.getLogger()
+
+_STOP = object()
+
+MARKET_STREAM = "market"
+USER_STREAM = "user"
+
+
+class MessageJournal:
+    def __init__(self, file_path: str, flush_interval: float = 1.0):
+        """
+        flush_interval: max number of seconds a frame can wait in memory before being flushed to the file
+        """
+        self.file_path = file_path
+        self._flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+
+        self.recorded = 0
+
+        self._thread = threading.Thread(target=self._write_loop, name=f"journal-{file_path}", daemon=True)
+        self._thread.start()
+
+    def record(self, msg: str, stream: str = MARKET_STREAM):
+        """ Called from the websocket thread, never blocks """
+        self._queue.put((time.time_ns() // 1000, msg, stream))
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _write_loop(self):
+        with gzip.open(self.file_path, "at", encoding="utf-8") as f:
+            last_flush = time.monotonic()
+
+            while True:
+                try:
+                    item = self._queue.get(timeout=self._flush_interval)
+                except queue.Empty:
+                    item = None
+
+                if item is _STOP:
+                    break
+
+                if item is not None:
+                    f.write(json.dumps(item) + "\n")
+                    self.recorded += 1
+
+                if item is None or time.monotonic() - last_flush >= self._flush_interval:
+                    f.flush()
+                    last_flush = time.monotonic()
+
+        logger.info("Journal %s closed, %s frames recorded", self.file_path, self.recorded)
+
+
+def read_journal(file_path: str) -> typing.Iterator[typing.Tuple[int, str, str]]:
+    """
+    Yields (receive time in microseconds, raw frame, stream). A truncated end of file (crash while writing) is skipped.
+    """
+    with gzip.open(file_path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                    ts, msg = item[0], item[1]
+                except (ValueError, TypeError, IndexError):
+                    logger.warning("Journal %s: skipping incomplete line", file_path)
+                    continue
+                yield ts, msg, item[2] if len(item) > 2 else MARKET_STREAM
+        except (EOFError, gzip.BadGzipFile) as e:
+            logger.warning("Journal %s ends with an incomplete block: %s", file_path, e)
+
+
+def replay(file_path: str, on_message: typing.Callable[[typing.Any, str], None],
+           speed: typing.Optional[float] = 1.0,
+           on_user_message: typing.Optional[typing.Callable[[typing.Any, str], None]] = None) -> int:
+    """
+    Feeds the journal frames to on_message(ws, msg), e.g. client._on_message, in the recorded order. The user data
+    stream frames go to on_user_message(ws, msg), e.g. client._on_user_message, they are skipped without it.
+
+    speed: 1.0 keeps the recorded pace, N replays N times faster, None replays as fast as possible
+    Returns the number of frames replayed.
+    """
+    count = 0
+    first_ts = None
+    start = time.perf_counter()
+
+    for ts, msg, stream in read_journal(file_path):
+        if stream == USER_STREAM:
+            handler = on_user_message
+        else:
+            handler = on_message
+        if handler is None:
+            continue
+
+        if speed is not None:
+            if first_ts is None:
+                first_ts = ts
+            delay = (ts - first_ts) / 1000000 / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+        handler(None, msg)
+        count += 1
+
+    return count
+
+
+def replay_client(file_path: str, client, speed: typing.Optional[float] = 1.0) -> int:
+    """
+    replay() through client._on_message and client._on_user_message (for the clients with a user data stream). The
+    client's journal is off while replaying, so the replayed frames aren't recorded again.
+    """
+    journal, client.journal = client.journal, None
+    try:
+        return replay(file_path, client._on_message, speed, getattr(client, "_on_user_message", None))
+    finally:
+        client.journal = journal
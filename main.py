@@ -1,18 +1,52 @@
+import time
+_start = time.perf_counter()
+
 from keys import *
-import tkinter as tk
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from connectors.bitmex import BitmexClient
 from connectors.binance_futures import BinanceFuturesClient
-import pprint
 from logkeeper import log_keeper
 from interface.root_component import Root
 
+logger = logging.getLogger()
+
+
+def _timed(timings: dict, name: str, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    timings[name] = time.perf_counter() - start
+    return result
+
+
+def _startup_report(timings: dict):
+    logger.info("Startup: %s", ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items()))
+
+
 if __name__ == "__main__":
 
     log_keeper("info.log")
-    binance = BinanceFuturesClient(BINANCE_TESTNET_API_PUBLIC, BINANCE_TESTNET_API_SECRET, True)
-    bitmex = BitmexClient(BITMEX_TESTNET_API_PUBLIC, BITMEX_TESTNET_API_SECRET, True)
+    timings = {"imports": time.perf_counter() - _start}
+
+    # both clients start from their metadata cache, the requests they still need run in the background. The seed
+    # snapshots shipped with the repo are mainnet ones: on testnet the very first run has no cache yet and still gets
+    # the contracts with a blocking request, the cold start is fast from the second run on.
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        binance_future = executor.submit(_timed, timings, "binance client", BinanceFuturesClient,
+                                         BINANCE_TESTNET_API_PUBLIC, BINANCE_TESTNET_API_SECRET, True)
+        bitmex_future = executor.submit(_timed, timings, "bitmex client", BitmexClient,
+                                        BITMEX_TESTNET_API_PUBLIC, BITMEX_TESTNET_API_SECRET, True)
+        binance = binance_future.result()
+        bitmex = bitmex_future.result()
+    timings["clients (parallel)"] = time.perf_counter() - start
+
+    root = _timed(timings, "window", Root, binance, bitmex)
+
+    def first_draw():
+        timings["total to first draw"] = time.perf_counter() - _start
+        _startup_report(timings)
 
-    root = Root(binance, bitmex)
+    root.after_idle(first_draw)
 
     root.mainloop()
@@ -0,0 +1,72 @@
+import json
+import logging
+import os
+import time
+import typing
+
+"""
+Exchange metadata (Binance exchangeInfo, Bitmex /instrument/active) saved on disk, so a client can start with the
+contracts of the last run and refresh them in the background.
+
+    metadata_cache/binance_testnet.json: {"version": 1, "saved_at": <ms>, "data": <raw response>}
+
+A file written by another version of the format is ignored. Without a cache file, the response_<platform>.json
+snapshot shipped with the repo is used as a seed for the real account only: it is a mainnet snapshot, a testnet client
+without a cache file gets its contracts with a blocking request.
+"""
+
+logger = logging.getLogger()
+
+CACHE_VERSION = 1
+
+
+class MetadataCache:
+    def __init__(self, platform: str, testnet: bool, root: str = "metadata_cache",
+                 seed_path: typing.Optional[str] = None):
+        self.platform = platform
+        self.path = os.path.join(root, f"{platform}_{'testnet' if testnet else 'real'}.json")
+        if seed_path is None and not testnet:
+            seed_path = f"response_{platform}.json"
+        self.seed_path = seed_path
+        self.saved_at: typing.Optional[int] = None     # ms, None for the seed snapshot
+
+    def load(self) -> typing.Optional[typing.Any]:
+        """ Raw response of the last run, or of the seed snapshot. None if neither can be read. """
+        try:
+            with open(self.path) as f:
+                cached = json.load(f)
+            if cached.get("version") == CACHE_VERSION:
+                self.saved_at = cached['saved_at']
+                return cached['data']
+            logger.info("%s metadata cache: version %s ignored", self.platform, cached.get("version"))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logger.warning("%s metadata cache %s unreadable: %s", self.platform, self.path, e)
+
+        if self.seed_path is None:
+            return None
+
+        try:
+            with open(self.seed_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def age(self) -> typing.Optional[float]:
+        """ Seconds since the loaded data was saved, None for the seed snapshot """
+        return None if self.saved_at is None else time.time() - self.saved_at / 1000
+
+    def save(self, data: typing.Any):
+        """ Written to a temporary file first: an interrupted write never leaves a broken cache """
+        self.saved_at = int(time.time() * 1000)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"version": CACHE_VERSION, "saved_at": self.saved_at, "data": data}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("%s metadata cache not saved: %s", self.platform, e)
@@ -1,9 +1,11 @@
-import dateutil.parser
-import datetime
+from decoding import bitmex_timestamp_ms
 # TODO: Make each class a "platform" parameter. defince a platform variable in each client's __init__ method.
 # so tht each class should get the right info like that instead of try/except blocks.
 
 BITMEX_MULTIPLIER = 0.00000001
+BITMEX_MARGIN_FIELDS = {"initMargin": "initial_margin", "maintMargin": "maintenance_margin",
+                        "marginBalance": "margin_balance", "walletBalance": "wallet_balance",
+                        "unrealisedPnl": "unrealized_pnl"}
 BITMEX_TF_MINUTES = {"1m": 1, "5m": 5, "1h": 60, "1d": 1440}
 # available options: [1m,5m,1h,1d]
 
@@ -17,72 +19,128 @@ class Balance:
     Parameters:
     info: dict (json) format of binance account information request's response
 
+    keep_raw: keeps the exchange payload in self.info (dropped by default to save memory)
+
     Caution: each asset should be passed separately
             (preferably by passing the account info through a for loop)
     """
-    def __init__(self, platform, info) -> None:
-        self.info = info
+    __slots__ = ("platform", "info", "initial_margin", "maintenance_margin", "margin_balance", "wallet_balance",
+                 "unrealized_pnl")
+
+    def __init__(self, platform, info, keep_raw: bool = False) -> None:
         self.platform = platform
+        self.info = info if keep_raw else None
         if self.platform == "binance":
-            self._get_binance_balance()
+            self._get_binance_balance(info)
         elif self.platform == "bitmex":
-            self._get_bitmex_balance()
+            self._get_bitmex_balance(info)
+
+    @classmethod
+    def from_binance(cls, info, keep_raw: bool = False) -> "Balance":
+        balance = cls.__new__(cls)
+        balance.platform = "binance"
+        balance.info = info if keep_raw else None
+        balance._get_binance_balance(info)
+        return balance
 
-    def _get_binance_balance(self):
-        self.initial_margin = float(self.info['initialMargin'])
-        self.maintenance_margin = float(self.info['maintMargin'])
-        self.margin_balance = float(self.info['marginBalance'])
-        self.wallet_balance = float(self.info['walletBalance'])
-        self.unrealized_pnl = float(self.info['unrealizedProfit'])
+    @classmethod
+    def from_bitmex(cls, info, keep_raw: bool = False) -> "Balance":
+        balance = cls.__new__(cls)
+        balance.platform = "bitmex"
+        balance.info = info if keep_raw else None
+        balance._get_bitmex_balance(info)
+        return balance
 
-    def _get_bitmex_balance(self):
-        self.initial_margin = self.info['initMargin'] * BITMEX_MULTIPLIER
-        self.maintenance_margin = self.info['maintMargin'] * BITMEX_MULTIPLIER
-        self.margin_balance = self.info['marginBalance'] * BITMEX_MULTIPLIER
-        self.wallet_balance = self.info['walletBalance'] * BITMEX_MULTIPLIER
-        self.unrealized_pnl = self.info['unrealisedPnl'] * BITMEX_MULTIPLIER
+    def _get_binance_balance(self, info):
+        self.initial_margin = float(info['initialMargin'])
+        self.maintenance_margin = float(info['maintMargin'])
+        self.margin_balance = float(info['marginBalance'])
+        self.wallet_balance = float(info['walletBalance'])
+        self.unrealized_pnl = float(info['unrealizedProfit'])
+
+    def _get_bitmex_balance(self, info):
+        self.initial_margin = info['initMargin'] * BITMEX_MULTIPLIER
+        self.maintenance_margin = info['maintMargin'] * BITMEX_MULTIPLIER
+        self.margin_balance = info['marginBalance'] * BITMEX_MULTIPLIER
+        self.wallet_balance = info['walletBalance'] * BITMEX_MULTIPLIER
+        self.unrealized_pnl = info['unrealisedPnl'] * BITMEX_MULTIPLIER
+
+    def update_bitmex(self, info):
+        """ Row of the margin websocket table, only the changed fields are sent """
+        for key, attribute in BITMEX_MARGIN_FIELDS.items():
+            if info.get(key) is not None:
+                setattr(self, attribute, info[key] * BITMEX_MULTIPLIER)
 
 
 class Candle:
+    """
+    Use the from_binance() / from_bitmex() / from_parse_trade() constructors when building many candles of the
+    same platform, they skip the platform dispatch done in __init__.
+    keep_raw keeps the exchange payload in self.candle_info (dropped by default to save memory)
+    """
+    __slots__ = ("platform", "candle_info", "timeframe", "timestamp", "open", "high", "low", "close", "volume")
 
-    def __init__(self, platform, candle_info, timeframe: str) -> None:
-        self.candle_info = candle_info
+    def __init__(self, platform, candle_info, timeframe: str, keep_raw: bool = False) -> None:
+        self.candle_info = candle_info if keep_raw else None
         self.platform = platform
         self.timeframe = timeframe
         if self.platform == "binance":
-            self._get_binance_candles()
+            self._get_binance_candles(candle_info)
         elif self.platform == "bitmex":
-            self._get_bitmex_candles()
+            self._get_bitmex_candles(candle_info)
         elif self.platform == "parse_trade":
-            self._get_parse_trade_candles()
+            self._get_parse_trade_candles(candle_info)
+
+    @classmethod
+    def _new(cls, platform: str, candle_info, timeframe: str, keep_raw: bool) -> "Candle":
+        candle = cls.__new__(cls)
+        candle.candle_info = candle_info if keep_raw else None
+        candle.platform = platform
+        candle.timeframe = timeframe
+        return candle
+
+    @classmethod
+    def from_binance(cls, candle_info, timeframe: str, keep_raw: bool = False) -> "Candle":
+        candle = cls._new("binance", candle_info, timeframe, keep_raw)
+        candle._get_binance_candles(candle_info)
+        return candle
 
-    def _get_binance_candles(self):
-        self.timestamp = self.candle_info[0]
-        self.open = float(self.candle_info[1])
-        self.high = float(self.candle_info[2])
-        self.low = float(self.candle_info[3])
-        self.close = float(self.candle_info[4])
-        self.volume = float(self.candle_info[5])
+    @classmethod
+    def from_bitmex(cls, candle_info, timeframe: str, keep_raw: bool = False) -> "Candle":
+        candle = cls._new("bitmex", candle_info, timeframe, keep_raw)
+        candle._get_bitmex_candles(candle_info)
+        return candle
 
-    def _get_bitmex_candles(self):
+    @classmethod
+    def from_parse_trade(cls, candle_info, timeframe: str, keep_raw: bool = False) -> "Candle":
+        candle = cls._new("parse_trade", candle_info, timeframe, keep_raw)
+        candle._get_parse_trade_candles(candle_info)
+        return candle
+
+    def _get_binance_candles(self, candle_info):
+        self.timestamp = candle_info[0]
+        self.open = float(candle_info[1])
+        self.high = float(candle_info[2])
+        self.low = float(candle_info[3])
+        self.close = float(candle_info[4])
+        self.volume = float(candle_info[5])
+
+    def _get_bitmex_candles(self, candle_info):
         """ timestamp in Bitmex are the END of the period and in string format"""
-        str_time = dateutil.parser.isoparse(self.candle_info["timestamp"])
-        str_time = str_time - datetime.timedelta(minutes=BITMEX_TF_MINUTES[self.timeframe])
-        self.timestamp = int(str_time.timestamp() * 1000)
-        # print(self.candle_info["timestamp"], str_time, self.timestamp)
-        self.open = self.candle_info["open"]
-        self.high = self.candle_info["high"]
-        self.low = self.candle_info["low"]
-        self.close = self.candle_info["close"]
-        self.volume = self.candle_info["volume"]
-
-    def _get_parse_trade_candles(self):
-        self.timestamp = self.candle_info['ts']
-        self.open = self.candle_info["open"]
-        self.high = self.candle_info["high"]
-        self.low = self.candle_info["low"]
-        self.close = self.candle_info["close"]
-        self.volume = self.candle_info["volume"]
+        self.timestamp = bitmex_timestamp_ms(candle_info["timestamp"]) - BITMEX_TF_MINUTES[self.timeframe] * 60000
+        self.open = candle_info["open"]
+        self.high = candle_info["high"]
+        self.low = candle_info["low"]
+        self.close = candle_info["close"]
+        self.volume = candle_info["volume"]
+
+    def _get_parse_trade_candles(self, candle_info):
+        self.timestamp = candle_info['ts']
+        self.open = candle_info["open"]
+        self.high = candle_info["high"]
+        self.low = candle_info["low"]
+        self.close = candle_info["close"]
+        self.volume = candle_info["volume"]
 
 
 def tick_to_decimals(tick_size: float) -> int:
@@ -100,36 +158,57 @@ def tick_to_decimals(tick_size: float) -> int:
 
 
 class Contract:
+    """
+    keep_raw keeps the exchange payload in self.contract_info (dropped by default to save memory)
+    """
+    __slots__ = ("platform", "contract_info", "symbol", "base_asset", "quote_asset", "price_decimals",
+                 "quantity_decimals", "tick_size", "lot_size", "quanto", "inverse", "multiplier")
 
-    def __init__(self, platform, contract_info):
-        self.contract_info = contract_info
+    def __init__(self, platform, contract_info, keep_raw: bool = False):
+        self.contract_info = contract_info if keep_raw else None
         self.platform = platform
         if self.platform == "binance":
-            self._get_binance_contracts()
+            self._get_binance_contracts(contract_info)
         elif self.platform == "bitmex":
-            self._get_bitmex_contracts()
-
-    def _get_binance_contracts(self):
-        self.symbol = self.contract_info['symbol']   # ETHUSDT
-        self.base_asset = self.contract_info['baseAsset']    # ETH
-        self.quote_asset = self.contract_info['quoteAsset']  # USDT
-        self.price_decimals = self.contract_info['pricePrecision']
-        self.quantity_decimals = self.contract_info['quantityPrecision']
+            self._get_bitmex_contracts(contract_info)
+
+    @classmethod
+    def from_binance(cls, contract_info, keep_raw: bool = False) -> "Contract":
+        contract = cls.__new__(cls)
+        contract.contract_info = contract_info if keep_raw else None
+        contract.platform = "binance"
+        contract._get_binance_contracts(contract_info)
+        return contract
+
+    @classmethod
+    def from_bitmex(cls, contract_info, keep_raw: bool = False) -> "Contract":
+        contract = cls.__new__(cls)
+        contract.contract_info = contract_info if keep_raw else None
+        contract.platform = "bitmex"
+        contract._get_bitmex_contracts(contract_info)
+        return contract
+
+    def _get_binance_contracts(self, contract_info):
+        self.symbol = contract_info['symbol']   # ETHUSDT
+        self.base_asset = contract_info['baseAsset']    # ETH
+        self.quote_asset = contract_info['quoteAsset']  # USDT
+        self.price_decimals = contract_info['pricePrecision']
+        self.quantity_decimals = contract_info['quantityPrecision']
         self.tick_size = 1 / pow(10, self.price_decimals)
         self.lot_size = 1 / pow(10, self.quantity_decimals)
 
-    def _get_bitmex_contracts(self):
-        self.symbol = self.contract_info['symbol']
-        self.base_asset = self.contract_info['rootSymbol']
-        self.quote_asset = self.contract_info['quoteCurrency']
-        self.tick_size = self.contract_info['tickSize']
-        self.lot_size = self.contract_info['lotSize']
+    def _get_bitmex_contracts(self, contract_info):
+        self.symbol = contract_info['symbol']
+        self.base_asset = contract_info['rootSymbol']
+        self.quote_asset = contract_info['quoteCurrency']
+        self.tick_size = contract_info['tickSize']
+        self.lot_size = contract_info['lotSize']
         self.price_decimals = tick_to_decimals(self.tick_size)
         self.quantity_decimals = tick_to_decimals(self.lot_size)
 
-        self.quanto = self.contract_info['isQuanto']
-        self.inverse = self.contract_info['isInverse']
-        self.multiplier = self.contract_info['multiplier'] * BITMEX_MULTIPLIER
+        self.quanto = contract_info['isQuanto']
+        self.inverse = contract_info['isInverse']
+        self.multiplier = contract_info['multiplier'] * BITMEX_MULTIPLIER
 
         if self.inverse:
             self.multiplier *= -1
@@ -137,26 +216,69 @@ class Contract:
 
 class OrderStatus:
     #   TODO: this class should hold a lot more data ie symbol, time, leverage etc.
-    def __init__(self, platform, order_info):
+    __slots__ = ("platform", "order_info", "order_id", "status", "avg_price")
+
+    def __init__(self, platform, order_info, keep_raw: bool = False):
         self.platform = platform
-        self.order_info = order_info
+        self.order_info = order_info if keep_raw else None
         if self.platform == "binance":
-            self._get_binance_order_status()
+            self._get_binance_order_status(order_info)
         elif self.platform == "bitmex":
-            self._get_bitmex_order_status()
+            self._get_bitmex_order_status(order_info)
 
-    def _get_binance_order_status(self):
-        self.order_id = self.order_info['orderId']
-        self.status = self.order_info['status'].lower()
-        self.avg_price = float(self.order_info['avgPrice'])
+    @classmethod
+    def from_binance(cls, order_info, keep_raw: bool = False) -> "OrderStatus":
+        order_status = cls.__new__(cls)
+        order_status.platform = "binance"
+        order_status.order_info = order_info if keep_raw else None
+        order_status._get_binance_order_status(order_info)
+        return order_status
 
-    def _get_bitmex_order_status(self):
-        self.order_id = self.order_info['orderID']
-        self.status = self.order_info['ordStatus'].lower()
-        self.avg_price = self.order_info['avgPx']
+    @classmethod
+    def from_bitmex(cls, order_info, keep_raw: bool = False) -> "OrderStatus":
+        order_status = cls.__new__(cls)
+        order_status.platform = "bitmex"
+        order_status.order_info = order_info if keep_raw else None
+        order_status._get_bitmex_order_status(order_info)
+        return order_status
+
+    @classmethod
+    def from_binance_update(cls, order_info) -> "OrderStatus":
+        """ "o" object of an ORDER_TRADE_UPDATE event of the user data stream """
+        order_status = cls.__new__(cls)
+        order_status.platform = "binance"
+        order_status.order_info = None
+        order_status.order_id = order_info['i']
+        order_status.status = order_info['X'].lower()
+        order_status.avg_price = float(order_info['ap'])
+        return order_status
+
+    @classmethod
+    def from_bitmex_update(cls, order_info) -> "OrderStatus":
+        """ Row of the order / execution websocket tables, the updates don't always carry avgPx """
+        order_status = cls.__new__(cls)
+        order_status.platform = "bitmex"
+        order_status.order_info = None
+        order_status.order_id = order_info['orderID']
+        order_status.status = order_info['ordStatus'].lower()
+        order_status.avg_price = order_info.get('avgPx')
+        return order_status
+
+    def _get_binance_order_status(self, order_info):
+        self.order_id = order_info['orderId']
+        self.status = order_info['status'].lower()
+        self.avg_price = float(order_info['avgPrice'])
+
+    def _get_bitmex_order_status(self, order_info):
+        self.order_id = order_info['orderID']
+        self.status = order_info['ordStatus'].lower()
+        self.avg_price = order_info['avgPx']
 
 
 class Trade:
+    __slots__ = ("time", "contract", "strategy", "side", "entry_price", "status", "pnl", "quantity", "entry_id",
+                 "take_profit_price", "stop_loss_price")
+
     def __init__(self, trade_info):
         self.time: int = trade_info['time']
         self.contract: Contract = trade_info['contract']
@@ -167,3 +289,6 @@ class Trade:
         self.pnl: float = trade_info['pnl']
         self.quantity = trade_info['quantity']
         self.entry_id = trade_info['entry_id']
+        # exit levels, set by ExitTriggers once the entry price is known
+        self.take_profit_price = trade_info.get('take_profit_price')
+        self.stop_loss_price = trade_info.get('stop_loss_price')
@@ -0,0 +1,182 @@
+import functools
+import itertools
+import json
+import logging
+import os
+import random
+import time
+import typing
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, util
+
+import numpy as np
+
+from backtest import compute_signals, simulate
+from candle_buffer import Ohlcv
+from database import WorkspaceData
+
+"""
+Parameter sweep for the strategies' take_profit / stop_loss / extra parameters.
+
+The candles are copied once into a shared memory block; the worker processes attach to it in their initializer and
+read the arrays in place, so they are never pickled per task. Combinations are sent to the workers in chunks, and
+each worker caches the signals per extra parameters set, since combinations only differing by take_profit /
+stop_loss share the same signals.
+"""
+
+logger = logging.getLogger()
+
+OHLCV_FIELDS = ("timestamp", "open", "high", "low", "close", "volume")
+BASE_PARAMS = ("take_profit", "stop_loss")
+
+# worker process globals, set by _init_worker()
+_worker_shm: typing.Optional[shared_memory.SharedMemory] = None
+_worker_data: typing.Optional[Ohlcv] = None
+
+
+def _init_worker(shm_name: str, length: int):
+    global _worker_shm, _worker_data
+
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    columns = np.ndarray((len(OHLCV_FIELDS), length), dtype=np.float64, buffer=_worker_shm.buf)
+    _worker_data = Ohlcv(*columns)
+
+    # closed when the worker exits: atexit doesn't run in the pool processes, the multiprocessing finalizers do
+    util.Finalize(None, _close_worker, exitpriority=10)
+
+
+def _close_worker():
+    global _worker_shm, _worker_data
+
+    # the arrays pointing to the block go first, it can't be closed while they exist
+    _cached_signals.cache_clear()
+    _worker_data = None
+    if _worker_shm is not None:
+        _worker_shm.close()
+        _worker_shm = None
+
+
+@functools.lru_cache(maxsize=64)
+def _cached_signals(strategy_type: str, frozen_params: typing.Tuple) -> typing.Tuple[np.ndarray, int]:
+    return compute_signals(strategy_type, _worker_data, dict(frozen_params))
+
+
+def _run_chunk(strategy_type: str, chunk: typing.List[typing.Dict], balance_pct: float,
+               fee_pct: float) -> typing.List[typing.Tuple[typing.Dict, typing.Dict[str, float]]]:
+    results = []
+
+    for params in chunk:
+        other_params = {k: v for k, v in params.items() if k not in BASE_PARAMS}
+        signals, entry_offset = _cached_signals(strategy_type, tuple(sorted(other_params.items())))
+
+        result = simulate(_worker_data, signals, entry_offset, params.get("take_profit"), params.get("stop_loss"),
+                          balance_pct, fee_pct)
+        results.append((params, result.metrics()))
+
+    return results
+
+
+def grid_combinations(param_grid: typing.Dict[str, typing.List]) -> typing.List[typing.Dict]:
+    names = list(param_grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*param_grid.values())]
+
+
+def random_combinations(param_space: typing.Dict[str, typing.Union[typing.List, typing.Tuple]], n_iter: int,
+                        seed: typing.Optional[int] = None) -> typing.List[typing.Dict]:
+    """
+    param_space values are either a list of choices or a (low, high) tuple. Tuples of ints draw integers,
+    tuples of floats draw floats (both bounds included).
+    """
+    rng = random.Random(seed)
+    combinations = []
+
+    for _ in range(n_iter):
+        params = dict()
+        for name, space in param_space.items():
+            if isinstance(space, tuple):
+                low, high = space
+                if isinstance(low, int) and isinstance(high, int):
+                    params[name] = rng.randint(low, high)
+                else:
+                    params[name] = rng.uniform(low, high)
+            else:
+                params[name] = rng.choice(space)
+        combinations.append(params)
+
+    return combinations
+
+
+def rank_results(results: typing.List[typing.Tuple[typing.Dict, typing.Dict[str, float]]],
+                 rank_by: typing.Sequence[str]) -> typing.List[typing.Tuple[typing.Dict, typing.Dict[str, float]]]:
+    """
+    rank_by: metric names from BacktestResult.metrics(), best first. Higher is better unless the name is
+             prefixed with "-" (e.g. ["total_return", "-max_drawdown"])
+    """
+    def sort_key(result):
+        key = []
+        for metric in rank_by:
+            if metric.startswith("-"):
+                key.append(result[1][metric[1:]])
+            else:
+                key.append(-result[1][metric])
+        return key
+
+    return sorted(results, key=sort_key)
+
+
+def optimize(strategy_type: str, data: Ohlcv, combinations: typing.List[typing.Dict],
+             rank_by: typing.Sequence[str] = ("total_return",), balance_pct: float = 100, fee_pct: float = 0,
+             workers: typing.Optional[int] = None, chunk_size: typing.Optional[int] = None,
+             db: typing.Optional[WorkspaceData] = None, contract: str = "", timeframe: str = "") \
+        -> typing.List[typing.Tuple[typing.Dict, typing.Dict[str, float]]]:
+    """
+    Backtests every parameter combination over the process pool and returns (params, metrics) pairs ranked by
+    rank_by. When db is given, the results are also saved to its optimization_results table.
+
+    combinations: from grid_combinations() or random_combinations(). take_profit / stop_loss keys go to the
+                  backtest, all other keys are the strategy's extra parameters.
+    """
+    workers = workers or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, min(64, len(combinations) // (workers * 4)))
+
+    chunks = [combinations[i:i + chunk_size] for i in range(0, len(combinations), chunk_size)]
+    length = len(data)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(OHLCV_FIELDS) * length * 8))
+    columns = np.ndarray((len(OHLCV_FIELDS), length), dtype=np.float64, buffer=shm.buf)
+    try:
+        for row, field in enumerate(OHLCV_FIELDS):
+            columns[row] = getattr(data, field)
+
+        start = time.perf_counter()
+
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shm.name, length)) \
+                as executor:
+            for chunk_results in executor.map(_run_chunk, itertools.repeat(strategy_type), chunks,
+                                              itertools.repeat(balance_pct), itertools.repeat(fee_pct)):
+                results.extend(chunk_results)
+
+        logger.info("%s optimization: %s combinations on %s candles in %.2f s with %s workers",
+                    strategy_type, len(combinations), length, time.perf_counter() - start, workers)
+    finally:
+        del columns     # the block can't be closed while a numpy array still points to it
+        shm.close()
+        shm.unlink()
+
+    ranked = rank_results(results, rank_by)
+
+    if db is not None:
+        run_id = uuid.uuid4().hex
+        rows = []
+        for params, metrics in ranked:
+            extra_params = {k: v for k, v in params.items() if k not in BASE_PARAMS}
+            rows.append((run_id, int(time.time() * 1000), strategy_type, contract, timeframe,
+                         params.get("take_profit"), params.get("stop_loss"), json.dumps(extra_params),
+                         metrics["total_return"], metrics["max_drawdown"], metrics["win_rate"],
+                         metrics["num_trades"], metrics["sharpe"]))
+        db.add_optimization_results(rows)
+
+    return ranked
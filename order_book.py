@@ -0,0 +1,292 @@
+import bisect
+import logging
+import threading
+import typing
+from array import array
+
+"""
+Local L2 order books, kept from the exchanges' depth streams:
+
+- BinanceOrderBook: <symbol>@depth@100ms diffs on top of a REST snapshot (/fapi/v1/depth). The diffs received before
+  the snapshot are buffered, a gap in the update ids (U / u / pu) makes the book wait for a new snapshot.
+- BitmexOrderBook: orderBookL2_25 table (partial, then insert / update / delete by level id).
+
+The price levels of a side are two arrays (prices, sizes) sorted best first, so an update is a bisect plus a
+memmove and the best N levels are the first N items.
+
+estimate_slippage() walks the book for a market order of a given quantity (base asset for Binance, contracts for
+Bitmex).
+"""
+
+logger = logging.getLogger()
+
+
+class BookSide:
+    """ Price levels of one side. Bids are stored as negative prices: both sides are sorted ascending, best first. """
+    __slots__ = ("bids", "_keys", "_sizes")
+
+    def __init__(self, bids: bool):
+        self.bids = bids
+        self._keys = array("d")
+        self._sizes = array("d")
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def clear(self):
+        self._keys = array("d")
+        self._sizes = array("d")
+
+    def update(self, price: float, size: float):
+        """ size 0 removes the level """
+        key = -price if self.bids else price
+        i = bisect.bisect_left(self._keys, key)
+        found = i < len(self._keys) and self._keys[i] == key
+
+        if size == 0:
+            if found:
+                del self._keys[i]
+                del self._sizes[i]
+        elif found:
+            self._sizes[i] = size
+        else:
+            self._keys.insert(i, key)
+            self._sizes.insert(i, size)
+
+    def best(self, n: int = 1) -> typing.List[typing.Tuple[float, float]]:
+        """ [(price, size)] of the n best levels """
+        sign = -1 if self.bids else 1
+        return [(sign * self._keys[i], self._sizes[i]) for i in range(min(n, len(self._keys)))]
+
+    def levels(self) -> typing.Iterator[typing.Tuple[float, float]]:
+        sign = -1 if self.bids else 1
+        for key, size in zip(self._keys, self._sizes):
+            yield sign * key, size
+
+    @property
+    def best_price(self) -> typing.Optional[float]:
+        if len(self._keys) == 0:
+            return None
+        return -self._keys[0] if self.bids else self._keys[0]
+
+
+class SlippageEstimate:
+    __slots__ = ("side", "quantity", "filled", "avg_price", "worst_price", "reference_price", "slippage", "levels")
+
+    def __init__(self, side: str, quantity: float, filled: float, avg_price: typing.Optional[float],
+                 worst_price: typing.Optional[float], reference_price: typing.Optional[float], levels: int):
+        self.side = side
+        self.quantity = quantity
+        self.filled = filled    # less than quantity when the book isn't deep enough
+        self.avg_price = avg_price
+        self.worst_price = worst_price
+        self.reference_price = reference_price  # best ask for a buy, best bid for a sell
+        self.levels = levels
+        # cost against the best price, as a fraction (0.001 = 10 bps), positive when it is worse
+        if avg_price is None or not reference_price:
+            self.slippage = None
+        elif side == "buy":
+            self.slippage = avg_price / reference_price - 1
+        else:
+            self.slippage = 1 - avg_price / reference_price
+
+    @property
+    def complete(self) -> bool:
+        return self.filled >= self.quantity
+
+    def __repr__(self):
+        slippage = "n/a" if self.slippage is None else f"{self.slippage * 10000:.1f} bps"
+        return f"SlippageEstimate({self.side} {self.filled}/{self.quantity} @ {self.avg_price}, worst " \
+               f"{self.worst_price}, {slippage}, {self.levels} levels)"
+
+
+class OrderBook:
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids = BookSide(bids=True)
+        self.asks = BookSide(bids=False)
+        self.synced = False     # False until the first snapshot, and after a gap in the updates
+        self.updates = 0
+        self.resyncs = 0
+        self._lock = threading.Lock()
+
+    def _clear(self):
+        self.bids.clear()
+        self.asks.clear()
+
+    def _reset(self):
+        if self.synced:
+            self.resyncs += 1
+        self.synced = False
+
+    def reset(self):
+        """ The updates were interrupted (websocket disconnection): waits for a new snapshot """
+        with self._lock:
+            self._reset()
+
+    def _apply(self, bids: typing.Iterable, asks: typing.Iterable):
+        for price, size in bids:
+            self.bids.update(float(price), float(size))
+        for price, size in asks:
+            self.asks.update(float(price), float(size))
+        self.updates += 1
+
+    @property
+    def best_bid(self) -> typing.Optional[float]:
+        return self.bids.best_price
+
+    @property
+    def best_ask(self) -> typing.Optional[float]:
+        return self.asks.best_price
+
+    def depth(self, n: int = 5) -> typing.Dict[str, typing.List[typing.Tuple[float, float]]]:
+        with self._lock:
+            return {"bids": self.bids.best(n), "asks": self.asks.best(n)}
+
+    def estimate_slippage(self, side: str, quantity: float) -> typing.Optional[SlippageEstimate]:
+        """
+        Average fill price of a market order of `quantity`, walking the levels of the other side.
+        side: "buy" or "sell". None while the book isn't synced.
+        """
+        if not self.synced:
+            return None
+
+        book_side = self.asks if side == "buy" else self.bids
+        remaining = quantity
+        cost = 0.0
+        worst = None
+        levels = 0
+
+        with self._lock:
+            reference = book_side.best_price
+            for price, size in book_side.levels():
+                if remaining <= 0:
+                    break
+                taken = min(size, remaining)
+                cost += taken * price
+                remaining -= taken
+                worst = price
+                levels += 1
+
+        filled = quantity - max(remaining, 0.0)
+        return SlippageEstimate(side, quantity, filled, cost / filled if filled > 0 else None, worst, reference,
+                                levels)
+
+
+class BinanceOrderBook(OrderBook):
+    """
+    https://binance-docs.github.io/apidocs/futures/en/#how-to-manage-a-local-order-book-correctly
+    on_diff() from the websocket thread, apply_snapshot() when the REST snapshot arrives.
+    """
+    MAX_BUFFERED = 1000
+
+    def __init__(self, symbol: str):
+        super().__init__(symbol)
+        self.last_update_id: typing.Optional[int] = None
+        self._buffer: typing.List[typing.Dict] = []
+        self._first_diff = False    # the first diff after the snapshot must contain lastUpdateId
+
+    def on_diff(self, event: typing.Dict) -> bool:
+        """ depthUpdate event. Returns False when the book needs a new snapshot. """
+        with self._lock:
+            if not self.synced:
+                if len(self._buffer) >= self.MAX_BUFFERED:
+                    del self._buffer[0]
+                self._buffer.append(event)
+                return True
+
+            if event['u'] < self.last_update_id:
+                return True     # older than the book
+
+            previous = event.get('pu')
+            if self._first_diff:
+                gap = event['U'] > self.last_update_id and previous != self.last_update_id
+            elif previous is not None:
+                gap = previous != self.last_update_id
+            else:
+                gap = event['U'] > self.last_update_id + 1
+
+            if gap:
+                logger.warning("%s order book: gap in the depth updates (%s after %s), resync", self.symbol,
+                               event['U'], self.last_update_id)
+                self._reset()
+                self._buffer.append(event)
+                return False
+
+            self._apply(event['b'], event['a'])
+            self.last_update_id = event['u']
+            self._first_diff = False
+            return True
+
+    def _reset(self):
+        super()._reset()
+        self._buffer = []
+
+    def apply_snapshot(self, snapshot: typing.Dict) -> bool:
+        """ /fapi/v1/depth response, the buffered diffs are replayed on it. Returns False if it is too old. """
+        with self._lock:
+            if self.synced:
+                return True     # synced by another snapshot in the meantime
+
+            last_update_id = snapshot['lastUpdateId']
+            buffered = [e for e in self._buffer if e['u'] >= last_update_id]
+
+            if len(buffered) > 0 and buffered[0]['U'] > last_update_id:
+                # the first diff kept must contain lastUpdateId: the snapshot is older than the buffer
+                logger.warning("%s order book: snapshot %s older than the buffered updates", self.symbol,
+                               last_update_id)
+                return False
+
+            self._clear()
+            self._apply(snapshot['bids'], snapshot['asks'])
+            self.last_update_id = last_update_id
+
+            for event in buffered:
+                self._apply(event['b'], event['a'])
+                self.last_update_id = event['u']
+
+            self._buffer = []
+            self._first_diff = len(buffered) == 0
+            self.synced = True
+            return True
+
+
+class BitmexOrderBook(OrderBook):
+    """ orderBookL2_25 rows: the update / delete rows are identified by the level id, with or without the price """
+    def __init__(self, symbol: str):
+        super().__init__(symbol)
+        self._levels: typing.Dict[int, typing.Tuple[bool, float]] = dict()  # id: (is bid, price)
+
+    def on_table(self, action: str, rows: typing.List[typing.Dict]) -> bool:
+        """ Returns False when the book needs a new partial (resubscription) """
+        with self._lock:
+            if action == "partial":
+                self._clear()
+                self._levels = dict()
+                self.synced = True
+            elif not self.synced:
+                return True     # waiting for the partial
+
+            for row in rows:
+                if action in ("partial", "insert"):
+                    is_bid = row['side'] == "Buy"
+                    self._levels[row['id']] = (is_bid, row['price'])
+                    (self.bids if is_bid else self.asks).update(row['price'], row['size'])
+                    continue
+
+                level = self._levels.get(row['id'])
+                if level is None:
+                    logger.warning("%s order book: unknown level %s, waiting for a new partial", self.symbol,
+                                   row['id'])
+                    self._reset()
+                    return False
+
+                is_bid, price = level
+                if action == "update":
+                    (self.bids if is_bid else self.asks).update(price, row['size'])
+                elif action == "delete":
+                    (self.bids if is_bid else self.asks).update(price, 0)
+                    del self._levels[row['id']]
+
+            self.updates += 1
+            return True
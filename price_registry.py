@@ -0,0 +1,59 @@
+import threading
+import typing
+
+"""
+Best bid / ask of each symbol, written by the websocket threads and read from any thread without a lock.
+
+Used like the {symbol: {'bid': ..., 'ask': ...}} dict it replaces, but an entry is never modified: each update
+stores a new dict, so a reader always gets a bid and an ask of the same update. A new symbol is added to a copy of
+the mapping, swapped in with one assignment: iterating the prices never raises the "dictionary changed size during
+iteration" RuntimeError.
+"""
+
+Prices = typing.Dict[str, typing.Optional[float]]
+
+
+class PriceRegistry:
+    def __init__(self):
+        self._prices: typing.Dict[str, Prices] = dict()
+        self._lock = threading.Lock()   # writers only
+
+    def update(self, symbol: str, bid: typing.Optional[float] = None, ask: typing.Optional[float] = None) -> Prices:
+        """ A None bid or ask keeps the previous one (Bitmex only sends the values that changed) """
+        with self._lock:
+            previous = self._prices.get(symbol)
+            if previous is not None:
+                entry = {'bid': previous['bid'] if bid is None else bid,
+                         'ask': previous['ask'] if ask is None else ask}
+                self._prices[symbol] = entry   # same keys, replacing a value doesn't disturb a reader's iteration
+            else:
+                entry = {'bid': bid, 'ask': ask}
+                prices = dict(self._prices)
+                prices[symbol] = entry
+                self._prices = prices
+
+        return entry
+
+    def get(self, symbol: str, default: typing.Optional[Prices] = None) -> typing.Optional[Prices]:
+        return self._prices.get(symbol, default)
+
+    def __getitem__(self, symbol: str) -> Prices:
+        return self._prices[symbol]
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._prices
+
+    def __len__(self) -> int:
+        return len(self._prices)
+
+    def __iter__(self):
+        return iter(self._prices)
+
+    def __repr__(self):
+        return f"PriceRegistry({self._prices})"
+
+    def items(self):
+        return self._prices.items()
+
+    def snapshot(self) -> typing.Dict[str, Prices]:
+        return dict(self._prices)
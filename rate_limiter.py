@@ -0,0 +1,296 @@
+import abc
+import logging
+import threading
+import time
+import typing
+
+"""
+Token bucket rate limiting for the exchanges' REST limits.
+
+RateLimiter is a single bucket. BinanceRateLimits / BitmexRateLimits hold the buckets of a client (request weight,
+orders), seeded from the exchange's published limits and corrected from the rate limit headers of each response:
+the exchange counts requests we can't see (other programs on the same key or IP), the headers tell what is left.
+
+Orders get priority over the market data requests: they can use the last `reserve` part of the request weight,
+and while an order is waiting the other requests don't take anything.
+"""
+
+logger = logging.getLogger()
+
+INTERVAL_SECONDS = {"SECOND": 1, "MINUTE": 60, "HOUR": 3600, "DAY": 86400}
+
+
+class RateLimiter:
+    """
+    Token bucket holding up to `limit` weight, refilled continuously at limit / interval per second.
+
+    Parameters:
+    limit: weight allowed per interval
+    interval: in seconds
+    reserve: part of the limit (0 to 1) only the priority requests can use
+    """
+    def __init__(self, limit: float, interval: float, reserve: float = 0.0):
+        self.limit = limit
+        self.interval = interval
+        self.reserve = reserve
+        self._rate = limit / interval
+        self._tokens = float(limit)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._priority_waiting = 0
+        self._condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        if now > self._last_refill:     # _last_refill is in the future while blocked
+            self._tokens = min(self.limit, self._tokens + (now - self._last_refill) * self._rate)
+            self._last_refill = now
+
+    @property
+    def available(self) -> float:
+        with self._condition:
+            self._refill()
+            return self._tokens
+
+    def _take(self, weight: float, priority: bool) -> float:
+        """ Takes `weight` and returns 0 if it is available, returns the seconds to wait otherwise. Lock held. """
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+
+        self._refill()
+        floor = 0.0 if priority else self.reserve * self.limit
+        weight = min(weight, self.limit - floor)
+
+        if not priority and self._priority_waiting > 0:
+            # woken up by notify_all() when the priority request is served
+            return max((weight + floor - self._tokens) / self._rate, 0.05)
+
+        if self._tokens - weight >= floor:
+            self._tokens -= weight
+            return 0.0
+
+        return (weight + floor - self._tokens) / self._rate
+
+    def acquire(self, weight: float = 1, timeout: typing.Optional[float] = None, priority: bool = False) -> bool:
+        """ Waits until `weight` is available and takes it. Returns False if timeout (seconds) expires first. """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._condition:
+            if priority:
+                self._priority_waiting += 1
+            try:
+                while True:
+                    wait = self._take(weight, priority)
+                    if wait == 0:
+                        return True
+
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining)
+                    self._condition.wait(wait)
+            finally:
+                if priority:
+                    self._priority_waiting -= 1
+                    self._condition.notify_all()
+
+    async def acquire_async(self, weight: float = 1, priority: bool = False):
+        """ Same as acquire() without timeout, for coroutines: waits with asyncio.sleep() """
+        import asyncio  # only the asyncio clients need it, the threaded ones don't import it
+        with self._condition:
+            if priority:
+                self._priority_waiting += 1
+        try:
+            while True:
+                with self._condition:
+                    wait = self._take(weight, priority)
+                if wait == 0:
+                    return
+                await asyncio.sleep(wait)
+        finally:
+            if priority:
+                with self._condition:
+                    self._priority_waiting -= 1
+                    self._condition.notify_all()
+
+    def release(self, weight: float = 1):
+        """ Gives back weight taken for a request that wasn't sent """
+        with self._condition:
+            self._refill()
+            self._tokens = min(self.limit, self._tokens + weight)
+            self._condition.notify_all()
+
+    def sync(self, remaining: float):
+        """ Correction from the exchange's count: never more than `remaining` weight left """
+        with self._condition:
+            if time.monotonic() < self._blocked_until:
+                return
+            self._refill()
+            self._tokens = min(self._tokens, remaining)
+
+    def block(self, seconds: float):
+        """
+        Nothing goes through for `seconds` (429 / 418 answer with a Retry-After). The exchange's window is over by
+        then, so the whole limit is available again afterwards.
+        """
+        with self._condition:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = float(self.limit)
+            self._last_refill = self._blocked_until
+
+
+def binance_weight_limiter(rate_limits: typing.List[typing.Dict], share: float = 1.0) -> RateLimiter:
+    """
+    RateLimiter for the REQUEST_WEIGHT limit of Binance's exchangeInfo "rateLimits".
+    share: part of the limit given to this limiter (e.g. 0.5 to leave half of the weight for live trading)
+    """
+    for rate_limit in rate_limits:
+        if rate_limit['rateLimitType'] == "REQUEST_WEIGHT":
+            interval = INTERVAL_SECONDS[rate_limit['interval']] * rate_limit['intervalNum']
+            return RateLimiter(rate_limit['limit'] * share, interval)
+
+    # documented default for USD-M futures
+    return RateLimiter(2400 * share, 60)
+
+
+class ExchangeRateLimits(abc.ABC):
+    """ The request weight limiter shared by all the requests, plus the limiters counting the orders only """
+    def __init__(self, weight: RateLimiter, orders: typing.List[RateLimiter]):
+        self.weight = weight
+        self.orders = orders
+
+    def request_weight(self, method: str, endpoint: str, params: typing.Dict) -> float:
+        return 1
+
+    def acquire(self, weight: float, priority: bool = False, order: bool = False,
+                timeout: typing.Optional[float] = None) -> bool:
+        """
+        Waits for the capacity of one request. Returns False if timeout (seconds) expires first.
+        priority: served before the other requests (placing / cancelling an order)
+        order: counted by the order limiters
+        """
+        start = time.monotonic()
+
+        def remaining() -> typing.Optional[float]:
+            return None if timeout is None else max(timeout - (time.monotonic() - start), 0)
+
+        taken = []
+        for limiter in self.orders if order else []:
+            if not limiter.acquire(1, remaining(), priority=True):
+                for t in taken:
+                    t.release(1)
+                return False
+            taken.append(limiter)
+
+        if not self.weight.acquire(weight, remaining(), priority=priority):
+            for t in taken:
+                t.release(1)
+            return False
+
+        waited = time.monotonic() - start
+        if waited > 1:
+            logger.warning("Waited %.1f seconds for the rate limit", waited)
+
+        return True
+
+    async def acquire_async(self, weight: float, priority: bool = False, order: bool = False):
+        for limiter in self.orders if order else []:
+            await limiter.acquire_async(1, priority=True)
+        await self.weight.acquire_async(weight, priority=priority)
+
+    def _block(self, status_code: int, retry_after: typing.Optional[str]):
+        seconds = float(retry_after) if retry_after is not None else 60
+        logger.warning("Rate limit exceeded (error code %s), no request for %s seconds", status_code, seconds)
+
+        for limiter in [self.weight] + self.orders:
+            limiter.block(seconds)
+
+    @abc.abstractmethod
+    def update(self, headers: typing.Mapping[str, str], status_code: int):
+        """ Corrects the limiters from the rate limit headers of a response """
+
+
+# Binance USD-M request weights, 1 for the endpoints not listed
+BINANCE_WEIGHTS = {("GET", "/fapi/v1/account"): 5, ("GET", "/fapi/v2/account"): 5}
+
+
+class BinanceRateLimits(ExchangeRateLimits):
+    """
+    rate_limits: "rateLimits" of /fapi/v1/exchangeInfo, the documented defaults are used until it is known.
+    Headers: X-MBX-USED-WEIGHT-1M and X-MBX-ORDER-COUNT-10S / -1M (interval of each limit)
+    """
+    def __init__(self, rate_limits: typing.List[typing.Dict], reserve: float = 0.1):
+        if len(rate_limits) == 0:
+            rate_limits = [{"rateLimitType": "REQUEST_WEIGHT", "interval": "MINUTE", "intervalNum": 1, "limit": 2400},
+                           {"rateLimitType": "ORDERS", "interval": "MINUTE", "intervalNum": 1, "limit": 1200},
+                           {"rateLimitType": "ORDERS", "interval": "SECOND", "intervalNum": 10, "limit": 300}]
+
+        weight = RateLimiter(2400, 60, reserve)
+        self._weight_header = "X-MBX-USED-WEIGHT-1M"
+        orders = []
+        self._order_headers: typing.Dict[str, RateLimiter] = dict()
+
+        for rate_limit in rate_limits:
+            interval = INTERVAL_SECONDS[rate_limit['interval']] * rate_limit['intervalNum']
+            header_interval = f"{rate_limit['intervalNum']}{rate_limit['interval'][0]}"
+
+            if rate_limit['rateLimitType'] == "REQUEST_WEIGHT":
+                weight = RateLimiter(rate_limit['limit'], interval, reserve)
+                self._weight_header = "X-MBX-USED-WEIGHT-" + header_interval
+            elif rate_limit['rateLimitType'] == "ORDERS":
+                limiter = RateLimiter(rate_limit['limit'], interval)
+                orders.append(limiter)
+                self._order_headers["X-MBX-ORDER-COUNT-" + header_interval] = limiter
+
+        super().__init__(weight, orders)
+
+    def request_weight(self, method: str, endpoint: str, params: typing.Dict) -> float:
+        if endpoint == "/fapi/v1/klines":
+            limit = params.get("limit", 500)
+            return 1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10
+        if endpoint == "/fapi/v1/ticker/bookTicker":
+            return 2 if "symbol" in params else 5
+        if endpoint == "/fapi/v1/depth":
+            limit = params.get("limit", 500)
+            return 2 if limit <= 50 else 5 if limit <= 100 else 10 if limit <= 500 else 20
+        if endpoint == "/fapi/v1/openOrders":
+            return 1 if "symbol" in params else 40
+        return BINANCE_WEIGHTS.get((method, endpoint), 1)
+
+    def update(self, headers: typing.Mapping[str, str], status_code: int):
+        if status_code in (418, 429):
+            self._block(status_code, headers.get("Retry-After"))
+            return
+
+        used = headers.get(self._weight_header)
+        if used is not None:
+            self.weight.sync(self.weight.limit - float(used))
+
+        for header, limiter in self._order_headers.items():
+            count = headers.get(header)
+            if count is not None:
+                limiter.sync(limiter.limit - float(count))
+
+
+class BitmexRateLimits(ExchangeRateLimits):
+    """
+    120 requests per minute, plus 10 per second on the order endpoints (authenticated limits).
+    Headers: x-ratelimit-remaining, x-ratelimit-remaining-1s
+    """
+    def __init__(self, requests_per_minute: int = 120, orders_per_second: int = 10, reserve: float = 0.1):
+        super().__init__(RateLimiter(requests_per_minute, 60, reserve), [RateLimiter(orders_per_second, 1)])
+
+    def update(self, headers: typing.Mapping[str, str], status_code: int):
+        if status_code in (418, 429):
+            self._block(status_code, headers.get("Retry-After"))
+            return
+
+        remaining = headers.get("x-ratelimit-remaining")
+        if remaining is not None:
+            self.weight.sync(float(remaining))
+
+        remaining = headers.get("x-ratelimit-remaining-1s")
+        if remaining is not None:
+            self.orders[0].sync(float(remaining))
@@ -0,0 +1,241 @@
+import concurrent.futures
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+import typing
+
+"""
+One thread running the delayed and periodic callbacks of the threaded clients (order status polls, listenKey keep
+alive, ...) instead of one threading.Timer, so one new OS thread, per call.
+
+The scheduler thread only waits for the due times: the callbacks run on a few worker threads, so a slow REST request
+(contracts refresh, order book snapshot waiting for the rate limit, ...) doesn't delay the order status polls and the
+keep alives behind it. With workers=0 they run on the scheduler thread itself, one after the other. A periodic
+callback never runs twice at the same time: a run due while the previous one is still going is skipped.
+stats() shows the queue depth and how late the callbacks run.
+"""
+
+logger = logging.getLogger()
+
+DEFAULT_WORKERS = 4
+
+
+class ScheduledTask:
+    __slots__ = ("when", "callback", "interval", "jitter", "cancelled", "queued", "running", "_seq",
+                 "_scheduler")
+
+    def __init__(self, scheduler: "Scheduler", when: float, callback: typing.Callable[[], None],
+                 interval: typing.Optional[float], jitter: float):
+        self._scheduler = scheduler
+        self.when = when
+        self.callback = callback
+        self.interval = interval    # None for a one shot task
+        self.jitter = jitter
+        self.cancelled = False
+        self.queued = False     # in the heap: False once a one shot task was popped to run
+        self.running = False
+        self._seq = 0
+
+    def __lt__(self, other: "ScheduledTask") -> bool:
+        return (self.when, self._seq) < (other.when, other._seq)
+
+    def cancel(self):
+        self._scheduler._cancel(self)
+
+    def __repr__(self):
+        return f"ScheduledTask({getattr(self.callback, '__name__', self.callback)}, in " \
+               f"{self.when - time.monotonic():.2f} s{', cancelled' if self.cancelled else ''})"
+
+
+class Backoff:
+    """
+    Exponential delays: initial, initial * factor, ... up to maximum, each one +/- jitter (part of the delay)
+    so reconnecting clients don't all retry at the same time. reset() after a success.
+    """
+    def __init__(self, initial: float = 1.0, factor: float = 2.0, maximum: float = 60.0, jitter: float = 0.1):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.jitter = jitter
+        self.attempts = 0
+
+    def next(self) -> float:
+        delay = min(self.initial * self.factor ** self.attempts, self.maximum)
+        self.attempts += 1
+        return _jittered(delay, self.jitter)
+
+    def reset(self):
+        self.attempts = 0
+
+
+def _jittered(delay: float, jitter: float) -> float:
+    if jitter > 0:
+        delay *= 1 + random.uniform(-jitter, jitter)
+    return max(delay, 0.0)
+
+
+class Scheduler:
+    """ Heap of ScheduledTask ordered by due time, the thread starts with the first task """
+    def __init__(self, name: str = "scheduler", workers: int = 0):
+        """ workers: threads running the callbacks, 0 to run them on the scheduler thread """
+        self.name = name
+        self._heap: typing.List[ScheduledTask] = []
+        self._condition = threading.Condition()
+        self._counter = itertools.count()
+        self._thread: typing.Optional[threading.Thread] = None
+        self._running = True
+        self._executor: typing.Optional[concurrent.futures.ThreadPoolExecutor] = \
+            concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix=f"{name}-worker") if workers > 0 else None
+
+        self._pending = 0       # tasks not cancelled in the heap
+        self._executed = 0
+        self._errors = 0
+        self._last_lag = 0.0
+        self._max_lag = 0.0
+        self._max_duration = 0.0
+        self._skipped = 0
+
+    def call_later(self, delay: float, callback: typing.Callable[[], None], jitter: float = 0.0) -> ScheduledTask:
+        """ Runs callback once in `delay` seconds (+/- jitter, part of the delay) """
+        return self._push(ScheduledTask(self, time.monotonic() + _jittered(delay, jitter), callback, None, jitter))
+
+    def call_every(self, interval: float, callback: typing.Callable[[], None], jitter: float = 0.0,
+                   first_delay: typing.Optional[float] = None) -> ScheduledTask:
+        """ Runs callback every `interval` seconds until the task is cancelled, the first time after first_delay """
+        delay = interval if first_delay is None else first_delay
+        return self._push(ScheduledTask(self, time.monotonic() + _jittered(delay, jitter), callback, interval,
+                                        jitter))
+
+    def _push(self, task: ScheduledTask) -> ScheduledTask:
+        with self._condition:
+            task._seq = next(self._counter)
+            heapq.heappush(self._heap, task)
+            task.queued = True
+            self._pending += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            elif self._heap[0] is task:
+                self._condition.notify()
+        return task
+
+    def _cancel(self, task: ScheduledTask):
+        with self._condition:
+            if task.cancelled:
+                return
+            task.cancelled = True
+            task.interval = None
+            if not task.queued:
+                # a one shot task already run (or running): not counted anymore
+                return
+            self._pending -= 1
+
+            # cancelled tasks stay in the heap until they are due, unless they are the majority
+            if len(self._heap) > 64 and self._pending < len(self._heap) // 2:
+                self._heap = [t for t in self._heap if not t.cancelled]
+                heapq.heapify(self._heap)
+
+    def _next_task(self) -> typing.Optional[ScheduledTask]:
+        """ Waits for the next due task, None when stopped """
+        with self._condition:
+            while self._running:
+                if len(self._heap) == 0:
+                    self._condition.wait()
+                    continue
+
+                task = self._heap[0]
+                if task.cancelled:
+                    heapq.heappop(self._heap)
+                    task.queued = False
+                    continue
+
+                wait = task.when - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+
+                heapq.heappop(self._heap)
+                self._last_lag = -wait
+                self._max_lag = max(self._max_lag, -wait)
+
+                if task.interval is None:
+                    task.queued = False
+                    self._pending -= 1
+                else:
+                    # from the due time, not from now: a late run doesn't shift the next ones
+                    task.when = max(task.when + _jittered(task.interval, task.jitter), time.monotonic())
+                    task._seq = next(self._counter)
+                    heapq.heappush(self._heap, task)
+                    if task.running:
+                        self._skipped += 1
+                        continue
+
+                task.running = True
+                return task
+
+    def _run(self):
+        while True:
+            task = self._next_task()
+            if task is None:
+                return
+
+            if self._executor is None:
+                self._execute(task)
+            else:
+                self._executor.submit(self._execute, task)
+
+    def _execute(self, task: ScheduledTask):
+        start = time.perf_counter()
+        error = False
+        try:
+            task.callback()
+        except Exception as e:
+            error = True
+            logger.error("Error in scheduled callback %s: %s", task, e)
+        duration = time.perf_counter() - start
+
+        with self._condition:
+            task.running = False
+            self._executed += 1
+            self._errors += error
+            self._max_duration = max(self._max_duration, duration)
+        if duration > 1:
+            logger.warning("Scheduled callback %s took %.1f seconds", task, duration)
+
+    def stats(self) -> typing.Dict[str, float]:
+        """ Queue depth and delays, in seconds """
+        with self._condition:
+            next_due = None
+            for task in self._heap:
+                if not task.cancelled and (next_due is None or task.when < next_due):
+                    next_due = task.when
+            return {"pending": self._pending, "heap_size": len(self._heap), "executed": self._executed,
+                    "errors": self._errors, "last_lag": self._last_lag, "max_lag": self._max_lag,
+                    "max_duration": self._max_duration, "skipped": self._skipped,
+                    "next_in": None if next_due is None else max(next_due - time.monotonic(), 0.0)}
+
+    def stop(self):
+        """ The pending tasks are dropped """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+_default_scheduler: typing.Optional[Scheduler] = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler() -> Scheduler:
+    """ The scheduler shared by the clients of the process """
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = Scheduler(workers=DEFAULT_WORKERS)
+        return _default_scheduler
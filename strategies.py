@@ -1,14 +1,21 @@
 import logging
+import threading
 import time
-from threading import Timer
 from models import *
 import typing
-import pandas as pd
+from indicators import Macd, Rsi
+from exit_triggers import ExitTriggers
 
 logger = logging.getLogger()
 TF_EQUIV = {"1m": 60, "5m": 300, "15m": 900, "30m": 1800, "1h": 3600, "4h": 14400}
 
+# seconds between two order status polls. The fills come from the user data stream when it is connected,
+# the polls are only a fallback then
+ORDER_POLL_INTERVAL = 2.0
+ORDER_POLL_FALLBACK_INTERVAL = 15.0
+
 if typing.TYPE_CHECKING:
+    from candle_buffer import CandleBuffer, CandleView
     from connectors.bitmex import BitmexClient
     from connectors.binance_futures import BinanceFuturesClient
 
@@ -31,13 +38,41 @@ class Strategy:
 
         self.ongoing_position = False
 
-        self.candles: typing.List[Candle] = []
+        # numpy is only imported once a strategy is started, not with the connectors
+        from candle_buffer import CandleBuffer
+        self._candles = CandleBuffer()
         self.trades: typing.List[Trade] = []
+        self._exit_triggers = ExitTriggers()
         self.logs = []
 
+        # fills pushed by the user data stream can arrive before place_order() returns
+        self._fills_lock = threading.RLock()
+        self._placing_order = False
+        self._early_fills: typing.Dict[typing.Union[int, str], float] = dict()
+
+    @property
+    def candles(self) -> "CandleBuffer":
+        return self._candles
+
+    @candles.setter
+    def candles(self, candles: typing.Union["CandleBuffer", typing.Iterable[typing.Union[Candle, "CandleView"]]]):
+        from candle_buffer import CandleBuffer
+
+        if isinstance(candles, CandleBuffer):
+            self._candles = candles
+        else:
+            # historical candles come in as a list, only the last `capacity` of them are kept
+            self._candles = CandleBuffer(self._candles.capacity, candles)
+
+    @property
+    def open_trades(self) -> typing.List[Trade]:
+        """ Open trades with a known entry price, the closed ones stay in self.trades for the UI """
+        return self._exit_triggers.trades
+
     def _add_log(self, msg: str):
         logger.info("%s", msg)
         self.logs.append({"log": msg, "displayed": False})
+        self.client.ui_events.log(msg)
 
     def parse_trades(self, price: float, size: float, timestamp: int):
 
@@ -59,15 +94,85 @@ class Strategy:
                 last_candle.low = price
 
             # Check Exit Conditions
-            for trade in self.trades:
-                if trade.status == "open" and trade.entry_price is not None:
-                    self._check_tp_sl(trade)
+            self._check_tp_sl(price)
 
             return "same_candle"
 
-        # Missing Candle(s)
-        elif timestamp >= last_candle.timestamp + 2 * self.tf_equiv:
+        return self._new_candles(last_candle, price, size, timestamp)
+
+    def parse_trades_batch(self, trades: typing.Sequence[typing.Tuple[float, float, int]]):
+        """
+        Prints of one websocket message for the symbol, [(price, size, timestamp)] in the exchange order.
+
+        Gives the same candles as parse_trades() for each print, but the candle being built is written once per run
+        of prints, check_trade() runs on the last print of a candle in the batch and when a new candle starts, and
+        the take profit / stop loss levels are checked once with the high and low of the batch. A level added while
+        the batch is processed (entry price found meanwhile) is only checked with the prints that come after it.
+        """
+        if len(trades) == 0:
+            return
+        if len(trades) == 1:    # e.g. a Binance aggTrade, nothing to group
+            price, size, timestamp = trades[0]
+            self.check_trade(self.parse_trades(price, size, timestamp))
+            return
+
+        timestamp_diff = int(time.time() * 1000) - trades[-1][2]
+        if timestamp_diff >= 2000:
+            logger.warning("%s %s: %s milliseconds of difference between computer time and exchange time",
+                           self.exchange, self.contract.symbol, timestamp_diff)
+
+        candle = self.candles[-1]
+        candle_end = candle.timestamp + self.tf_equiv
+        high, low, close, volume = candle.high, candle.low, candle.close, candle.volume
+        pending = False     # prints added to the local values, not written to the candle yet
+
+        batch_high = batch_low = trades[0][0]
+        triggers_seq = self._exit_triggers.seq
+
+        for price, size, timestamp in trades:
+            if self._exit_triggers.seq != triggers_seq:
+                # the prints so far only apply to the levels that were there before
+                self._close_triggered(self._exit_triggers.pop_triggered_range(batch_low, batch_high, triggers_seq))
+                triggers_seq = self._exit_triggers.seq
+                batch_high = batch_low = price
+
+            if price > batch_high:
+                batch_high = price
+            elif price < batch_low:
+                batch_low = price
+
+            # Same Candle
+            if timestamp < candle_end:
+                close = price
+                volume += size
+                if price > high:
+                    high = price
+                elif price < low:
+                    low = price
+                pending = True
+                continue
+
+            if pending:
+                candle.high, candle.low, candle.close, candle.volume = high, low, close, volume
+                self.check_trade("same_candle")
+                pending = False
+
+            self.check_trade(self._new_candles(candle, price, size, timestamp))
+
+            candle = self.candles[-1]
+            candle_end = candle.timestamp + self.tf_equiv
+            high, low, close, volume = candle.high, candle.low, candle.close, candle.volume
+
+        if pending:
+            candle.high, candle.low, candle.close, candle.volume = high, low, close, volume
+            self.check_trade("same_candle")
+
+        self._close_triggered(self._exit_triggers.pop_triggered_range(batch_low, batch_high, triggers_seq))
+
+    def _new_candles(self, last_candle: "CandleView", price: float, size: float, timestamp: int) -> str:
 
+        # Missing Candle(s)
+        if timestamp >= last_candle.timestamp + 2 * self.tf_equiv:
             missing_candles = int((timestamp - last_candle.timestamp) / self.tf_equiv) - 1
 
             logger.info("%s missing %s candles for %s %s (%s %s)",
@@ -75,14 +180,11 @@ class Strategy:
 
             for missing in range(missing_candles):
                 new_ts = last_candle.timestamp + self.tf_equiv
-                candle_info = {'ts': new_ts, 'open': last_candle.close,
-                               'high': last_candle.close, 'low': last_candle.close,
-                               'close': last_candle.close, 'volume': 0}
+                last_close = last_candle.close
 
-                new_candle = Candle('parse_trade', candle_info, self.tf)
-                self.candles.append(new_candle)
+                self.candles.append_values(new_ts, last_close, last_close, last_close, last_close, 0)
 
-                last_candle = new_candle
+                last_candle = self.candles[-1]
 
             # new_ts = last_candle.timestamp + self.tf_equiv
             # candle_info = {'ts': new_ts, 'open': price, 'high': price, 'low': price, 'close': price, 'volume': size}
@@ -93,16 +195,35 @@ class Strategy:
         # New Candle
         elif timestamp >= last_candle.timestamp + self.tf_equiv:
             new_ts = last_candle.timestamp + self.tf_equiv
-            candle_info = {'ts': new_ts, 'open': price, 'high': price, 'low': price, 'close': price, 'volume': size}
-            new_candle = Candle('parse_trade', candle_info, self.tf)
-            
-            self.candles.append(new_candle)
+
+            self.candles.append_values(new_ts, price, price, price, price, size)
             
             logger.info("%s New candle for %s %s", self.exchange, self.contract.symbol, self.tf)
 
             return "new_candle"
 
+    def _poll_interval(self) -> float:
+        return ORDER_POLL_FALLBACK_INTERVAL if self.client.user_stream_connected else ORDER_POLL_INTERVAL
+
+    def on_order_update(self, order_status: OrderStatus):
+        """ Order update pushed by the exchange (user data stream), called from the connector's websocket thread """
+        if order_status.status != "filled" or order_status.avg_price is None:
+            return
+
+        with self._fills_lock:
+            for trade in self.trades:
+                if trade.entry_id == order_status.order_id:
+                    self._set_entry_price(trade, order_status.avg_price)
+                    return
+
+            if self._placing_order:
+                self._early_fills[order_status.order_id] = order_status.avg_price
+
     def _check_order_status(self, order_id):
+        for trade in self.trades:
+            if trade.entry_id == order_id and trade.entry_price is not None:
+                return  # filled, pushed by the user data stream
+
         order_status = self.client.get_order_status(self.contract, order_id)
 
         if order_status is not None:
@@ -111,11 +232,10 @@ class Strategy:
             if order_status.status == "filled":
                 for trade in self.trades:
                     if trade.entry_id == order_id:
-                        trade.entry_price = order_status.avg_price
+                        self._set_entry_price(trade, order_status.avg_price)
                         break
                 return
-        t = Timer(2.0, lambda: self._check_order_status(order_id))
-        t.start()
+        self.client.call_later(self._poll_interval(), lambda: self._check_order_status(order_id))
 
     def _open_position(self, signal_result: int):
         trade_size = self.client.get_trade_size(self.contract, self.candles[-1].close, self.balance_pct)
@@ -127,51 +247,59 @@ class Strategy:
         
         self._add_log(f"{position_side} signal on {self.contract.symbol} - {self.tf}")
         # print("we reached _open_position breakout // strategies.py")
+        with self._fills_lock:
+            self._placing_order = True
+
         order_status = self.client.place_order(self.contract, order_side, trade_size, "MARKET")
 
+        if order_status is None:
+            with self._fills_lock:
+                self._placing_order = False
+                self._early_fills.clear()
+
         if order_status is not None:
             self._add_log(f"{order_side.capitalize()} order placed on {self.exchange} | Status: {order_status.status}")
 
             self.ongoing_position = True
             avg_fill_price = None
 
-            if order_status == "filled":    # might change for another exchange
-                avg_fill_price = order_status.avg_price
-            else:
-                t = Timer(2.0, lambda: self._check_order_status(order_status.order_id))
-                t.start()
-
-            new_trade_specs = {"time": int(time.time() * 1000), "entry_price": avg_fill_price,
+            new_trade_specs = {"time": int(time.time() * 1000), "entry_price": None,
                                "contract": self.contract, "strategy": self.strategy_name, "side": position_side,
                                "status": "open", "pnl": 0, "quantity": trade_size, "entry_id": order_status.order_id}
             new_trade = Trade(new_trade_specs)
 
-            self.trades.append(new_trade)
+            with self._fills_lock:
+                self.trades.append(new_trade)
+                self._placing_order = False
+                pushed_fill_price = self._early_fills.pop(order_status.order_id, None)
+                self._early_fills.clear()
+            self.client.ui_events.trade(new_trade)
 
-    def _check_tp_sl(self, trade: Trade):
+            if order_status.status == "filled":    # might change for another exchange
+                avg_fill_price = order_status.avg_price
+            elif pushed_fill_price is not None:
+                avg_fill_price = pushed_fill_price
+            else:
+                self.client.call_later(self._poll_interval(), lambda: self._check_order_status(order_status.order_id))
 
-        tp_triggered = False
-        sl_triggered = False
+            if avg_fill_price is not None:
+                self._set_entry_price(new_trade, avg_fill_price)
 
-        price = self.candles[-1].close
+    def _set_entry_price(self, trade: Trade, entry_price: float):
+        """ The take profit / stop loss levels are computed once here, when the trade is filled """
+        with self._fills_lock:
+            if trade.entry_price is not None:   # already set by the user data stream or the status poll
+                return
+            trade.entry_price = entry_price
+        self._exit_triggers.add(trade, self.take_profit, self.stop_loss)
+        self.client.ui_events.trade(trade)
 
-        if trade.side == "long":
-            if self.stop_loss is not None:
-                if price <= trade.entry_price * (1 - self.stop_loss) / 100:
-                    sl_triggered = True
-            if self.take_profit is not None:
-                if price >= trade.entry_price * (1 + self.take_profit) / 100:
-                    tp_triggered = True
-        if trade.side == "short":
-            if self.stop_loss is not None:
-                if price >= trade.entry_price * (1 + self.stop_loss) / 100:
-                    sl_triggered = True
-            if self.take_profit is not None:
-                if price <= trade.entry_price * (1 - self.take_profit) / 100:
-                    tp_triggered = True
+    def _check_tp_sl(self, price: float):
+        self._close_triggered(self._exit_triggers.pop_triggered(price))
 
-        if tp_triggered or sl_triggered:
-            trigger = "Stop Loss" if sl_triggered else "Take Profit"
+    def _close_triggered(self, triggered: typing.List[typing.Tuple[Trade, str]]):
+
+        for trade, trigger in triggered:
             self._add_log(f"{trigger} for {self.contract.symbol} {self.tf} on {self.contract.platform.capitalize()}")
 
             order_side = "SELL" if trade.side == "long" else "BUY"
@@ -181,6 +309,10 @@ class Strategy:
                 self._add_log(f"Exit order on {self.contract.symbol} {self.tf} placed successfully")
                 trade.status = "closed"
                 self.ongoing_position = False
+                self.client.ui_events.trade(trade)
+            else:
+                # tried again on the next trade
+                self._exit_triggers.restore(trade)
 
 
 class TechnicalStrategy(Strategy):
@@ -194,39 +326,40 @@ class TechnicalStrategy(Strategy):
 
         self._rsi_length = other_params['rsi_length']
 
-    def _rsi(self) -> float:
-        close_list = [candle.close for candle in self.candles]
-
-        closes = pd.Series(close_list)
-
-        delta = closes.diff().dropna()
-        up, down = delta.copy(), delta.copy()
+        self._macd_state = Macd(self._ema_fast, self._ema_slow, self._ema_signal)
+        self._rsi_state = Rsi(self._rsi_length)
+        self._last_folded_ts: typing.Optional[int] = None
 
-        up[up < 0] = 0
-        down[down > 0] = 0
+    def _update_indicators(self):
+        """
+        Folds the candles closed since the last call into the running MACD/RSI state. The last candle is still
+        open, so it is left out. The first call seeds the state with the whole historical candles list.
+        """
+        new_closes = []
+        idx = len(self.candles) - 2
 
-        avg_gain = up.ewm(com=(self._rsi_length - 1), min_periods=self._rsi_length).mean()  # com: center of mass
-        avg_loss = down.abs().ewm(com=(self._rsi_length - 1), min_periods=self._rsi_length).mean()
+        while idx >= 0 and (self._last_folded_ts is None or self.candles[idx].timestamp > self._last_folded_ts):
+            new_closes.append(self.candles[idx].close)
+            idx -= 1
 
-        rs = avg_gain / avg_loss    # rs = relative strength
-        rsi = 100 - (100 / (1 + rs))
-        rsi = rsi.round(2)
+        if len(new_closes) == 0:
+            return
 
-        return rsi.iloc[-2]
+        for close in reversed(new_closes):
+            self._macd_state.update(close)
+            self._rsi_state.update(close)
 
-    def _macd(self) -> typing.Tuple[float, float]:
+        self._last_folded_ts = self.candles[-2].timestamp
 
-        close_list = [candle.close for candle in self.candles]
-
-        closes = pd.Series(close_list)
+    def _rsi(self) -> float:
+        self._update_indicators()
 
-        ema_fast = closes.ewm(span=self._ema_fast).mean()
-        ema_slow = closes.ewm(span=self._ema_slow).mean()
+        return self._rsi_state.value
 
-        macd_line = ema_fast - ema_slow
-        macd_signal = macd_line.ewm(span=self._ema_signal).mean()
+    def _macd(self) -> typing.Tuple[float, float]:
+        self._update_indicators()
 
-        return macd_line.iloc[-2], macd_signal.iloc[-2]
+        return self._macd_state.macd_line, self._macd_state.macd_signal
 
     def _check_signal(self) -> int:
 
@@ -0,0 +1,101 @@
+import threading
+import typing
+
+if typing.TYPE_CHECKING:
+    from strategies import TechnicalStrategy, BreakoutStrategy
+
+"""
+Strategies of a client, indexed by their strategy editor row (b_index) and by contract symbol.
+
+The websocket threads dispatch each trade / book ticker with for_symbol(symbol), a single dict lookup, instead of
+scanning every running strategy.
+
+Copy-on-write: the Tk thread adds and removes strategies while the websocket and strategy threads read them. A change
+builds new dicts and swaps them in with one assignment, the dicts and the per symbol tuples are never modified once
+published. So a reader never takes a lock, never sees a half done change and can iterate while a strategy is added,
+without the "dictionary changed size during iteration" RuntimeError.
+"""
+
+StrategyType = typing.Union["TechnicalStrategy", "BreakoutStrategy"]
+
+
+class _Snapshot:
+    __slots__ = ("strategies", "by_symbol")
+
+    def __init__(self, strategies: typing.Dict[int, StrategyType],
+                 by_symbol: typing.Dict[str, typing.Tuple[StrategyType, ...]]):
+        self.strategies = strategies
+        self.by_symbol = by_symbol
+
+
+class StrategyRegistry:
+    """ dict-like {b_index: strategy} that keeps a {symbol: (strategies)} index up to date """
+    def __init__(self):
+        self._snapshot = _Snapshot(dict(), dict())
+        self._lock = threading.Lock()   # writers only
+        self.version = 0
+
+    def __setitem__(self, b_index: int, strategy: StrategyType):
+        with self._lock:
+            strategies = dict(self._snapshot.strategies)
+            by_symbol = dict(self._snapshot.by_symbol)
+
+            previous = strategies.pop(b_index, None)
+            if previous is not None:
+                self._unindex(by_symbol, previous)
+
+            strategies[b_index] = strategy
+            symbol = strategy.contract.symbol
+            by_symbol[symbol] = by_symbol.get(symbol, ()) + (strategy,)
+
+            self._swap(strategies, by_symbol)
+
+    def __delitem__(self, b_index: int):
+        with self._lock:
+            strategies = dict(self._snapshot.strategies)
+            strategy = strategies.pop(b_index)
+            by_symbol = dict(self._snapshot.by_symbol)
+            self._unindex(by_symbol, strategy)
+
+            self._swap(strategies, by_symbol)
+
+    @staticmethod
+    def _unindex(by_symbol: typing.Dict[str, typing.Tuple[StrategyType, ...]], strategy: StrategyType):
+        symbol = strategy.contract.symbol
+        same_symbol = tuple(s for s in by_symbol[symbol] if s is not strategy)
+        if len(same_symbol) > 0:
+            by_symbol[symbol] = same_symbol
+        else:
+            del by_symbol[symbol]
+
+    def _swap(self, strategies: typing.Dict[int, StrategyType],
+              by_symbol: typing.Dict[str, typing.Tuple[StrategyType, ...]]):
+        self._snapshot = _Snapshot(strategies, by_symbol)
+        self.version += 1
+
+    def __getitem__(self, b_index: int) -> StrategyType:
+        return self._snapshot.strategies[b_index]
+
+    def __contains__(self, b_index: int) -> bool:
+        return b_index in self._snapshot.strategies
+
+    def __len__(self) -> int:
+        return len(self._snapshot.strategies)
+
+    def __iter__(self):
+        return iter(self._snapshot.strategies)
+
+    def __repr__(self):
+        return f"StrategyRegistry({self._snapshot.strategies})"
+
+    def items(self):
+        return self._snapshot.strategies.items()
+
+    def values(self):
+        return self._snapshot.strategies.values()
+
+    def for_symbol(self, symbol: str) -> typing.Tuple[StrategyType, ...]:
+        return self._snapshot.by_symbol.get(symbol, ())
+
+    def symbols(self) -> typing.KeysView[str]:
+        return self._snapshot.by_symbol.keys()
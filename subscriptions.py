@@ -0,0 +1,216 @@
+import collections
+import logging
+import threading
+import time
+import typing
+
+from scheduler import Backoff, Scheduler, ScheduledTask, default_scheduler
+
+"""
+Stream subscriptions of one websocket connection.
+
+The client only says which streams it wants (subscribe / unsubscribe), the manager keeps that desired set and the
+set active on the connection, and sends the difference:
+
+- a stream already wanted or already active is never sent twice
+- the changes are grouped in as few frames as possible, at most `max_per_frame` streams each
+- at most `frames_per_second` frames are sent, the rest is sent later from the scheduler thread
+- the desired set can't grow above `max_streams`, the streams over the limit are refused
+- on a new connection nothing is active anymore: the whole desired set is sent again
+- a subscription refused by the exchange stays desired and is sent again after a backoff (or on a new connection),
+  unless the error says the stream itself is wrong (unknown symbol or stream name): then it is dropped
+"""
+
+logger = logging.getLogger()
+
+# lower case parts of the exchange error messages meaning the stream will never be accepted, e.g. Binance
+# "Invalid request: unknown variant", Bitmex "Unknown or expired symbol." / "Unknown table: xyz"
+PERMANENT_ERRORS = ("invalid", "unknown", "not found", "does not exist")
+
+
+class SubscriptionManager:
+    """
+    send: sends a text frame on the connection
+    make_frame: (method "subscribe" / "unsubscribe", streams, request id) -> text frame of the exchange
+    """
+    def __init__(self, name: str, send: typing.Callable[[str], None],
+                 make_frame: typing.Callable[[str, typing.List[str], int], str],
+                 max_streams: typing.Optional[int] = None, max_per_frame: int = 200, frames_per_second: int = 5,
+                 scheduler: typing.Optional[Scheduler] = None):
+        self.name = name
+        self._send = send
+        self._make_frame = make_frame
+        self.max_streams = max_streams
+        self.max_per_frame = max_per_frame
+        self.frames_per_second = frames_per_second
+        self._scheduler = scheduler or default_scheduler()
+
+        self.desired: typing.Set[str] = set()
+        self.active: typing.Set[str] = set()
+        self._resend: typing.Set[str] = set()   # active streams to unsubscribe and subscribe again
+        self._held: typing.Set[str] = set()     # desired streams refused by the exchange, waiting for their retry
+        self.connected = False
+
+        self._lock = threading.RLock()
+        self._request_id = 1
+        self._pending: typing.Dict[int, typing.Tuple[str, typing.List[str]]] = dict()   # id: (method, streams)
+        self._frame_times: typing.Deque[float] = collections.deque()
+        self._flush_task: typing.Optional[ScheduledTask] = None
+        self._retry_task: typing.Optional[ScheduledTask] = None
+        self._retry_backoff = Backoff(initial=5.0, maximum=300.0)
+
+        self.frames_sent = 0
+        self.replays = 0
+        self.refused = 0
+        self.rejected = 0
+
+    def subscribe(self, streams: typing.Iterable[str]) -> typing.List[str]:
+        """ Returns the streams refused because of the stream limit """
+        with self._lock:
+            new = [s for s in dict.fromkeys(streams) if s not in self.desired]
+            room = len(new) if self.max_streams is None else max(self.max_streams - len(self.desired), 0)
+            refused = new[room:]
+            if len(refused) > 0:
+                self.refused += len(refused)
+                logger.warning("%s: %s streams over the limit of %s not subscribed (%s...)", self.name, len(refused),
+                               self.max_streams, refused[0])
+
+            self.desired.update(new[:room])
+            self._flush()
+
+        return refused
+
+    def unsubscribe(self, streams: typing.Iterable[str]):
+        with self._lock:
+            self.desired.difference_update(streams)
+            self._flush()
+
+    def resubscribe(self, streams: typing.Iterable[str]):
+        """ Unsubscribes and subscribes again, for an exchange that sends a new snapshot with the subscription """
+        with self._lock:
+            self._resend.update(s for s in streams if s in self.active)
+            self._flush()
+
+    def on_open(self):
+        """ New connection: the whole desired set is sent """
+        with self._lock:
+            self.connected = True
+            self.active = set()
+            self._resend = set()
+            self._pending = dict()
+            self._held = set()
+            self._retry_backoff.reset()
+            if self._retry_task is not None:
+                self._retry_task.cancel()
+                self._retry_task = None
+            if len(self.desired) > 0:
+                self.replays += 1
+            self._flush()
+
+    def on_close(self):
+        with self._lock:
+            self.connected = False
+            self.active = set()
+            self._resend = set()
+            self._pending = dict()
+            if self._flush_task is not None:
+                self._flush_task.cancel()
+                self._flush_task = None
+            if self._retry_task is not None:
+                self._retry_task.cancel()
+                self._retry_task = None
+
+    def on_response(self, request_id: int, error: typing.Optional[typing.Any] = None):
+        """ Answer of the exchange to a frame sent with request_id """
+        with self._lock:
+            request = self._pending.pop(request_id, None)
+            if request is not None and error is not None:
+                self._rejected(request[0], request[1], error)
+
+    def reject(self, method: str, streams: typing.List[str], error: typing.Any):
+        """ For the exchanges that answer with the request itself instead of an id """
+        with self._lock:
+            self._rejected(method, streams, error)
+
+    def _rejected(self, method: str, streams: typing.List[str], error: typing.Any):
+        logger.error("%s: %s of %s refused by the exchange: %s", self.name, method, streams, error)
+        self.rejected += len(streams)
+        if method != "subscribe":
+            return
+
+        self.active.difference_update(streams)
+        if any(part in str(error).lower() for part in PERMANENT_ERRORS):
+            logger.error("%s: %s dropped, the exchange will never accept them", self.name, streams)
+            self.desired.difference_update(streams)
+            return
+
+        # still wanted (e.g. a temporary rate limit or authentication error): held back from the flushes until the
+        # retry, so a refused stream isn't sent again in a loop
+        self._held.update(s for s in streams if s in self.desired)
+        if self._retry_task is None and self.connected:
+            self._retry_task = self._scheduler.call_later(self._retry_backoff.next(), self._retry)
+
+    def _retry(self):
+        with self._lock:
+            self._retry_task = None
+            self._held = set()
+            self._flush()
+
+    def _flush(self):
+        if not self.connected:
+            return
+
+        # removals first, they free room on the connection
+        to_remove = sorted((self.active - self.desired) | (self._resend & self.active))
+        for i in range(0, len(to_remove), self.max_per_frame):
+            if not self._send_frame("unsubscribe", to_remove[i:i + self.max_per_frame]):
+                return
+
+        to_add = sorted(self.desired - self.active - self._held)
+        for i in range(0, len(to_add), self.max_per_frame):
+            if not self._send_frame("subscribe", to_add[i:i + self.max_per_frame]):
+                return
+
+    def _send_frame(self, method: str, streams: typing.List[str]) -> bool:
+        """ False when the frame couldn't be sent now: the flush continues later """
+        now = time.monotonic()
+        while len(self._frame_times) > 0 and now - self._frame_times[0] >= 1.0:
+            self._frame_times.popleft()
+
+        if len(self._frame_times) >= self.frames_per_second:
+            if self._flush_task is None:
+                self._flush_task = self._scheduler.call_later(1.0 - (now - self._frame_times[0]),
+                                                              self._scheduled_flush)
+            return False
+
+        request_id = self._request_id
+        self._request_id += 1
+
+        try:
+            self._send(self._make_frame(method, streams, request_id))
+        except Exception as e:
+            # the connection is going down, everything is sent again when it is back
+            logger.error("%s: error while sending a %s of %s streams: %s", self.name, method, len(streams), e)
+            return False
+
+        self._frame_times.append(now)
+        self._pending[request_id] = (method, streams)
+        self.frames_sent += 1
+
+        if method == "subscribe":
+            self.active.update(streams)
+        else:
+            self.active.difference_update(streams)
+            self._resend.difference_update(streams)
+        return True
+
+    def _scheduled_flush(self):
+        with self._lock:
+            self._flush_task = None
+            self._flush()
+
+    def stats(self) -> typing.Dict:
+        with self._lock:
+            return {"desired": len(self.desired), "active": len(self.active), "connected": self.connected,
+                    "pending": len(self._pending), "frames_sent": self.frames_sent, "replays": self.replays,
+                    "refused": self.refused, "rejected": self.rejected, "held": len(self._held)}
@@ -0,0 +1,77 @@
+import threading
+import typing
+
+from models import Trade
+
+"""
+Changes published by the connector and strategy threads for the interface, drained by the Tk thread.
+
+Events of the same thing are coalesced until the next drain: only the last bid/ask of a symbol and the last state of
+a trade are kept, the log messages are all kept in order. The interface then updates only the widgets of what
+changed since its last refresh, whatever the number of rows. A refresh of the client's contracts is a flag: the
+interface reads client.contracts again when it is set.
+"""
+
+
+class UiEvents:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._logs: typing.List[str] = []
+        self._prices: typing.Dict[str, typing.Tuple[typing.Optional[float], typing.Optional[float]]] = dict()
+        self._trades: typing.Dict[int, Trade] = dict()    # id(trade): trade
+
+        # prices are only published for the symbols shown, swapped on change so it is read without the lock
+        self._watched: typing.FrozenSet[str] = frozenset()
+        self._contracts_changed = False
+
+        self.published = 0
+        self.drained = 0
+
+    def watch(self, symbol: str):
+        with self._lock:
+            self._watched = self._watched | {symbol}
+
+    def unwatch(self, symbol: str):
+        with self._lock:
+            self._watched = self._watched - {symbol}
+
+    def log(self, message: str):
+        with self._lock:
+            self._logs.append(message)
+            self.published += 1
+
+    def price(self, symbol: str, bid: typing.Optional[float], ask: typing.Optional[float]):
+        if symbol not in self._watched:
+            return
+        with self._lock:
+            self._prices[symbol] = (bid, ask)
+            self.published += 1
+
+    def trade(self, trade: Trade):
+        """ New trade, or a change of its status / pnl / entry price """
+        with self._lock:
+            self._trades[id(trade)] = trade
+            self.published += 1
+
+    def contracts_changed(self):
+        with self._lock:
+            self._contracts_changed = True
+            self.published += 1
+
+    def pop_contracts_changed(self) -> bool:
+        """ True once after each refresh of the client's contracts """
+        with self._lock:
+            changed = self._contracts_changed
+            self._contracts_changed = False
+        return changed
+
+    def drain(self) -> typing.Tuple[typing.List[str], typing.Dict[str, typing.Tuple], typing.List[Trade]]:
+        """ (log messages, {symbol: (bid, ask)}, trades) published since the last drain """
+        with self._lock:
+            logs, prices, trades = self._logs, self._prices, list(self._trades.values())
+            self._logs = []
+            self._prices = dict()
+            self._trades = dict()
+            self.drained += len(logs) + len(prices) + len(trades)
+
+        return logs, prices, trades
@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+import typing
+import zlib
+
+from scheduler import Backoff
+from subscriptions import SubscriptionManager
+
+if typing.TYPE_CHECKING:
+    import websocket
+
+"""
+Market data streams spread over several websocket connections (shards) of the same exchange.
+
+The streams of a symbol always go to the same shard (crc32 of the symbol), the streams of all symbols (Binance
+!bookTicker, Bitmex instrument, the private topics) to the shard 0. Each shard has its own reader thread, its
+own subscriptions (SubscriptionManager, so the stream limit is per connection) and its own reconnection backoff:
+a burst of messages on a symbol only delays the symbols of its shard, and a reconnection only replays the streams
+of its shard.
+
+Health of each shard in WsPool.stats(): connection state, reconnections, messages and their rate.
+"""
+
+logger = logging.getLogger()
+
+
+class WsShard:
+    """
+    on_open(shard): called when the connection is opened, before its subscriptions are replayed
+    on_message(shard, msg): called from the reader thread of the shard
+    """
+    RATE_WINDOW = 5.0   # seconds of messages in the message rate
+
+    def __init__(self, name: str, index: int, url: str, on_open: typing.Callable[["WsShard"], None],
+                 on_message: typing.Callable[["WsShard", str], None],
+                 on_close: typing.Callable[["WsShard"], None],
+                 make_frame: typing.Callable[[str, typing.List[str], int], str],
+                 max_streams: typing.Optional[int] = None):
+        self.name = f"{name} ws {index}"
+        self.index = index
+        self.url = url
+        self._on_open_callback = on_open
+        self._on_message_callback = on_message
+        self._on_close_callback = on_close
+
+        self.ws: typing.Optional["websocket.WebSocketApp"] = None
+        self.reconnect = True
+        self._backoff = Backoff(initial=2.0, maximum=60.0)
+        self._thread: typing.Optional[threading.Thread] = None
+        self.subscriptions = SubscriptionManager(self.name, self.send, make_frame, max_streams=max_streams)
+
+        self.connected = False
+        self.connects = 0
+        self.disconnects = 0
+        self.errors = 0
+        self.messages = 0
+        self.last_message_at: typing.Optional[float] = None    # time.monotonic()
+        self.message_rate = 0.0     # messages per second over the last RATE_WINDOW
+        self.max_message_rate = 0.0
+        self._window_start = time.monotonic()
+        self._window_messages = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name.replace(" ", "-"))
+        self._thread.start()
+
+    def close(self):
+        self.reconnect = False
+        if self.ws is not None:
+            self.ws.close()
+
+    def send(self, frame: str):
+        self.ws.send(frame)
+
+    def _run(self):
+        import websocket    # on the websocket threads, not with the connector
+        self.ws = websocket.WebSocketApp(self.url, on_open=self._on_open, on_close=self._on_close,
+                                         on_error=self._on_error, on_message=self._on_message)
+        while self.reconnect:
+            try:
+                self.ws.run_forever()
+            except Exception as e:
+                logger.error("%s: error in run_forever() method: %s", self.name, e)
+            if self.reconnect:
+                time.sleep(self._backoff.next())
+
+    def _on_open(self, ws):
+        logger.info("%s: connection opened.", self.name)
+        self.connected = True
+        self.connects += 1
+        self._backoff.reset()
+        self._on_open_callback(self)
+        self.subscriptions.on_open()
+
+    def _on_close(self, ws, *args):
+        logger.warning("%s: connection closed.", self.name)
+        self.connected = False
+        self.disconnects += 1
+        self.subscriptions.on_close()
+        self._on_close_callback(self)
+
+    def _on_error(self, ws, msg):
+        logger.error("%s: connection error: %s", self.name, msg)
+        self.errors += 1
+
+    def _on_message(self, ws, msg: str):
+        now = time.monotonic()
+        self.messages += 1
+        self.last_message_at = now
+
+        self._window_messages += 1
+        elapsed = now - self._window_start
+        if elapsed >= self.RATE_WINDOW:
+            self.message_rate = self._window_messages / elapsed
+            self.max_message_rate = max(self.max_message_rate, self.message_rate)
+            self._window_start = now
+            self._window_messages = 0
+
+        self._on_message_callback(self, msg)
+
+    def stats(self) -> typing.Dict:
+        return {"connected": self.connected, "connects": self.connects, "disconnects": self.disconnects,
+                "errors": self.errors, "messages": self.messages, "message_rate": self.message_rate,
+                "max_message_rate": self.max_message_rate,
+                "last_message_age": None if self.last_message_at is None else time.monotonic() - self.last_message_at,
+                "streams": len(self.subscriptions.active)}
+
+
+class WsPool:
+    def __init__(self, name: str, url: str, size: int, on_open: typing.Callable[[WsShard], None],
+                 on_message: typing.Callable[[WsShard, str], None], on_close: typing.Callable[[WsShard], None],
+                 make_frame: typing.Callable[[str, typing.List[str], int], str],
+                 max_streams: typing.Optional[int] = None):
+        self.shards = [WsShard(name, i, url, on_open, on_message, on_close, make_frame, max_streams)
+                       for i in range(max(size, 1))]
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    def shard_for(self, symbol: typing.Optional[str]) -> WsShard:
+        """ The shard of a symbol's streams, the shard 0 for the streams of all symbols (symbol None) """
+        if symbol is None:
+            return self.shards[0]
+        return self.shards[zlib.crc32(symbol.upper().encode()) % len(self.shards)]
+
+    def start(self):
+        for shard in self.shards:
+            shard.start()
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+    @property
+    def connected(self) -> bool:
+        return all(shard.connected for shard in self.shards)
+
+    def stats(self) -> typing.List[typing.Dict]:
+        return [shard.stats() for shard in self.shards]